@@ -0,0 +1,209 @@
+import io
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import subprocess
+import importlib
+from contextlib import redirect_stdout
+from datetime import datetime
+
+from SilverRunner import SPEC_MODULES
+from SyntheticEversysData import write_dataset
+
+# End-to-end benchmark of the pipeline stages on synthetic Eversys exports.
+#
+# For every size (rows per category) a fresh work folder is filled with
+# SyntheticEversysData files standing in for the SMB share, then each stage is
+# run on it as the workflow does: download (DownloadEversysFiles from the
+# local folder), extract (ExtractEversysData) and silver for each category
+# (SilverEngine.run_category). Every stage runs in its own Python process with
+# the work folder's run/ directory as working directory, so the scripts find
+# their usual ../ layout and the peak RSS measured is that of the stage alone.
+# Results (wall time, rows/s, MB/s, peak RSS per stage) are written as JSON;
+# --compare prints the ratios against an earlier result file.
+
+# === CONFIG ===
+DEFAULT_SIZES = "10k,1M"
+SIZE_SUFFIXES = {"k": 1_000, "m": 1_000_000}
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+STAGES = ["download", "extract"] + [f"silver:{category}" for category in SPEC_MODULES]
+
+# === HELPERS ===
+def parse_size(text):
+    text = text.strip().lower()
+    factor = SIZE_SUFFIXES.get(text[-1:], 1)
+    return int(float(text[:-1] if factor != 1 else text) * factor)
+
+# Peak resident memory of this process and its finished children, in MB
+# (None where it cannot be measured)
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return windows_peak_rss_mb()
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    # ru_maxrss is in bytes on macOS, in kilobytes elsewhere
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+def windows_peak_rss_mb():
+    try:
+        import ctypes
+        from ctypes import wintypes
+
+        class ProcessMemoryCounters(ctypes.Structure):
+            _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD)] + [
+                (name, ctypes.c_size_t) for name in (
+                    "PeakWorkingSetSize", "WorkingSetSize", "QuotaPeakPagedPoolUsage", "QuotaPagedPoolUsage",
+                    "QuotaPeakNonPagedPoolUsage", "QuotaNonPagedPoolUsage", "PagefileUsage", "PeakPagefileUsage")
+            ]
+
+        counters = ProcessMemoryCounters()
+        counters.cb = ctypes.sizeof(counters)
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        if not ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+            return None
+        return counters.PeakWorkingSetSize / 1024 / 1024
+    except (AttributeError, OSError):
+        return None
+
+def folder_bytes(folder):
+    total = 0
+    for root, _, files in os.walk(folder):
+        total += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+    return total
+
+# Bytes a stage reads: the share for download, the downloaded files for
+# extract, the category's bronze file for silver
+def stage_input_bytes(workdir, stage):
+    if stage == "download":
+        return folder_bytes(os.path.join(workdir, "share"))
+    if stage == "extract":
+        return folder_bytes(os.path.join(workdir, "EversysDatFiles"))
+    category = stage.split(":", 1)[1]
+    bronze = os.path.join(workdir, "BronzeRawData", category, "current", f"{category}.dat")
+    return os.path.getsize(bronze) if os.path.exists(bronze) else 0
+
+# Run one stage in the current process (called in the child process)
+def run_stage(stage, share):
+    if stage == "download":
+        import DownloadEversysFiles
+        return DownloadEversysFiles.main(["--local-share", share]) or 0
+    if stage == "extract":
+        import ExtractEversysData
+        return ExtractEversysData.main(["--workers", "1"]) or 0
+    from SilverEngine import RunOptions, run_category
+    category = stage.split(":", 1)[1]
+    return run_category(importlib.import_module(SPEC_MODULES[category]).SPEC, RunOptions())
+
+# Time one stage in a child process, returns its measurements
+def measure_stage(workdir, stage, rows):
+    input_bytes = stage_input_bytes(workdir, stage)
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [REPO_DIR, os.environ.get("PYTHONPATH")])))
+    completed = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--run-stage", stage, "--workdir", workdir],
+        cwd=os.path.join(workdir, "run"), env=env, capture_output=True, text=True,
+    )
+    if completed.returncode != 0 or not completed.stdout.strip():
+        raise RuntimeError(f"stage {stage} failed:\n{completed.stdout}{completed.stderr}")
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    seconds = result["seconds"]
+    return {
+        "stage": stage,
+        "rows": rows,
+        "input_bytes": input_bytes,
+        "seconds": round(seconds, 4),
+        "rows_per_s": round(rows / seconds, 1) if seconds else None,
+        "mb_per_s": round(input_bytes / 1024 / 1024 / seconds, 2) if seconds else None,
+        "peak_rss_mb": None if result["peak_rss_mb"] is None else round(result["peak_rss_mb"], 1),
+        "status": result["status"],
+    }
+
+# Generate the data for one size and run every stage on it
+def benchmark_size(root, rows, files, malformed_rate, seed):
+    workdir = os.path.join(root, f"rows-{rows}")
+    shutil.rmtree(workdir, ignore_errors=True)
+    os.makedirs(os.path.join(workdir, "run"))
+
+    started = time.perf_counter()
+    write_dataset(os.path.join(workdir, "share"), rows, files, malformed_rate, seed)
+    print(f"{rows} rows per category generated in {time.perf_counter() - started:.1f}s")
+
+    results = []
+    for stage in STAGES:
+        # download and extract handle the rows of every category
+        stage_rows = rows if stage.startswith("silver:") else rows * len(SPEC_MODULES)
+        result = dict(size=rows, **measure_stage(workdir, stage, stage_rows))
+        results.append(result)
+        rss = "n/a" if result["peak_rss_mb"] is None else f"{result['peak_rss_mb']:.0f} MB"
+        print(f"  {stage:<16} {result['seconds']:9.2f}s {result['rows_per_s'] or 0:12,.0f} rows/s "
+              f"{result['mb_per_s'] or 0:8.1f} MB/s  peak {rss}")
+    return results
+
+# Print the wall time ratios (current / previous) of the stages found in both runs
+def compare(previous_file, runs):
+    with open(previous_file, "r") as f:
+        previous = json.load(f)
+    before = {(r["size"], r["stage"]): r for r in previous["results"]}
+    print(f"=== Compared with {previous_file} ({previous.get('started_at', '?')}) ===")
+    for result in runs:
+        old = before.get((result["size"], result["stage"]))
+        if old is None or not old["seconds"]:
+            continue
+        ratio = result["seconds"] / old["seconds"]
+        verdict = "slower" if ratio > 1.1 else "faster" if ratio < 0.9 else "same"
+        print(f"{result['size']:>10} {result['stage']:<16} {old['seconds']:9.2f}s -> {result['seconds']:9.2f}s "
+              f"x{ratio:5.2f} {verdict}")
+
+# === MAIN PROCESS ===
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark every pipeline stage on synthetic data.")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES,
+                        help="Rows per category, comma separated, k/M suffixes allowed (default: %(default)s)")
+    parser.add_argument("--files", type=int, default=10, help="Files per category (default: %(default)s)")
+    parser.add_argument("--malformed-rate", type=float, default=0.01, help="Share of malformed cells (default: %(default)s)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", default=os.path.join(REPO_DIR, "..", "benchmark"),
+                        help="Scratch folder, emptied for every size (default: %(default)s)")
+    parser.add_argument("--output", default=None, help="Write the results to this JSON file")
+    parser.add_argument("--compare", default=None, help="JSON results of an earlier run to compare with")
+    parser.add_argument("--run-stage", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.run_stage:
+        # Child process: the stage's own output is dropped, the measurements
+        # are printed as one JSON line
+        with redirect_stdout(io.StringIO()):
+            started = time.perf_counter()
+            status = run_stage(args.run_stage, os.path.join(args.workdir, "share"))
+            seconds = time.perf_counter() - started
+        print(json.dumps({"seconds": seconds, "peak_rss_mb": peak_rss_mb(), "status": status}))
+        return 0
+
+    root = os.path.abspath(args.workdir)
+    report = {
+        "started_at": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "files_per_category": args.files,
+        "malformed_rate": args.malformed_rate,
+        "results": [],
+    }
+    for rows in (parse_size(size) for size in args.sizes.split(",")):
+        report["results"].extend(benchmark_size(root, rows, args.files, args.malformed_rate, args.seed))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+    if args.compare:
+        compare(args.compare, report["results"])
+    return 1 if any(result["status"] for result in report["results"]) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,90 @@
+import sys
+import time
+import argparse
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from SilverEngine import Column, to_datetime_text
+from TimestampParser import INPUT_FORMATS, OUTPUT_FORMAT
+
+# Micro-benchmark of the silver timestamp parsing.
+#
+# Compares, on the same synthetic column:
+#   row-by-row  the format_date() the silver scripts used to call per row
+#               (strptime per format with an exception fallback, then strftime)
+#   per-format  one pd.to_datetime pass per format followed by dt.strftime
+#   engine      SilverEngine.to_datetime_text, i.e. TimestampParser
+# and checks that all three produce the same text.
+
+# === HELPERS ===
+def format_date_row_by_row(val):
+    val = str(val).replace("\n", "").replace("\r", "").replace('"', "").replace("'", "").strip()
+    for fmt in INPUT_FORMATS:
+        try:
+            return datetime.strptime(val, fmt).strftime(OUTPUT_FORMAT)
+        except ValueError:
+            continue
+    return ""
+
+def format_dates_per_format(series):
+    parsed = pd.to_datetime(series, format=INPUT_FORMATS[0], errors="coerce")
+    for fmt in INPUT_FORMATS[1:]:
+        missing = parsed.isna()
+        if missing.any():
+            parsed[missing] = pd.to_datetime(series[missing], format=fmt, errors="coerce")
+    return parsed.dt.strftime(OUTPUT_FORMAT).astype(object).where(parsed.notna(), "")
+
+# Timestamps over five years, us_share of them in MM/DD/YYYY form and
+# invalid_rate of them unparseable
+def synthetic_column(rows, us_share, invalid_rate, seed=0):
+    rng = np.random.default_rng(seed)
+    stamps = pd.Timestamp("2020-01-01") + pd.to_timedelta(rng.integers(0, 5 * 365 * 86400, rows), unit="s")
+    iso = pd.Series(stamps.strftime(INPUT_FORMATS[0]), dtype=object)
+    us = pd.Series(stamps.strftime(INPUT_FORMATS[1]), dtype=object)
+    values = iso.where(rng.random(rows) >= us_share, us)
+    return values.where(rng.random(rows) >= invalid_rate, "2024-02-30 10:00:00")
+
+def timed(function, repeat):
+    best, result = None, None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+# === MAIN PROCESS ===
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the silver timestamp parsing.")
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--us-share", type=float, default=0.4, help="Share of MM/DD/YYYY values (default: %(default)s)")
+    parser.add_argument("--invalid-rate", type=float, default=0.001, help="Share of invalid values (default: %(default)s)")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    series = synthetic_column(args.rows, args.us_share, args.invalid_rate)
+    column = Column("timestamp", "datetime")
+    candidates = {
+        "row-by-row": lambda: series.map(format_date_row_by_row),
+        "per-format": lambda: format_dates_per_format(series),
+        "engine": lambda: to_datetime_text(series, column, None),
+    }
+
+    results = {}
+    print(f"{args.rows} rows, {args.us_share:.0%} MM/DD/YYYY, {args.invalid_rate:.2%} invalid")
+    for name, function in candidates.items():
+        elapsed, results[name] = timed(function, args.repeat)
+        print(f"{name:<12} {elapsed:8.3f}s {args.rows / elapsed:12,.0f} rows/s")
+
+    reference = results["row-by-row"]
+    mismatches = {name: int((result != reference).sum()) for name, result in results.items()}
+    if any(mismatches.values()):
+        print(f"Outputs differ from row-by-row: {mismatches}")
+        return 1
+    print("All outputs identical")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,125 @@
+import os
+import io
+import json
+import hashlib
+
+# Persistent read cursor over BronzeRawData/<Category>/current/<Category>.dat.
+#
+# ExtractEversysData only ever appends to the bronze files, so the silver
+# scripts remember how far they got (byte offset, file size, inode and a
+# checksum of the header line) and only read the bytes appended since. When the
+# file was truncated or replaced the cursor is discarded and the whole file is
+# rescanned; lines already cleaned are then skipped by the processed lines
+# tracker as before.
+
+def header_checksum(header_bytes):
+    return hashlib.md5(header_bytes.rstrip(b"\r\n")).hexdigest()
+
+def load_cursor(cursor_file):
+    try:
+        with open(cursor_file, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def save_cursor(cursor_file, cursor):
+    temp_path = cursor_file + ".tmp"
+    with open(temp_path, "w") as f:
+        json.dump(cursor, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, cursor_file)
+
+def cursor_is_valid(cursor, stat, checksum, data_start):
+    if not cursor:
+        return False
+    try:
+        return (
+            cursor["inode"] == stat.st_ino
+            and cursor["header_md5"] == checksum
+            and data_start <= cursor["offset"] <= stat.st_size
+            and cursor["size"] <= stat.st_size
+        )
+    except KeyError:
+        return False
+
+# Split decoded text the same way reading the file in text mode would
+def split_lines(text):
+    return list(io.StringIO(text, newline=None))
+
+def locate_new_data(input_file, cursor_file):
+    """Find the bytes appended to input_file since the saved cursor.
+
+    Returns (header, start, cursor): the header line, the offset of the
+    first unread byte and the cursor describing the file as it is now, to be
+    saved with the offset reached once new lines have been committed.
+    """
+    with open(input_file, "rb") as f:
+        header_bytes = b""
+        while not header_bytes.strip():
+            header_bytes = f.readline()
+            if not header_bytes:
+                break
+        data_start = f.tell()
+
+        stat = os.fstat(f.fileno())
+        checksum = header_checksum(header_bytes)
+        cursor = load_cursor(cursor_file)
+
+    start = data_start
+    if cursor_is_valid(cursor, stat, checksum, data_start):
+        start = cursor["offset"]
+    elif cursor:
+        print(f"Bronze file {input_file} was truncated or replaced, rescanning it from the start")
+
+    header = header_bytes.decode("utf-8").rstrip("\r\n")
+    new_cursor = {
+        "offset": start,
+        "size": stat.st_size,
+        "inode": stat.st_ino,
+        "header_md5": checksum,
+    }
+    return header, start, new_cursor
+
+def iter_line_chunks(input_file, start, end, chunk_bytes=None):
+    """Yield (lines, offset) for the complete lines between start and end.
+
+    The range is read chunk_bytes at a time (all at once when None) and cut
+    after the last newline of each chunk, so a chunk only holds whole lines;
+    offset is the byte position right after them. A line longer than
+    chunk_bytes is carried over until it is complete. A trailing partial line
+    is left for the next run.
+    """
+    with open(input_file, "rb") as f:
+        f.seek(start)
+        position = start
+        pending = b""
+        while position < end:
+            block = f.read(min(chunk_bytes or end - position, end - position))
+            if not block:
+                break
+            position += len(block)
+            data = pending + block
+            cut = data.rfind(b"\n") + 1
+            pending = data[cut:]
+            if cut:
+                yield split_lines(data[:cut].decode("utf-8")), position - len(pending)
+
+def line_aligned_ranges(input_file, start, end, range_bytes):
+    """Split [start, end) into ranges of about range_bytes that end right after a newline.
+
+    The last range ends at end and may finish with a partial line, which
+    iter_line_chunks leaves unread.
+    """
+    ranges = []
+    with open(input_file, "rb") as f:
+        position = start
+        while position < end:
+            target = min(position + range_bytes, end)
+            f.seek(target - 1)
+            boundary = target - 1 + len(f.readline())
+            if boundary > end or boundary <= position:
+                boundary = end
+            ranges.append((position, boundary))
+            position = boundary
+    return ranges
@@ -0,0 +1,176 @@
+import os
+import codecs
+import hashlib
+from dataclasses import dataclass
+
+# Direct append of the downloaded DAT files to BronzeRawData/<Category>/current/<Category>.dat.
+#
+# A source file is first inspected on its own (header, UTF-8 check, MD5),
+# which can be done for many files in parallel. It is then appended: its
+# header is checked against the target file (or, for a new target, against
+# the columns the silver step needs) and the rest of the file is copied as
+# raw bytes in large blocks. The appends are made durable with sync_file()
+# and committed in FileRegistry together with the new size of the target; a
+# run that stops before the commit has its appends truncated on the next run.
+
+COPY_BLOCK = 4 * 1024 * 1024
+
+
+def split_header(header_bytes):
+    return header_bytes.decode("utf-8-sig").rstrip("\r\n").split(";")
+
+
+def read_target_header(target_file):
+    with open(target_file, "rb") as f:
+        return split_header(f.readline())
+
+
+def ends_with_newline(path, end=None):
+    with open(path, "rb") as f:
+        f.seek(-1, os.SEEK_END) if end is None else f.seek(end - 1)
+        return f.read(1) == b"\n"
+
+
+def truncate(path, size):
+    with open(path, "r+b") as f:
+        f.truncate(size)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def sync_file(path):
+    with open(path, "rb+") as f:
+        os.fsync(f.fileno())
+
+
+def file_md5(path):
+    hasher = hashlib.md5()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(COPY_BLOCK), b""):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+
+# Hash the next size bytes of f
+def hash_bytes(f, hasher, size):
+    remaining = size
+    while remaining > 0:
+        block = f.read(min(COPY_BLOCK, remaining))
+        if not block:
+            break
+        hasher.update(block)
+        remaining -= len(block)
+    return hasher
+
+
+# MD5 of the first size bytes of a file, to tell whether it grew from a
+# version merged before
+def prefix_md5(path, size):
+    with open(path, "rb") as f:
+        return hash_bytes(f, hashlib.md5(), size).hexdigest()
+
+
+# Header of the source and offset of its first data byte, skipping blank lines
+def read_source_header(f):
+    header_bytes = b""
+    while not header_bytes.strip():
+        header_bytes = f.readline()
+        if not header_bytes:
+            break
+    return header_bytes, f.tell()
+
+
+class SourceRejected(Exception):
+    """The source cannot be appended to the target; the target is unchanged."""
+
+
+@dataclass
+class SourceInfo:
+    """What inspect_source() found out about a source file.
+
+    error is set when the file cannot be merged (invalid UTF-8); columns is
+    the header, data_start the offset of the first byte to append, size the
+    file size when it was inspected and lines the number of lines to append.
+    """
+    columns: list = None
+    data_start: int = 0
+    size: int = 0
+    has_data: bool = False
+    md5: str = None
+    error: str = None
+    lines: int = 0
+
+
+def inspect_source(source_path, skip_bytes=0):
+    """Read a source file once: header, UTF-8 check and MD5 of the whole file.
+
+    skip_bytes leaves out the start of the source (a version of it merged
+    before); it must end on a line boundary. Independent of the target, so
+    sources can be inspected in parallel.
+    """
+    source = os.path.basename(source_path)
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    with open(source_path, "rb") as src:
+        header_bytes, data_start = read_source_header(src)
+        try:
+            columns = split_header(header_bytes)
+        except UnicodeDecodeError:
+            return SourceInfo(error=f"header of {source} is not valid UTF-8")
+
+        data_start = max(data_start, skip_bytes)
+        src.seek(0)
+        hasher = hash_bytes(src, hashlib.md5(), data_start)
+        found_data, lines, last_byte = False, 0, b"\n"
+        try:
+            for block in iter(lambda: src.read(COPY_BLOCK), b""):
+                decoder.decode(block)
+                hasher.update(block)
+                found_data = found_data or bool(block.strip())
+                lines += block.count(b"\n")
+                last_byte = block[-1:]
+            decoder.decode(b"", final=True)
+        except UnicodeDecodeError as e:
+            return SourceInfo(error=f"{source} is not valid UTF-8 ({e.reason})")
+        lines += last_byte != b"\n"
+        return SourceInfo(columns, data_start, src.tell(), found_data, hasher.hexdigest(), lines=lines)
+
+
+def append_source(source_path, info, target_file, required_columns=()):
+    """Append the data lines of an inspected source to target_file.
+
+    Returns the byte range appended to the target, empty when the source had
+    no new data lines. Raises SourceRejected, leaving the target unchanged,
+    for an error found by inspect_source(), a header mismatch or a file that
+    changed since it was inspected. The target is not synced to disk, see
+    sync_file().
+    """
+    source = os.path.basename(source_path)
+    offset = os.path.getsize(target_file) if os.path.exists(target_file) else 0
+    if info.error:
+        raise SourceRejected(info.error)
+    if not info.has_data:
+        return offset, offset
+    if os.path.getsize(source_path) != info.size:
+        raise SourceRejected(f"{source} changed while it was being merged")
+
+    is_new_file = offset == 0
+    if is_new_file:
+        missing = [name for name in required_columns if name not in info.columns]
+        if missing:
+            raise SourceRejected(f"{source} is missing the columns {', '.join(missing)}")
+    elif info.columns != read_target_header(target_file):
+        raise SourceRejected(f"columns of {source} do not match {target_file}")
+
+    last_byte = b"\n"
+    with open(source_path, "rb") as src, open(target_file, "ab") as dst:
+        src.seek(info.data_start)
+        if is_new_file:
+            dst.write(";".join(info.columns).encode("utf-8") + b"\n")
+        elif not ends_with_newline(target_file):
+            dst.write(b"\n")
+        for block in iter(lambda: src.read(COPY_BLOCK), b""):
+            dst.write(block)
+            last_byte = block[-1:]
+        if last_byte != b"\n":
+            dst.write(b"\n")
+    return offset, os.path.getsize(target_file)
@@ -0,0 +1,307 @@
+import os
+import csv
+import sys
+import math
+import sqlite3
+import argparse
+from datetime import datetime, timedelta
+from RunMetrics import PROMETHEUS_OUTPUT, RunMetrics
+from SilverBulk import acknowledge, load_manifest, pending_files, read_batch, verify_file
+
+# Loads the silver bulk-load files (see SilverBulk) into the machine_data
+# tables through any DB-API connection, instead of the xp_cmdshell import.
+#
+# The loader is a consumer of the per-run bulk files: it takes the complete
+# files after the seq it last acknowledged, checks their MD5 and
+# acknowledges each file once all its batches are in. Each batch is read
+# from its byte range, its fields are converted to Python values of the column's SQL type (None for empty
+# fields) and inserted with one parameterized executemany, with pyodbc's
+# fast_executemany when the cursor has it. As with TRY_CAST in
+# sp_Import*Logs, a value the column type cannot hold (e.g. 40000 for a
+# SMALLINT) becomes NULL instead of failing the batch, and rows whose
+# natural key is in the table already (e.g. imported by the procedure) are
+# skipped like its anti-join does. Machine ids missing from
+# machine_names are added first, named like sp_Import*Logs does. Every
+# batch is committed together with a row in bulk_load_state, so a load that
+# stops within a file resumes at the first batch not committed and no batch
+# is inserted twice. A local SQLite database can stand in for SQL Server
+# (--sqlite, --create-tables).
+
+# === CONFIG ===
+STATE_TABLE = "bulk_load_state"
+MACHINE_TABLE = "machine_names"
+PLACEHOLDER = "?"  # qmark parameters (pyodbc, sqlite3)
+CONSUMER = "machine_data"  # name the SQL Server loads are acknowledged under
+
+INT_RANGES = {
+    "TINYINT": (0, 255),
+    "SMALLINT": (-2 ** 15, 2 ** 15 - 1),
+    "INT": (-2 ** 31, 2 ** 31 - 1),
+    "BIGINT": (-2 ** 63, 2 ** 63 - 1),
+}
+DATETIME_MIN = datetime(1753, 1, 1)  # first day of SQL Server's DATETIME
+KEY_RANGE_GAP = timedelta(days=1)  # a machine's rows further apart are looked up in separate ranges
+KEY_RANGES_PER_QUERY = 200  # 3 parameters each, under SQL Server's 2100
+
+# Columns sp_Import*Logs compares to skip rows already in the table. The
+# rinse procedure empties rinse_logs and loads it again instead.
+NATURAL_KEYS = {
+    "cleaning_logs": ["machine_id", "timestamp_start", "timestamp_end"],
+    "product_logs": ["machine_id", "timestamp", "prod_type", "water_qnty"],
+    "info_logs": ["machine_id", "timestamp", "number", "typography"],
+}
+
+
+# === HELPERS ===
+# Field converters, None where TRY_CAST gives NULL
+def int_converter(low, high):
+    def convert(value):
+        try:
+            number = int(value)
+        except ValueError:
+            return None
+        return number if low <= number <= high else None
+    return convert
+
+def to_float(value):
+    try:
+        number = float(value)
+    except ValueError:
+        return None
+    return number if math.isfinite(number) else None
+
+def to_datetime(value):
+    try:
+        moment = datetime.fromisoformat(value)  # "YYYY-MM-DD HH:MM:SS"
+    except ValueError:
+        return None
+    return moment if moment >= DATETIME_MIN else None
+
+# Longer text is cut to the column size, as by the procedures' NVARCHAR variables
+def text_converter(length):
+    return lambda value: value[:length]
+
+def converter(sql_type):
+    base, _, size = sql_type.partition("(")
+    if base in INT_RANGES:
+        return int_converter(*INT_RANGES[base])
+    if base == "FLOAT":
+        return to_float
+    if base == "DATETIME":
+        return to_datetime
+    if size:
+        return text_converter(int(size.rstrip(")")))
+    return str
+
+# Typed parameter rows of bulk lines
+def typed_rows(lines, converters):
+    return [
+        tuple(None if value == "" else convert(value) for convert, value in zip(converters, fields))
+        for fields in csv.reader(lines, delimiter=";")
+    ]
+
+# Key values compared as the database returns them: SQLite gives back the
+# text of a datetime
+def key_value(value):
+    return value.isoformat(" ") if isinstance(value, datetime) else value
+
+# (machine_id, first, last) time ranges covering the rows of a batch: one
+# per run of a machine's rows no more than KEY_RANGE_GAP apart
+def key_ranges(keys):
+    moments = {}
+    for key in keys:
+        if None not in key:
+            moments.setdefault(key[0], []).append(key[1])
+    ranges = []
+    for machine_id, times in sorted(moments.items()):
+        times.sort()
+        first = last = times[0]
+        for moment in times[1:]:
+            if moment - last > KEY_RANGE_GAP:
+                ranges.append((machine_id, first, last))
+                first = moment
+            last = moment
+        ranges.append((machine_id, first, last))
+    return ranges
+
+# Natural keys of a table in (machine_id, first, last) ranges of its first
+# two key columns, KEY_RANGES_PER_QUERY ranges per query, as key_value()s
+def existing_keys(cursor, table, key_columns, ranges, placeholder=PLACEHOLDER):
+    machine, moment = key_columns[:2]
+    condition = f"({machine} = {placeholder} AND {moment} BETWEEN {placeholder} AND {placeholder})"
+    existing = set()
+    for start in range(0, len(ranges), KEY_RANGES_PER_QUERY):
+        chunk = ranges[start:start + KEY_RANGES_PER_QUERY]
+        cursor.execute(f"SELECT {', '.join(key_columns)} FROM {table} WHERE "
+                       + " OR ".join(condition for _ in chunk), [value for r in chunk for value in r])
+        existing.update(tuple(key_value(value) for value in key) for key in cursor.fetchall())
+    return existing
+
+# Rows whose natural key is not in the table yet. Only the rows of the
+# batch's machines around its timestamps are read back, so the cost follows
+# the batch and not the table (an index on machine_id and the time column
+# keeps each range a seek). As in SQL, a key with a NULL never matches.
+def new_rows(cursor, table, names, rows, placeholder=PLACEHOLDER):
+    key_columns = NATURAL_KEYS.get(table)
+    if not key_columns or not rows:
+        return rows
+    positions = [names.index(name) for name in key_columns]
+    keys = [tuple(row[p] for p in positions) for row in rows]
+    existing = existing_keys(cursor, table, key_columns, key_ranges(keys), placeholder)
+    return [row for row, key in zip(rows, keys)
+            if None in key or tuple(key_value(value) for value in key) not in existing]
+
+def insert_sql(table, columns, placeholder=PLACEHOLDER):
+    return (f"INSERT INTO {table} ({', '.join(columns)}) "
+            f"VALUES ({', '.join(placeholder for _ in columns)})")
+
+def fast_cursor(conn):
+    cursor = conn.cursor()
+    if hasattr(cursor, "fast_executemany"):
+        cursor.fast_executemany = True
+    return cursor
+
+# (seq, batch) of the batches of a table already committed. The state table
+# is created on first use; the driver's error type is not known here, so any
+# error of the query means it is missing.
+def loaded_batches(conn, table, placeholder=PLACEHOLDER):
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"SELECT seq, batch FROM {STATE_TABLE} WHERE table_name = {placeholder}", (table,))
+    except Exception:
+        conn.rollback()
+        cursor.execute(f"CREATE TABLE {STATE_TABLE} (table_name VARCHAR(128) NOT NULL, seq INT NOT NULL, "
+                       f"batch INT NOT NULL, rows_loaded INT NOT NULL, loaded_at DATETIME NOT NULL, "
+                       f"PRIMARY KEY (table_name, seq, batch))")
+        conn.commit()
+        return set()
+    return {(seq, batch) for seq, batch in cursor.fetchall()}
+
+# Add the machine ids of rows that machine_names does not know yet
+def add_machines(cursor, rows, position, known, placeholder=PLACEHOLDER):
+    new_ids = sorted({row[position] for row in rows if row[position] is not None} - known)
+    if new_ids:
+        cursor.executemany(insert_sql(MACHINE_TABLE, ["machine_id", "name"], placeholder),
+                           [(machine_id, f"Machine {machine_id}") for machine_id in new_ids])
+        known.update(new_ids)
+    return len(new_ids)
+
+# Target tables for a local stand-in database, laid out like machine_data
+def create_tables(conn, manifest):
+    columns = ", ".join(f"{name} {sql_type}" for name, sql_type in manifest["columns"])
+    cursor = conn.cursor()
+    cursor.execute(f"CREATE TABLE IF NOT EXISTS {MACHINE_TABLE} (machine_id INT PRIMARY KEY, name NVARCHAR(100))")
+    cursor.execute(f"CREATE TABLE IF NOT EXISTS {manifest['table']} (log_id INTEGER PRIMARY KEY, {columns})")
+    key_columns = NATURAL_KEYS.get(manifest["table"])
+    if key_columns:
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS ix_{manifest['table']}_key "
+                       f"ON {manifest['table']} ({', '.join(key_columns[:2])})")
+    conn.commit()
+
+def sqlite_connection(path):
+    sqlite3.register_adapter(datetime, lambda value: value.isoformat(" "))
+    return sqlite3.connect(path)
+
+def odbc_connection(connection_string):
+    import pyodbc  # only needed for SQL Server
+    return pyodbc.connect(connection_string)
+
+
+# === MAIN PROCESS ===
+def load_category(conn, bulk_dir, consumer=CONSUMER, placeholder=PLACEHOLDER, metrics=None):
+    """Insert the bulk files consumer has not acknowledged yet; returns the number of rows inserted.
+
+    Raises ValueError when a file does not match its MD5.
+    """
+    manifest = load_manifest(bulk_dir)
+    if manifest is None:
+        print(f"No bulk-load files in {bulk_dir}")
+        return 0
+    category, table = manifest["category"], manifest["table"]
+    metrics = metrics if metrics is not None else RunMetrics("bulk_load", category)
+    names = [name for name, _ in manifest["columns"]]
+    converters = [converter(sql_type) for _, sql_type in manifest["columns"]]
+    statement = insert_sql(table, names, placeholder)
+
+    done = loaded_batches(conn, table, placeholder)
+    cursor = fast_cursor(conn)
+    cursor.execute(f"SELECT machine_id FROM {MACHINE_TABLE}")
+    known = {row[0] for row in cursor.fetchall()}
+
+    inserted = 0
+    for entry in pending_files(bulk_dir, consumer):
+        if not verify_file(bulk_dir, entry):
+            raise ValueError(f"{entry['file']} does not match its MD5 in the manifest")
+        for number, batch in enumerate(entry["batches"], 1):
+            if (entry["seq"], number) in done:
+                continue
+            with metrics.timer("read", category):
+                rows = typed_rows(read_batch(bulk_dir, entry, batch), converters)
+            with metrics.timer("load", category):
+                fresh = new_rows(cursor, table, names, rows, placeholder)
+                metrics.count("rows_skipped", len(rows) - len(fresh), category)
+                rows = fresh
+                machines = add_machines(cursor, rows, names.index("machine_id"), known, placeholder)
+                if rows:  # pyodbc rejects an empty executemany; the batch is still recorded
+                    cursor.executemany(statement, rows)
+                cursor.execute(
+                    f"INSERT INTO {STATE_TABLE} (table_name, seq, batch, rows_loaded, loaded_at) "
+                    f"VALUES ({', '.join(placeholder for _ in range(5))})",
+                    (table, entry["seq"], number, len(rows), datetime.now().replace(microsecond=0)))
+                conn.commit()
+            metrics.count("rows_loaded", len(rows), category)
+            metrics.count("machines_added", machines, category)
+            inserted += len(rows)
+            print(f"Loaded {entry['file']} rows {batch['first_row']}-{batch['last_row']} into {table}")
+        acknowledge(bulk_dir, consumer, entry["seq"])
+    print(f"{inserted} row(s) loaded into {table}")
+    return inserted
+
+
+def main(argv=None):
+    from SilverEngine import category_paths
+    from SilverRunner import SPEC_MODULES
+
+    parser = argparse.ArgumentParser(description="Load the silver bulk-load files into the database.")
+    parser.add_argument("categories", nargs="*",
+                        help=f"Categories to load, among {', '.join(SPEC_MODULES)} (default: all)")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--odbc", help="ODBC connection string of the SQL Server database (needs pyodbc)")
+    target.add_argument("--sqlite", help="Path of a local SQLite database standing in for SQL Server")
+    parser.add_argument("--consumer", default=None,
+                        help=f"Name the loads are acknowledged under (default: {CONSUMER}, "
+                             f"or the file name of the SQLite database)")
+    parser.add_argument("--create-tables", action="store_true",
+                        help="Create the target tables when missing (for a local SQLite database)")
+    parser.add_argument("--prometheus", action="store_true", default=PROMETHEUS_OUTPUT,
+                        help="Also write the run metrics as a Prometheus text file next to the JSON report")
+    args = parser.parse_args(argv)
+
+    unknown = [c for c in args.categories if c not in SPEC_MODULES]
+    if unknown:
+        parser.error(f"unknown categories: {', '.join(unknown)}")
+
+    conn = sqlite_connection(args.sqlite) if args.sqlite else odbc_connection(args.odbc)
+    consumer = args.consumer or (os.path.basename(args.sqlite) if args.sqlite else CONSUMER)
+    metrics = RunMetrics("bulk_load")
+    status = 0
+    try:
+        for category in args.categories or list(SPEC_MODULES):
+            print(f"=== {category} ===")
+            bulk_dir = category_paths(category).bulk_dir
+            manifest = load_manifest(bulk_dir)
+            if args.create_tables and manifest is not None:
+                create_tables(conn, manifest)
+            with metrics.timer("total", category):
+                load_category(conn, bulk_dir, consumer, metrics=metrics)
+    except Exception as e:
+        print(f"Error loading the bulk files: {e}")
+        conn.rollback()
+        status = 1
+    finally:
+        conn.close()
+    print(f"Run report written to {metrics.write_report(status, args.prometheus)}")
+    return status
+
+if __name__ == "__main__":
+    sys.exit(main())
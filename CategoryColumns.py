@@ -0,0 +1,29 @@
+# Columns of the four bronze categories, shared by the bronze and silver steps.
+#
+# ExtractEversysData rejects a source file missing one of them before
+# appending it to <Category>.dat, and every silver spec (Silver*Script.py)
+# declares how each of them is validated; CategorySpec checks that the two
+# lists agree. The module imports nothing, so that the bronze step does not
+# load the silver engine, pandas and numpy just to read column names.
+
+COLUMNS = {
+    "Cleaning": [
+        "machine_id", "timestamp_start", "timestamp_end", "powder_clean_status", "tabs_status_left",
+        "tabs_status_right", "detergent_status_left", "detergent_status_right", "milk_pump_error_left",
+        "milk_pump_error_right", "milk_temp_left_1", "milk_temp_left_2", "milk_temp_right_1", "milk_temp_right_2",
+        "milk_rpm_left_1", "milk_rpm_left_2", "milk_rpm_right_1", "milk_rpm_right_2", "milk_clean_temp_left",
+        "milk_clean_temp_right", "milk_clean_rpm_left", "milk_clean_rpm_right", "milk_seq_cycle_left",
+        "milk_seq_cycle_right",
+    ],
+    "Info": ["machine_id", "timestamp", "number", "typography", "type_number"],
+    "Rinse": [
+        "machine_id", "timestamp", "rinse_type", "flow_rate_left", "flow_rate_right", "status_left",
+        "status_right", "pump_pressure", "nozzle_flow_rate_left", "nozzle_flow_rate_right", "nozzle_status_left",
+        "nozzle_status_right",
+    ],
+    "Product": [
+        "machine_id", "timestamp", "press_before", "press_after", "press_final", "grind_time", "ext_time",
+        "water_qnty", "water_temp", "prod_type", "double_prod", "bean_hopper", "outlet_side", "stopped",
+        "milk_temp", "steam_pressure", "grind_adjust_left", "grind_adjust_right", "milk_time", "boiler_temp",
+    ],
+}
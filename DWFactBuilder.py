@@ -0,0 +1,453 @@
+import os
+import re
+import sys
+import sqlite3
+import argparse
+from datetime import date, datetime, time
+from BulkLoader import (PLACEHOLDER, STATE_TABLE, converter, existing_keys, fast_cursor, insert_sql,
+                        loaded_batches, odbc_connection, sqlite_connection, typed_rows)
+from RunMetrics import PROMETHEUS_OUTPUT, RunMetrics
+from SilverBulk import acknowledge, load_manifest, pending_files, read_batch, verify_file
+
+# Python fact builder of the DWmachines star schema.
+#
+# Replaces sp_LoadDWData_Master (sp_EnsureDimensionCompleteness,
+# sp_LoadDimensionTables, sp_LoadFact*), which resolve every foreign key with
+# joins against the dimensions and scan the whole machine_data tables on
+# each load. The builder is a consumer of the silver bulk files (see
+# SilverBulk): it reads the rows of the files it has not acknowledged yet
+# and turns them into FactMachineCleaning, FactRinseOperation, FactInfoLog
+# and FactProductRun rows with the same mapping as the procedures (defaults
+# for NULL statuses, ISNULL(x, 0) measures, BIT flags, date_id YYYYMMDD,
+# time_id the minute of the day, cleaning_duration_minutes).
+#
+# Every dimension is read once into a KeyCache: a dictionary from the value
+# found in the rows (a date, a time of day, a machine id, a status code) to
+# its key. A value missing from the table is added to the cache and its
+# member inserted with the next batch, named as sp_LoadDimensionTables names
+# it, or "Auto-added ..." as sp_EnsureDimensionCompleteness does. Each batch
+# is committed with its dimension members and a bulk_load_state row, so an
+# interrupted load resumes without duplicates. Facts whose key is in the
+# fact table already (loaded by sp_LoadFact*, or from a batch whose state
+# row was lost) are skipped like the procedures' anti-join does, reading
+# back only the batch's machines and days. --sqlite with --create-schema
+# builds a local copy of the sp_CreateDWSchema layout, foreign keys
+# enforced, to check a load.
+
+# === CONFIG ===
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+DW_SCHEMA_FILE = os.path.join(REPO_DIR, "Technical_Documentation", "sql_scripts_backup", "sp_CreateDWSchema.sql")
+CONSUMER = "DWmachines"  # name the fact loads are acknowledged under
+
+HOLIDAYS = {(1, 1), (7, 4), (12, 25)}  # (month, day), as sp_LoadDimensionTables marks them
+
+# Lookup dimensions: table, key column, name columns, members defined in
+# sp_LoadDimensionTables and the names of auto-added members
+LOOKUPS = {
+    "product_type": ("DimProductType", "product_type_id", ["prod_type", "description"], {
+        0: ("None", "Aucun produit"), 1: ("Ristretto", "Standard Ristretto"),
+        2: ("Expresso", "Standard Expresso"), 3: ("Coffee", "Standard Coffee"),
+        4: ("Filter Coffee", "Filtered Coffee"), 5: ("Americano", "Standard Americano"),
+        6: ("Coffee Pot", "Standard Coffee Pot"), 7: ("Filter coffee Pot", "Filtered Coffee Pot"),
+        8: ("Hot Water", "Hot Water Only"), 9: ("Manual Steam", "Steam"), 10: ("Auto Steam", "Auto Steam"),
+        11: ("Everfoam", "Everfoam"), 12: ("Milk Coffee", "Standard Coffee with milk"),
+        13: ("Cappuccino", "Cappuccino"), 14: ("Expresso Macchiatto", "Expresso Macchiatto"),
+        15: ("Latte Macchiatto", "Latte Macchiatto"), 16: ("Milk", "Hot Milk"), 17: ("Milk Foam", "Milk Foam"),
+        18: ("Powder", "Powder"), 19: ("White Americano", "White Americano"), 20: ("Max", "Max"),
+        255: ("Undefined", "Undefined"),
+    }, ("Auto-added Type {}", "Automatically added product type {}")),
+    "powder_status": ("DimPowderStatus", "powder_status_id", ["status_name"], {
+        0: ("Undefined",), 1: ("Not Necessary",), 2: ("Mixer Cleaned",), 3: ("Without Mixer",), 4: ("Max",),
+    }, ("Auto-added Powder Status {}",)),
+    "tabs_status": ("DimTabsStatus", "tabs_status_id", ["tabs_status_name"], {
+        0: ("No",), 1: ("Yes",), 2: ("Undefined",), 3: ("Error",), 4: ("Unknown",), 5: ("Not Necessary",),
+        6: ("Cycle Error",), 7: ("Max",),
+    }, ("Auto-added Tabs Status {}",)),
+    "detergent_status": ("DimDetergentStatus", "detergent_status_id", ["detergent_status_name"], {
+        0: ("Not defined",), 1: ("No",), 2: ("Yes",), 3: ("Error",), 4: ("Unknown",), 5: ("Not Necessary",),
+        6: ("Cycle Abort",), 7: ("Cycle Warning",), 8: ("Detergent Warning",), 9: ("Max",),
+    }, ("Auto-added Status {}",)),
+    "rinse_type": ("DimRinseType", "rinse_type_id", ["rinse_type_name"], {
+        0: ("Initial Reboot",), 1: ("Initial Wake Up",), 2: ("Warm Left",), 3: ("Warm Right",),
+        4: ("After Clean",), 5: ("Flow Rate",), 6: ("Requested ETC",), 7: ("Max",), 255: ("Undefined",),
+    }, ("Auto-added Rinse Type {}",)),
+    "rinse_status": ("DimRinseStatus", "rinse_status_id", ["rinse_status_name"], {
+        0: ("Undefined",), 1: ("Unknown",), 2: ("Too Low",), 3: ("Too High",), 4: ("Nozzel 05",),
+        5: ("Nozzel 07",), 6: ("System OK",),
+    }, ("Auto-added Status {}",)),
+    "nozzle_status": ("DimNozzleStatus", "nozzle_status_id", ["nozzle_status_name"], {
+        0: ("Undefined",), 1: ("Unknown",), 2: ("Too Low",), 3: ("Too High",), 4: ("Nuzzle 05",),
+        5: ("Nuzle 07",), 6: ("System OK",), 255: ("Null",),
+    }, ("Auto-added Nozzle Status {}",)),
+    "bean_hopper": ("DimBeanHopper", "bean_hopper_id", ["bean_hopper_name"], {
+        0: ("Front Right",), 1: ("Rear Left",), 2: ("Mix",), 3: ("Powder chute",), 255: ("None",),
+    }, ("Auto-added Hopper {}",)),
+    "outlet_side": ("DimOutletSide", "outlet_side_id", ["outlet_side_name"], {
+        0: ("Left",), 1: ("Right",),
+    }, ("Auto-added Outlet {}",)),
+    "stopped": ("DimStopped", "stopped_id", ["stopped_name"], {
+        0: ("Finished",), 1: ("Stopped",), 2: ("Machine Abort",), 3: ("User Abort",),
+    }, ("Auto-added Stopped {}",)),
+}
+
+# Measures copied as ISNULL(value, 0), in fact table order
+CLEANING_MEASURES = [
+    "milk_clean_temp_left_1", "milk_clean_temp_left_2", "milk_clean_temp_right_1", "milk_clean_temp_right_2",
+    "milk_clean_rpm_left_1", "milk_clean_rpm_left_2", "milk_clean_rpm_right_1", "milk_clean_rpm_right_2",
+    "milk_seq_cycle_left_1", "milk_seq_cycle_left_2", "milk_seq_cycle_right_1", "milk_seq_cycle_right_2",
+    "milk_temp_left_1", "milk_temp_left_2", "milk_temp_right_1", "milk_temp_right_2",
+    "milk_rpm_left_1", "milk_rpm_left_2", "milk_rpm_right_1", "milk_rpm_right_2",
+]
+RINSE_MEASURES = ["flow_rate_left", "flow_rate_right", "pump_pressure", "nozzle_flow_rate_left",
+                  "nozzle_flow_rate_right"]
+PRODUCT_MEASURES = ["press_before", "press_after", "press_final", "grind_time", "ext_time", "water_qnty",
+                    "water_temp"]
+PRODUCT_MILK_MEASURES = ["milk_temp", "steam_pressure", "grind_adjust_left", "grind_adjust_right", "milk_time",
+                         "boiler_temp"]
+
+
+# === DIMENSION CACHES ===
+class KeyCache:
+    """Key of each value of one dimension, preloaded from its table.
+
+    Values whose key is not in the table yet get their member queued, and
+    flush() inserts the queued members.
+    """
+    def __init__(self, table, columns, member, to_key=lambda value: value):
+        self.table = table
+        self.columns = columns  # key column first
+        self.member = member    # key -> row of the member
+        self.to_key = to_key    # value -> key
+        self.keys = {}
+        self.known = set()
+        self.missing = {}
+
+    def preload(self, cursor):
+        cursor.execute(f"SELECT {self.columns[0]} FROM {self.table}")
+        self.known = {row[0] for row in cursor.fetchall()}
+        return self
+
+    def __getitem__(self, value):
+        try:
+            return self.keys[value]
+        except KeyError:
+            key = self.keys[value] = self.to_key(value)
+            if key not in self.known:
+                self.known.add(key)
+                self.missing[key] = self.member(key)
+            return key
+
+    def flush(self, cursor, placeholder=PLACEHOLDER):
+        if not self.missing:
+            return 0
+        cursor.executemany(insert_sql(self.table, self.columns, placeholder), list(self.missing.values()))
+        added = len(self.missing)
+        self.missing = {}
+        return added
+
+
+def date_key(day):
+    return day.year * 10000 + day.month * 100 + day.day
+
+def date_member(key):
+    day = date(key // 10000, key // 100 % 100, key % 100)
+    return (key, day, day.day, day.month, (day.month - 1) // 3 + 1, day.year,
+            int(day.weekday() >= 5), int((day.month, day.day) in HOLIDAYS))
+
+# DimTime has one member per minute of the day
+def time_key(moment):
+    return moment.hour * 60 + moment.minute
+
+def time_member(key):
+    hour, minute = divmod(key, 60)
+    shift = "Morning" if 6 <= hour < 14 else "Evening" if 14 <= hour < 22 else "Night"
+    return (key, time(hour, minute), hour, minute, 0, "AM" if hour < 12 else "PM", shift)
+
+def lookup_cache(table, key_column, name_columns, members, auto_names):
+    def member(key):
+        names = members.get(key) or tuple(name.format(key) for name in auto_names)
+        return (key, *names)
+    return KeyCache(table, [key_column, *name_columns], member)
+
+def load_caches(cursor):
+    caches = {
+        "machine": KeyCache("DimMachine", ["machine_id", "machine_name"], lambda key: (key, f"Machine {key}")),
+        "date": KeyCache("DimDate", ["date_id", "full_date", "day", "month", "quarter", "year", "is_weekend",
+                                     "is_holiday"], date_member, date_key),
+        "time": KeyCache("DimTime", ["time_id", "full_time", "hour", "minute", "second", "am_pm", "shift"],
+                         time_member, time_key),
+    }
+    for name, definition in LOOKUPS.items():
+        caches[name] = lookup_cache(*definition)
+    for cache in caches.values():
+        cache.preload(cursor)
+    return caches
+
+# Insert the lookup members sp_LoadDimensionTables defines and that are
+# missing, so that they carry their proper names rather than auto-added ones
+def add_defined_members(caches):
+    for name, (_, _, _, members, _) in LOOKUPS.items():
+        for key in members:
+            caches[name][key]
+
+
+# === FACT ROWS ===
+def value_or(value, default):
+    return default if value is None else value
+
+def flag(value, true_value):
+    return 1 if value == true_value else 0
+
+# DATEDIFF(MINUTE, start, end): minute boundaries crossed
+def duration_minutes(start, end):
+    return int((end.replace(second=0, microsecond=0) - start.replace(second=0, microsecond=0)).total_seconds() // 60)
+
+def date_and_time(caches, moment):
+    if moment is None:
+        return None, None
+    return caches["date"][moment.date()], caches["time"][moment.time()]
+
+def cleaning_fact(row, caches):
+    start, end = row["timestamp_start"], row["timestamp_end"]
+    if start is None or end is None:
+        return None
+    return (
+        caches["machine"][row["machine_id"]],
+        caches["date"][start.date()],
+        caches["time"][start.time()],
+        caches["time"][end.time()],
+        caches["powder_status"][value_or(row["powder_clean_status"], 0)],
+        caches["tabs_status"][value_or(row["tabs_status_left"], 2)],
+        caches["tabs_status"][value_or(row["tabs_status_right"], 2)],
+        caches["detergent_status"][value_or(row["detergent_status_left"], 0)],
+        caches["detergent_status"][value_or(row["detergent_status_right"], 0)],
+        1 - flag(row["milk_pump_error_left"], 0),
+        1 - flag(row["milk_pump_error_right"], 0),
+        *(value_or(row[name], 0) for name in CLEANING_MEASURES),
+        duration_minutes(start, end),
+    )
+
+def rinse_fact(row, caches):
+    return (
+        caches["machine"][row["machine_id"]],
+        *date_and_time(caches, row["timestamp"]),
+        caches["rinse_type"][value_or(row["rinse_type"], 255)],
+        value_or(row["flow_rate_left"], 0),
+        value_or(row["flow_rate_right"], 0),
+        caches["rinse_status"][value_or(row["status_left"], 0)],
+        caches["rinse_status"][value_or(row["status_right"], 0)],
+        *(value_or(row[name], 0) for name in RINSE_MEASURES[2:]),
+        caches["nozzle_status"][value_or(row["nozzle_status_left"], 0)],
+        caches["nozzle_status"][value_or(row["nozzle_status_right"], 0)],
+    )
+
+# Message number without its two-character prefix, 0 when not numeric
+def info_number(text):
+    digits = (text or "")[2:]
+    return int(digits) if digits.lstrip("+-").isdigit() else 0
+
+# CAST(type_number AS NVARCHAR) of the procedure: whole numbers without ".0"
+def number_text(value):
+    if value is None:
+        return None
+    return str(int(value)) if float(value).is_integer() else str(value)
+
+def info_fact(row, caches):
+    return (
+        caches["machine"][row["machine_id"]],
+        *date_and_time(caches, row["timestamp"]),
+        info_number(row["number"]),
+        row["typography"],
+        number_text(row["type_number"]),
+    )
+
+def product_fact(row, caches):
+    outlet_side, stopped = row["outlet_side"], row["stopped"]
+    return (
+        caches["machine"][row["machine_id"]],
+        *date_and_time(caches, row["timestamp"]),
+        caches["product_type"][value_or(row["prod_type"], 255)],
+        flag(row["double_prod"], 1),
+        caches["bean_hopper"][value_or(row["bean_hopper"], 255)],
+        *(value_or(row[name], 0) for name in PRODUCT_MEASURES),
+        0 if outlet_side is None else caches["outlet_side"][outlet_side],
+        0 if stopped is None else caches["stopped"][stopped],
+        *(value_or(row[name], 0) for name in PRODUCT_MILK_MEASURES),
+    )
+
+# Category -> fact table, its columns and the builder of one fact row
+FACTS = {
+    "Cleaning": ("FactMachineCleaning", [
+        "machine_id", "date_id", "time_start_id", "time_end_id", "powder_clean_status", "tabs_status_left",
+        "tabs_status_right", "detergent_status_left", "detergent_status_right", "milk_pump_error_left",
+        "milk_pump_error_right", *CLEANING_MEASURES, "cleaning_duration_minutes",
+    ], cleaning_fact),
+    "Rinse": ("FactRinseOperation", [
+        "machine_id", "date_id", "time_id", "rinse_type", "flow_rate_left", "flow_rate_right", "status_left",
+        "status_right", *RINSE_MEASURES[2:], "nozzle_status_left", "nozzle_status_right",
+    ], rinse_fact),
+    "Info": ("FactInfoLog", ["machine_id", "date_id", "time_id", "number", "typography", "type_number"], info_fact),
+    "Product": ("FactProductRun", [
+        "machine_id", "date_id", "time_id", "product_type_id", "double_prod", "bean_hopper", *PRODUCT_MEASURES,
+        "outlet_side", "stopped", *PRODUCT_MILK_MEASURES,
+    ], product_fact),
+}
+
+# Fact columns sp_LoadFact* compare to skip the facts already loaded
+FACT_KEYS = {
+    "FactMachineCleaning": ["machine_id", "date_id", "time_start_id"],
+    "FactRinseOperation": ["machine_id", "date_id", "time_id", "rinse_type"],
+    "FactInfoLog": ["machine_id", "date_id", "time_id", "number"],
+    "FactProductRun": ["machine_id", "date_id", "time_id", "product_type_id"],
+}
+
+def build_facts(category, names, rows, caches):
+    """Fact rows of typed silver rows (in the bulk file's column order); rows the facts skip are left out."""
+    build = FACTS[category][2]
+    facts = (build(dict(zip(names, row)), caches) for row in rows if row[0] is not None)
+    return [fact for fact in facts if fact is not None]
+
+
+# Facts whose key is not in the fact table yet, looked up per machine and day
+def new_facts(cursor, table, columns, facts, placeholder=PLACEHOLDER):
+    key_columns = FACT_KEYS[table]
+    positions = [columns.index(name) for name in key_columns]
+    keys = [tuple(fact[p] for p in positions) for fact in facts]
+    ranges = sorted({(key[0], key[1], key[1]) for key in keys if None not in key})
+    existing = existing_keys(cursor, table, key_columns, ranges, placeholder)
+    return [fact for fact, key in zip(facts, keys) if None in key or key not in existing]
+
+
+# === SQLITE COPY OF THE DW SCHEMA ===
+# The CREATE TABLE statements of sp_CreateDWSchema, with its foreign keys
+# declared in the tables (SQLite has no ALTER TABLE ADD CONSTRAINT)
+def sqlite_schema(sql_text):
+    foreign_keys = {}
+    for table, column, ref_table, ref_column in re.findall(
+            r"ALTER TABLE \[(\w+)\] ADD CONSTRAINT \[\w+\]\s*FOREIGN KEY \(\[(\w+)\]\) "
+            r"REFERENCES \[(\w+)\] \(\[(\w+)\]\)", sql_text):
+        foreign_keys.setdefault(table, []).append(f"FOREIGN KEY ({column}) REFERENCES {ref_table} ({ref_column})")
+
+    statements = []
+    for table, body in re.findall(r"CREATE TABLE \[(\w+)\] \((.*?)\n\s*\);", sql_text, re.S):
+        columns = [line.strip().rstrip(",") for line in body.strip().splitlines() if line.strip()]
+        columns = [re.sub(r"int IDENTITY\(1,1\) PRIMARY KEY", "INTEGER PRIMARY KEY", column).replace("[", "")
+                   .replace("]", "") for column in columns]
+        statements.append(f"CREATE TABLE IF NOT EXISTS {table} ({', '.join(columns + foreign_keys.get(table, []))})")
+    return statements
+
+def create_sqlite_schema(conn, schema_file=DW_SCHEMA_FILE):
+    with open(schema_file, "r", encoding="utf-8-sig") as f:
+        statements = sqlite_schema(f.read())
+    for statement in statements:
+        conn.execute(statement)
+    for table, key_columns in FACT_KEYS.items():
+        conn.execute(f"CREATE INDEX IF NOT EXISTS ix_{table}_key ON {table} ({', '.join(key_columns[:2])})")
+    conn.commit()
+    return len(statements)
+
+def sqlite_dw_connection(path):
+    for value_type in (date, time):
+        sqlite3.register_adapter(value_type, lambda value: value.isoformat())
+    conn = sqlite_connection(path)
+    conn.execute("PRAGMA foreign_keys = ON")
+    return conn
+
+
+# === MAIN PROCESS ===
+def load_facts(conn, category, bulk_dir, caches, consumer=CONSUMER, placeholder=PLACEHOLDER, metrics=None):
+    """Build and insert the facts of the bulk files consumer has not acknowledged; returns the facts inserted.
+
+    Raises ValueError when a file does not match its MD5.
+    """
+    manifest = load_manifest(bulk_dir)
+    if manifest is None:
+        print(f"No bulk-load files in {bulk_dir}")
+        return 0
+    metrics = metrics if metrics is not None else RunMetrics("dw_facts", category)
+    table, fact_columns, _ = FACTS[category]
+    names = [name for name, _ in manifest["columns"]]
+    converters = [converter(sql_type) for _, sql_type in manifest["columns"]]
+    statement = insert_sql(table, fact_columns, placeholder)
+
+    done = loaded_batches(conn, table, placeholder)
+    cursor = fast_cursor(conn)
+    inserted = 0
+    for entry in pending_files(bulk_dir, consumer):
+        if not verify_file(bulk_dir, entry):
+            raise ValueError(f"{entry['file']} does not match its MD5 in the manifest")
+        for number, batch in enumerate(entry["batches"], 1):
+            if (entry["seq"], number) in done:
+                continue
+            with metrics.timer("read", category):
+                rows = typed_rows(read_batch(bulk_dir, entry, batch), converters)
+            with metrics.timer("resolve", category):
+                facts = build_facts(category, names, rows, caches)
+            with metrics.timer("load", category):
+                fresh = new_facts(cursor, table, fact_columns, facts, placeholder)
+                metrics.count("facts_skipped", len(facts) - len(fresh), category)
+                facts = fresh
+                members = sum(cache.flush(cursor, placeholder) for cache in caches.values())
+                if facts:  # pyodbc rejects an empty executemany; the batch is still recorded
+                    cursor.executemany(statement, facts)
+                cursor.execute(
+                    f"INSERT INTO {STATE_TABLE} (table_name, seq, batch, rows_loaded, loaded_at) "
+                    f"VALUES ({', '.join(placeholder for _ in range(5))})",
+                    (table, entry["seq"], number, len(facts), datetime.now().replace(microsecond=0)))
+                conn.commit()
+            metrics.count("rows_read", len(rows), category)
+            metrics.count("facts_loaded", len(facts), category)
+            metrics.count("dimension_members_added", members, category)
+            inserted += len(facts)
+        acknowledge(bulk_dir, consumer, entry["seq"])
+    print(f"{inserted} fact(s) loaded into {table}")
+    return inserted
+
+
+def main(argv=None):
+    from SilverEngine import category_paths
+
+    parser = argparse.ArgumentParser(description="Build the DWmachines facts from the silver bulk files.")
+    parser.add_argument("categories", nargs="*", help=f"Categories to load, among {', '.join(FACTS)} (default: all)")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--odbc", help="ODBC connection string of the DWmachines database (needs pyodbc)")
+    target.add_argument("--sqlite", help="Path of a local SQLite copy of the DW schema")
+    parser.add_argument("--consumer", default=CONSUMER,
+                        help="Name the loads are acknowledged under in the bulk files (default: %(default)s)")
+    parser.add_argument("--create-schema", action="store_true",
+                        help="Create the sp_CreateDWSchema tables when missing (for a local SQLite database)")
+    parser.add_argument("--prometheus", action="store_true", default=PROMETHEUS_OUTPUT,
+                        help="Also write the run metrics as a Prometheus text file next to the JSON report")
+    args = parser.parse_args(argv)
+
+    unknown = [c for c in args.categories if c not in FACTS]
+    if unknown:
+        parser.error(f"unknown categories: {', '.join(unknown)}")
+
+    conn = sqlite_dw_connection(args.sqlite) if args.sqlite else odbc_connection(args.odbc)
+    metrics = RunMetrics("dw_facts")
+    status = 0
+    try:
+        if args.create_schema:
+            print(f"{create_sqlite_schema(conn)} DW table(s) checked")
+        caches = load_caches(conn.cursor())
+        add_defined_members(caches)
+        for category in args.categories or list(FACTS):
+            print(f"=== {category} ===")
+            with metrics.timer("total", category):
+                load_facts(conn, category, category_paths(category).bulk_dir, caches, args.consumer,
+                           metrics=metrics)
+        cursor = fast_cursor(conn)
+        sum(cache.flush(cursor) for cache in caches.values())
+        conn.commit()
+    except Exception as e:
+        print(f"Error loading the DW facts: {e}")
+        conn.rollback()
+        status = 1
+    finally:
+        conn.close()
+    print(f"Run report written to {metrics.write_report(status, args.prometheus)}")
+    return status
+
+if __name__ == "__main__":
+    sys.exit(main())
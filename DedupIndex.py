@@ -0,0 +1,195 @@
+import os
+import json
+import sqlite3
+import numpy as np
+
+# Compact on-disk index of the bronze lines already cleaned by a silver script.
+#
+# Replaces the cleaned_lines.txt text tracker (one hex MD5 per line, loaded
+# into a set of strings on every run). Digests are stored as 16-byte blobs in
+# an SQLite table and fronted by a Bloom filter kept in the same database, so
+# lines that were never seen are rejected without touching the table. Lookups
+# and inserts are done in batches. The filter is only written back when the
+# index is closed; after a run that did not close it, it is rebuilt from the
+# table.
+#
+# A commit can carry a journal, any JSON value, stored in the same
+# transaction as the digests. The silver engine records there the sizes its
+# outputs reach with the rows of those digests; the journal is cleared by the
+# next commit, not by close(), so that a run failing after a commit leaves it
+# to the next run's recovery. The digest is the same MD5 of the stripped
+# line as before, which lets an existing cleaned_lines.txt be imported once.
+
+BITS_PER_ENTRY = 10  # ~1% false positives with 7 hash functions
+HASH_COUNT = 7
+MIN_CAPACITY = 1 << 20
+QUERY_BATCH = 500  # stays below SQLite's host parameter limit
+MIGRATION_BATCH = 50000
+
+
+class BloomFilter:
+    def __init__(self, capacity, bits=None):
+        self.capacity = capacity
+        self.size = capacity * BITS_PER_ENTRY
+        if bits is None:
+            self.bits = np.zeros(self.size // 8 + 1, dtype=np.uint8)
+        else:
+            self.bits = np.frombuffer(bits, dtype=np.uint8).copy()
+
+    def _positions(self, digests):
+        # Digests are uniformly distributed already, split them into the two
+        # 64-bit halves used for double hashing
+        halves = np.frombuffer(b"".join(digests), dtype="<u8").reshape(-1, 2)
+        h1 = halves[:, 0:1]
+        h2 = halves[:, 1:2] | np.uint64(1)
+        steps = np.arange(HASH_COUNT, dtype=np.uint64)
+        return (h1 + steps * h2) % np.uint64(self.size)
+
+    def add(self, digests):
+        if not digests:
+            return
+        positions = self._positions(digests).ravel()
+        masks = np.left_shift(1, positions & np.uint64(7)).astype(np.uint8)
+        np.bitwise_or.at(self.bits, positions >> np.uint64(3), masks)
+
+    def might_contain(self, digests):
+        if not digests:
+            return np.zeros(0, dtype=bool)
+        positions = self._positions(digests)
+        bytes_ = self.bits[positions >> np.uint64(3)]
+        return ((bytes_ >> (positions & np.uint64(7)).astype(np.uint8)) & 1).all(axis=1)
+
+
+class DedupIndex:
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS seen (digest BLOB PRIMARY KEY) WITHOUT ROWID")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value)")
+        self.conn.commit()
+
+        self.count = self._get_meta("count", 0)
+        capacity = self._get_meta("bloom_capacity", None)
+        bits = self._get_meta("bloom_bits", None)
+        if capacity is None or bits is None or not self._get_meta("bloom_saved", 1):
+            self._rebuild_bloom()
+        else:
+            self.bloom = BloomFilter(capacity, bits)
+        # The stored bits fall behind the table from the first commit on
+        self._set_meta("bloom_saved", 0)
+        self.conn.commit()
+
+    def _get_meta(self, key, default):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return default if row is None else row[0]
+
+    def _set_meta(self, key, value):
+        self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def _rebuild_bloom(self):
+        self.count = self.conn.execute("SELECT COUNT(*) FROM seen").fetchone()[0]
+        self.bloom = BloomFilter(max(MIN_CAPACITY, 2 * self.count))
+        cursor = self.conn.execute("SELECT digest FROM seen")
+        while True:
+            rows = cursor.fetchmany(MIGRATION_BATCH)
+            if not rows:
+                break
+            self.bloom.add([row[0] for row in rows])
+
+    def contains_many(self, digests):
+        """Return one boolean per digest telling whether it is already indexed."""
+        maybe = self.bloom.might_contain(digests)
+        candidates = [d for d, m in zip(digests, maybe) if m]
+
+        found = set()
+        for i in range(0, len(candidates), QUERY_BATCH):
+            batch = candidates[i:i + QUERY_BATCH]
+            placeholders = ",".join("?" * len(batch))
+            rows = self.conn.execute(f"SELECT digest FROM seen WHERE digest IN ({placeholders})", batch)
+            found.update(row[0] for row in rows)
+        return [d in found for d in digests]
+
+    def filter_new(self, digests):
+        """Return a mask of the digests that are neither indexed nor repeated earlier in the batch."""
+        known = self.contains_many(digests)
+        batch_seen = set()
+        mask = []
+        for digest, is_known in zip(digests, known):
+            is_new = not is_known and digest not in batch_seen
+            batch_seen.add(digest)
+            mask.append(is_new)
+        return mask
+
+    def add_many(self, digests, commit=True, journal=None):
+        if not digests and journal is None:
+            return
+        before = self.conn.total_changes
+        self.conn.executemany("INSERT OR IGNORE INTO seen (digest) VALUES (?)", ((d,) for d in digests))
+        self.count += self.conn.total_changes - before
+
+        if self.count > self.bloom.capacity:
+            self._rebuild_bloom()
+        else:
+            self.bloom.add(digests)
+        if commit:
+            self.commit(journal)
+
+    # Forget digests, e.g. of quarantined lines about to be validated again.
+    # Their bits stay in the Bloom filter, which only costs a table lookup.
+    def remove_many(self, digests):
+        if not digests:
+            return
+        before = self.conn.total_changes
+        self.conn.executemany("DELETE FROM seen WHERE digest = ?", ((d,) for d in digests))
+        self.count -= self.conn.total_changes - before
+        self.commit()
+
+    def commit(self, journal=None):
+        self._set_meta("count", self.count)
+        self._set_meta("journal", None if journal is None else json.dumps(journal))
+        self.conn.commit()
+
+    # Journal of the last commit, None when it had none
+    def journal(self):
+        value = self._get_meta("journal", None)
+        return None if value is None else json.loads(value)
+
+    def close(self):
+        self._set_meta("bloom_capacity", self.bloom.capacity)
+        self._set_meta("bloom_bits", self.bloom.bits.tobytes())
+        self._set_meta("bloom_saved", 1)
+        self._set_meta("count", self.count)
+        self.conn.commit()
+        self.conn.close()
+
+    # One-time import of a cleaned_lines.txt tracker, renamed once imported
+    def migrate_text_tracker(self, tracker_path):
+        if not os.path.exists(tracker_path):
+            return
+        imported = 0
+        with open(tracker_path, "r") as f:
+            batch = []
+            for line in f:
+                line = line.strip()
+                if len(line) != 32:
+                    continue
+                try:
+                    batch.append(bytes.fromhex(line))
+                except ValueError:
+                    continue
+                if len(batch) >= MIGRATION_BATCH:
+                    self.add_many(batch, commit=False)
+                    imported += len(batch)
+                    batch = []
+            self.add_many(batch, commit=False)
+            imported += len(batch)
+        self.commit()
+        os.replace(tracker_path, tracker_path + ".migrated")
+        print(f"Migrated {imported} hashes from {tracker_path} to {self.path}")
+
+
+def open_index(index_path, legacy_tracker=None):
+    index = DedupIndex(index_path)
+    if legacy_tracker:
+        index.migrate_text_tracker(legacy_tracker)
+    return index
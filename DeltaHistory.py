@@ -0,0 +1,172 @@
+import os
+import sys
+import gzip
+import json
+import shutil
+import hashlib
+import argparse
+from datetime import datetime
+
+# Incremental history of the append-only bronze and silver files.
+#
+# Instead of copying the whole <Category>.dat / Silver_<Category>.dat into
+# YYYY/MM/DD/ on every run, only the bytes appended since the previous run are
+# stored there as a delta (gzip-compressed by default), and an entry is added
+# to history.jsonl next to the date folders:
+#     {"seq", "time", "file", "kind", "start", "end", "path", "tail_md5"}
+# kind is "base" (a full copy, taken the first time and whenever the file was
+# truncated or replaced) or "delta" (bytes start..end). tail_md5 is the MD5
+# of the last bytes before end and tells whether the file still continues
+# the recorded history. reconstruct() replays the last base and the deltas
+# after it to rebuild the file as it was at any point in time.
+
+MANIFEST_NAME = "history.jsonl"
+COMPRESS_HISTORY = True
+COMPRESS_LEVEL = 1  # ~9x faster than gzip's default 9, deltas ~15% larger
+TAIL_BYTES = 4096
+COPY_BLOCK = 1024 * 1024
+TIME_FORMAT = "%Y-%m-%dT%H:%M:%S"
+
+
+def load_entries(history_root, filename=None):
+    entries = []
+    try:
+        with open(os.path.join(history_root, MANIFEST_NAME), "r") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # Partial line from an interrupted write
+                if filename is None or entry["file"] == filename:
+                    entries.append(entry)
+    except OSError:
+        pass
+    return entries
+
+
+def tail_md5(path, end):
+    with open(path, "rb") as f:
+        f.seek(max(0, end - TAIL_BYTES))
+        return hashlib.md5(f.read(end - max(0, end - TAIL_BYTES))).hexdigest()
+
+
+def copy_range(source, start, end, target, compress):
+    temp_path = target + ".tmp"
+    dst = gzip.open(temp_path, "wb", compresslevel=COMPRESS_LEVEL) if compress else open(temp_path, "wb")
+    with open(source, "rb") as src, dst:
+        src.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            block = src.read(min(COPY_BLOCK, remaining))
+            if not block:
+                break
+            dst.write(block)
+            remaining -= len(block)
+    os.replace(temp_path, target)
+
+
+def record_changes(tracked_file, history_root, compress=COMPRESS_HISTORY, end=None):
+    """Store what was appended to tracked_file since the last recorded run.
+
+    end limits the history to the first end bytes (e.g. the committed size
+    of a file a run may still be appending to). Returns the path of the new
+    base or delta, or None when the file did not change.
+    """
+    if not os.path.exists(tracked_file):
+        return None
+    filename = os.path.basename(tracked_file)
+    size = os.path.getsize(tracked_file) if end is None else min(end, os.path.getsize(tracked_file))
+    entries = load_entries(history_root)
+    previous = [entry for entry in entries if entry["file"] == filename]
+    last = previous[-1] if previous else None
+
+    if last and size == last["end"] and tail_md5(tracked_file, size) == last["tail_md5"]:
+        return None
+    if last and size > last["end"] and tail_md5(tracked_file, last["end"]) == last["tail_md5"]:
+        kind, start = "delta", last["end"]
+    else:
+        kind, start = "base", 0
+
+    now = datetime.now()
+    seq = (entries[-1]["seq"] + 1) if entries else 1
+    relative = os.path.join(now.strftime("%Y"), now.strftime("%m"), now.strftime("%d"),
+                            f"{filename}.{seq:06d}.{kind}" + (".gz" if compress else ""))
+    target = os.path.join(history_root, relative)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    copy_range(tracked_file, start, size, target, compress)
+
+    entry = {
+        "seq": seq,
+        "time": now.strftime(TIME_FORMAT),
+        "file": filename,
+        "kind": kind,
+        "start": start,
+        "end": size,
+        "path": relative.replace(os.sep, "/"),
+        "tail_md5": tail_md5(tracked_file, size),
+    }
+    with open(os.path.join(history_root, MANIFEST_NAME), "a") as f:
+        f.write(json.dumps(entry) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    return target
+
+
+def reconstruct_file(history_root, filename, as_of, output_path):
+    """Rebuild filename as it was at as_of (a datetime) into output_path.
+
+    Returns the number of bytes written, or None when there is no history
+    of the file before as_of.
+    """
+    entries = [
+        entry for entry in load_entries(history_root, filename)
+        if datetime.strptime(entry["time"], TIME_FORMAT) <= as_of
+    ]
+    bases = [i for i, entry in enumerate(entries) if entry["kind"] == "base"]
+    if not bases:
+        return None
+    replay = entries[bases[-1]:]
+
+    written = 0
+    with open(output_path, "wb") as out:
+        for entry in replay:
+            if entry["start"] != written:
+                raise ValueError(f"History of {filename} has a gap before entry {entry['seq']}")
+            path = os.path.join(history_root, *entry["path"].split("/"))
+            opener = gzip.open if path.endswith(".gz") else open
+            with opener(path, "rb") as part:
+                shutil.copyfileobj(part, out, COPY_BLOCK)
+            written = entry["end"]
+    return written
+
+
+def reconstruct(category, as_of, layer="silver", output_path=None):
+    """Rebuild the bronze or silver file of a category as it was at as_of."""
+    base_dir = os.path.abspath(os.path.join(os.getcwd(), ".."))
+    if layer == "bronze":
+        history_root = os.path.join(base_dir, "BronzeRawData", category)
+        filename = f"{category}.dat"
+    else:
+        history_root = os.path.join(base_dir, "SilverRawData", category)
+        filename = f"Silver_{category}.dat"
+    output_path = output_path or f"{filename}.{as_of.strftime('%Y%m%d%H%M%S')}"
+    return reconstruct_file(history_root, filename, as_of, output_path), output_path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rebuild a bronze or silver file as it was at a point in time.")
+    parser.add_argument("category", help="Cleaning, Info, Rinse or Product")
+    parser.add_argument("as_of", help="Point in time, e.g. 2025-03-01T12:00:00")
+    parser.add_argument("--layer", choices=["bronze", "silver"], default="silver")
+    parser.add_argument("-o", "--output", default=None, help="Output file (default: <file>.<as_of>)")
+    args = parser.parse_args(argv)
+
+    size, output_path = reconstruct(args.category, datetime.fromisoformat(args.as_of), args.layer, args.output)
+    if size is None:
+        print(f"No {args.layer} history of {args.category} before {args.as_of}")
+        return 1
+    print(f"Rebuilt {output_path} ({size} bytes)")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,13 +1,11 @@
 import os
-import uuid
 import time
+import hashlib
+import argparse
 from concurrent.futures import ThreadPoolExecutor
-from smbprotocol.connection import Connection
-from smbprotocol.session import Session
-from smbprotocol.tree import TreeConnect
-from smbprotocol.open import Open, FilePipePrinterAccessMask
-from smbprotocol.file_info import FileInformationClass
-from smbprotocol.open import ImpersonationLevel, CreateDisposition, CreateOptions, ShareAccess, FileAttributes
+from SmbShare import LocalShare, SharePool, SmbShare
+from SyncManifest import SyncManifest, file_md5
+from RunMetrics import PROMETHEUS_OUTPUT, RunMetrics
 
 # Configuration SMB
 SMB_SERVER = "10.130.25.152"
@@ -18,129 +16,202 @@ SMB_PASSWORD = "3uw.AQ!SWxsDBm2zi3"
 # Local folder to save DAT files (placed one level up from the script directory)
 BASE_DIR = os.path.abspath(os.path.join(os.getcwd(), ".."))
 DAT_FILES_FOLDER = os.path.join(BASE_DIR, "EversysDatFiles")
+SYNC_MANIFEST = os.path.join(BASE_DIR, "sync_manifest.json")  # What was downloaded, by size and write time
 os.makedirs(DAT_FILES_FOLDER, exist_ok=True)
 
-# Connect to SMB
-def connect_smb():
-    try:
-        conn = Connection(uuid.uuid4(), SMB_SERVER, 445)
-        conn.connect(timeout=30)
-
-        session = Session(conn, SMB_USER, SMB_PASSWORD)
-        session.connect()
+# Each download thread gets its own SMB connection
+DOWNLOAD_WORKERS = 4
+# Files are streamed to disk in reads of at most this size (and never more
+# than the max read size negotiated with the server)
+READ_CHUNK_SIZE = 1024 * 1024
+PART_SUFFIX = ".part"
 
-        tree = TreeConnect(session, f"\\\\{SMB_SERVER}\\{SMB_SHARE}")
-        tree.connect()
-
-        print(f"Successfully connected to SMB: {SMB_SERVER}\\{SMB_SHARE}")
-        return tree, conn, session
+# Connect to SMB, or to a local folder standing in for the share
+def connect_share(local_share=None):
+    share = LocalShare(local_share) if local_share else SmbShare(SMB_SERVER, SMB_SHARE, SMB_USER, SMB_PASSWORD)
+    try:
+        share.connect()
+        return share
     except Exception as e:
         print(f"SMB Connection failed: {e}")
-        return None, None, None
+        return None
+
+# Open up to `size` independent connections
+def connect_pool(size, local_share=None):
+    shares = []
+    for _ in range(size):
+        share = connect_share(local_share)
+        if share is None:
+            break
+        shares.append(share)
+    if shares:
+        target = local_share or f"{SMB_SERVER}\\{SMB_SHARE}"
+        print(f"Successfully connected to SMB: {target} ({len(shares)} connection(s))")
+    return SharePool(shares)
 
 # Retrieve SMB file list
-def list_files(tree):
+def list_files(share):
     """Retrieve list of DAT files from the SMB share."""
     try:
-        dir_open = Open(tree, "")
-        dir_open.create(
-            impersonation_level=ImpersonationLevel.Impersonation,
-            desired_access=FilePipePrinterAccessMask.GENERIC_READ,
-            file_attributes=FileAttributes.FILE_ATTRIBUTE_NORMAL,
-            share_access=ShareAccess.FILE_SHARE_READ,
-            create_disposition=CreateDisposition.FILE_OPEN,
-            create_options=CreateOptions.FILE_DIRECTORY_FILE
-        )
-
-        entries = []
-        while True:
-            try:
-                batch = dir_open.query_directory(pattern="*", file_information_class=FileInformationClass.FILE_NAMES_INFORMATION)
-                batch_files = [entry["file_name"].get_value().decode("utf-16-le") for entry in batch]
-
-                # Filter only .DAT files and remove "." and ".."
-                batch_files = [f for f in batch_files if f.endswith(".dat") and f not in (".", "..")]
-
-                if not batch_files:
-                    break
-
-                entries.extend(batch_files)
-            except Exception as e:
-                if "STATUS_NO_MORE_FILES" in str(e):
-                    print("No more files to retrieve from the server.")
-                    break
-                else:
-                    print(f"Error retrieving batch: {e}")
-                    break
-
-        dir_open.close()
+        entries = share.list_files()
         print(f"Total DAT files found: {len(entries)}")
         return entries
     except Exception as e:
         print(f"Error listing files: {e}")
         return []
 
-# Check if file already exists locally
-def local_file_exists(filename):
-    return os.path.exists(os.path.join(DAT_FILES_FOLDER, filename))
-
-# Download SMB file
-def download_file(tree, filename):
-    local_path = os.path.join(DAT_FILES_FOLDER, filename)
-
-    if local_file_exists(filename):
-        print(f"Skipping {filename} - Already exists locally.")
-        return None
+def local_path_of(name):
+    return os.path.join(DAT_FILES_FOLDER, name)
+
+# Decide what to do with a listed file: "skip", "adopt" (a complete local
+# copy the manifest does not know about yet, e.g. made before the manifest
+# existed or by a run interrupted before saving it), "resume" or "download"
+def sync_action(entry, manifest):
+    local_path = local_path_of(entry.name)
+    part_path = local_path + PART_SUFFIX
+    record = manifest.get(entry.name)
+
+    if entry.size == 0:
+        return "skip"
+    if os.path.exists(local_path):
+        if os.path.getsize(local_path) != entry.size:
+            return "download"
+        if record is None or (not record["complete"] and manifest.matches(entry.name, entry)):
+            return "adopt"
+        if record["complete"] and manifest.matches(entry.name, entry):
+            return "skip"
+        return "download"
+    if os.path.exists(part_path) and record and not record["complete"] \
+            and manifest.matches(entry.name, entry) and os.path.getsize(part_path) <= entry.size:
+        return "resume"
+    return "download"
+
+# Stream the remote file into part_path in bounded reads from offset,
+# returns the number of bytes transferred and the MD5 of the whole file
+def stream_to_part(share, remote, part_path, offset=0):
+    size = remote.end_of_file
+    chunk_size = min(READ_CHUNK_SIZE, share.max_read_size or READ_CHUNK_SIZE)
+    hasher = file_md5(part_path) if offset else hashlib.md5()
+    transferred = 0
+    with open(part_path, "ab" if offset else "wb") as f:
+        while offset < size:
+            data = remote.read(offset, min(chunk_size, size - offset))
+            if not data:
+                break
+            f.write(data)
+            hasher.update(data)
+            offset += len(data)
+            transferred += len(data)
+        f.flush()
+        os.fsync(f.fileno())
+    if offset < size:
+        raise IOError(f"transfer stopped at {offset} of {size} bytes")
+    return transferred, hasher.hexdigest()
+
+# Download SMB file, returns the number of bytes transferred or None on error
+def download_file(share, entry, manifest, resume=False):
+    local_path = local_path_of(entry.name)
+    part_path = local_path + PART_SUFFIX
+    offset = os.path.getsize(part_path) if resume else 0
 
     try:
-        file_open = Open(tree, filename)
-        file_open.create(
-            impersonation_level=ImpersonationLevel.Impersonation,
-            desired_access=FilePipePrinterAccessMask.GENERIC_READ,
-            file_attributes=FileAttributes.FILE_ATTRIBUTE_NORMAL,
-            share_access=ShareAccess.FILE_SHARE_READ,
-            create_disposition=CreateDisposition.FILE_OPEN,
-            create_options=CreateOptions.FILE_NON_DIRECTORY_FILE
-        )
-
-        data = file_open.read(0, file_open.end_of_file)
-        file_open.close()
-
-        if data:
-            with open(local_path, "wb") as f:
-                f.write(data)
-            print(f"Downloaded {filename}")
-            return local_path
-        else:
-            print(f"Skipping {filename}: Empty file")
-            return None
+        remote = share.open_file(entry.name)
+        try:
+            if remote.end_of_file < offset:
+                offset = 0  # Changed since it was listed, start over
+            transferred, md5 = stream_to_part(share, remote, part_path, offset)
+        finally:
+            remote.close()
+
+        # Only complete files get their final name, so the extract step
+        # never picks up a partial download
+        os.replace(part_path, local_path)
+        manifest.mark_complete(entry, md5)
+        resumed = f", resumed at {offset}" if offset else ""
+        print(f"Downloaded {entry.name} ({transferred} bytes{resumed})")
+        return transferred
     except Exception as e:
-        print(f"Error opening file: {filename} - {e}")
+        # The .part file is kept so that the next run can resume it
+        print(f"Error downloading file: {entry.name} - {e}")
         return None
 
-# Multithreading for faster downloads
-def threaded_download(tree, file_list):
-    with ThreadPoolExecutor(max_workers=5) as executor:
-        executor.map(lambda f: download_file(tree, f), file_list)
+# Record a complete local copy the manifest does not know about
+def adopt_file(entry, manifest):
+    manifest.mark_complete(entry, file_md5(local_path_of(entry.name)).hexdigest())
+
+# Multithreading for faster downloads, one pooled connection per thread
+def threaded_download(pool, jobs, manifest):
+    def download(job):
+        entry, action = job
+        with pool.borrow() as share:
+            return download_file(share, entry, manifest, resume=action == "resume")
+
+    with ThreadPoolExecutor(max_workers=len(pool)) as executor:
+        return list(executor.map(download, jobs))
 
 # Main function
-def main():
-    tree, conn, session = connect_smb()
-    if not tree:
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Download the new Eversys DAT files from the SMB share.")
+    parser.add_argument("--workers", type=int, default=DOWNLOAD_WORKERS,
+                        help="Number of parallel downloads, each with its own SMB connection (default: %(default)s)")
+    parser.add_argument("--local-share", default=None,
+                        help="Read from this local folder instead of the SMB server (for testing)")
+    parser.add_argument("--prometheus", action="store_true", default=PROMETHEUS_OUTPUT,
+                        help="Also write the run metrics as a Prometheus text file next to the JSON report")
+    args = parser.parse_args(argv)
+    metrics = RunMetrics("download")
+
+    pool = connect_pool(max(1, args.workers), args.local_share)
+    if not len(pool):
+        metrics.write_report(1, args.prometheus)
         return
 
-    all_files = list_files(tree)
-    new_files = [f for f in all_files if not local_file_exists(f)]
-
-    if not new_files:
+    with metrics.timer("list"):
+        with pool.borrow() as share:
+            all_files = list_files(share)
+    metrics.count("files_listed", len(all_files))
+
+    manifest = SyncManifest(SYNC_MANIFEST)
+    with metrics.timer("dedup"):
+        actions = [(entry, sync_action(entry, manifest)) for entry in all_files]
+        for entry, action in actions:
+            if action == "adopt":
+                adopt_file(entry, manifest)
+    jobs = [(entry, action) for entry, action in actions if action in ("download", "resume")]
+
+    # Saved before transferring so that an interrupted download can be resumed
+    for entry, action in jobs:
+        if action == "download":
+            manifest.mark_partial(entry)
+    manifest.save()
+
+    started = time.perf_counter()
+    if not jobs:
         print("No new DAT files to download.")
+        results = []
     else:
-        print(f"Downloading {len(new_files)} new DAT files...")
-        threaded_download(tree, new_files)
-
-    session.disconnect()
-    conn.disconnect()
-    print("All DAT files have been downloaded successfully.")
+        resumed = sum(1 for _, action in jobs if action == "resume")
+        print(f"Downloading {len(jobs)} new or changed DAT files ({resumed} resumed)...")
+        with metrics.timer("download"):
+            results = threaded_download(pool, jobs, manifest)
+    manifest.save()
+    pool.close()
+
+    transferred = [r for r in results if r is not None]
+    total_bytes = sum(transferred)
+    failed = [entry.name for (entry, _), r in zip(jobs, results) if r is None]
+    metrics.count("files_downloaded", len(transferred))
+    metrics.count("bytes_downloaded", total_bytes)
+    if failed:
+        metrics.warn("download_failed", "file(s) failed to download", len(failed), failed)
+    elapsed = time.perf_counter() - started
+    rate = total_bytes / elapsed / 1024 / 1024 if elapsed and total_bytes else 0.0
+    print(f"Transferred {len(transferred)} file(s), {total_bytes} bytes in {elapsed:.1f}s ({rate:.1f} MB/s)")
+    if len(transferred) < len(jobs):
+        print(f"{len(jobs) - len(transferred)} file(s) failed and will be retried on the next run.")
+    else:
+        print("All DAT files have been downloaded successfully.")
+    print(f"Run report written to {metrics.write_report(1 if failed else 0, args.prometheus)}")
 
 if __name__ == "__main__":
     main()
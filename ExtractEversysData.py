@@ -1,18 +1,26 @@
 import os
-import pandas as pd
-from io import StringIO
-from datetime import datetime
-from shutil import copy2
+import argparse
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from BronzeMerge import SourceRejected, append_source, ends_with_newline, file_md5, inspect_source, prefix_md5, sync_file, truncate
+from DeltaHistory import record_changes
+from FileRegistry import open_registry
+from RunMetrics import PROMETHEUS_OUTPUT, RunMetrics
+from CategoryColumns import COLUMNS
 
 # Configuration
 BASE_DIR = os.path.abspath(os.path.join(os.getcwd(), ".."))  # Move one level up
 DAT_FILES_FOLDER = os.path.join(BASE_DIR, "EversysDatFiles")  # Folder containing raw .dat files
 OUTPUT_FOLDER = os.path.join(BASE_DIR, "BronzeRawData")  # Final output folder for merged .dat files
-TEMP_FOLDER = os.path.join(BASE_DIR, "TempDatFiles")  # Temporary folder to process files safely
-PROCESSED_FILES_TRACKER = os.path.join(BASE_DIR, "processed_files.txt")  # Processed files tracker
+REGISTRY_PATH = os.path.join(BASE_DIR, "processed_files.db")  # Registry of merged source files
+PROCESSED_FILES_TRACKER = os.path.join(BASE_DIR, "processed_files.txt")  # Old tracker, imported into the registry once
+
+# New files are inspected by this many processes, and appended by one writer
+# thread per category
+EXTRACT_WORKERS = os.cpu_count() or 1
+LOG_LOCK = threading.Lock()
 
 # Ensure necessary directories exist
-os.makedirs(TEMP_FOLDER, exist_ok=True)
 os.makedirs(OUTPUT_FOLDER, exist_ok=True)
 
 # File Type Mapping & Folder Structure
@@ -23,19 +31,6 @@ FILE_MAPPING = {
     "Product_History": "Product"
 }
 
-# Load processed files (ensure file exists)
-def load_processed_files():
-    if not os.path.exists(PROCESSED_FILES_TRACKER):
-        with open(PROCESSED_FILES_TRACKER, "w"):  # Create the file if missing
-            pass
-    with open(PROCESSED_FILES_TRACKER, "r") as f:
-        return set(f.read().splitlines())
-
-# Save a processed file immediately
-def save_processed_file(filename):
-    with open(PROCESSED_FILES_TRACKER, "a") as f:
-        f.write(f"{filename}\n")
-
 # List all DAT files in the folder
 def list_local_files():
     if not os.path.exists(DAT_FILES_FOLDER):  # Check if folder exists
@@ -43,79 +38,146 @@ def list_local_files():
         return []  # Return empty list, preventing errors
     return [f for f in os.listdir(DAT_FILES_FOLDER) if f.endswith(".dat")]
 
-# Create a backup copy in history folder (year/month/day/)
-def backup_file(source_path, category_folder):
-    now = datetime.now()
-    history_folder = os.path.join(category_folder, str(now.year), f"{now.month:02d}", f"{now.day:02d}")
+# Record what was appended since the last backup in the history folder
+# (year/month/day/), see DeltaHistory
+def backup_file(source_path, category_folder, metrics):
+    with metrics.timer("backup", os.path.basename(category_folder)):
+        backup_path = record_changes(source_path, category_folder)
+    if backup_path:
+        print(f"Backup created: {backup_path}")
 
-    os.makedirs(history_folder, exist_ok=True)  # Ensure history directory exists
-    backup_path = os.path.join(history_folder, os.path.basename(source_path))
-    
-    copy2(source_path, backup_path)  # Copy file for historization
-    print(f"Backup created: {backup_path}")
+# Columns the silver step reads from a category, see CategoryColumns
+def required_columns(category):
+    return COLUMNS[category]
 
-# Process and temporarily store each file
-def process_files(files, processed_files):
-    for filename in files:
-        if filename in processed_files:  # Ensure we don't reprocess already saved files
-            continue
+def target_path(category):
+    return os.path.join(OUTPUT_FOLDER, category, "current", f"{category}.dat")
 
+# Truncate what an interrupted run appended without committing it
+def recover_targets(registry):
+    for category in FILE_MAPPING.values():
+        registry.recover_target(category, target_path(category))
+
+# Decide how to merge a listed file: ("merge", skip_bytes) for a new file or
+# a file that changed since it was merged (skip_bytes > 0 when it only grew,
+# so that only its new lines are appended), ("touch", 0) for a file that was
+# downloaded again unchanged, or ("skip", 0)
+def merge_plan(file_path, entry):
+    if entry is None:
+        return "merge", 0
+    stat = os.stat(file_path)
+    if entry["size"] is None or (stat.st_size == entry["size"] and stat.st_mtime == entry["mtime"]):
+        return "skip", 0
+    if entry["md5"] is None:  # Imported from processed_files.txt, content unknown
+        return ("touch", 0) if stat.st_size == entry["size"] else ("merge", 0)
+    if stat.st_size == entry["size"]:
+        return ("touch", 0) if file_md5(file_path) == entry["md5"] else ("merge", 0)
+    if stat.st_size > entry["size"] and ends_with_newline(file_path, entry["size"]) \
+            and prefix_md5(file_path, entry["size"]) == entry["md5"]:
+        return "merge", entry["size"]
+    return "merge", 0
+
+def file_category(filename):
+    file_type = filename.split("-")[-1].replace(".dat", "").replace(".DAT", "")
+    return FILE_MAPPING.get(file_type)
+
+# Print from the writer threads one whole line at a time
+def log(message):
+    with LOG_LOCK:
+        print(message)
+
+# Flush a category's bronze file and commit it with its registry entries
+def commit_category(registry, category):
+    sync_file(target_path(category))
+    registry.commit(category, os.path.getsize(target_path(category)))
+
+# Writer of one category: append its inspected files in filename order, so
+# the bronze file is the same whatever order the inspections finish in
+def write_category(category, filenames, plans, inspect, registry, entries, metrics):
+    output_path = target_path(category)  # Final .dat file
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)  # Ensure category and current folder exist
+    columns = required_columns(category)
+
+    for filename in filenames:
         file_path = os.path.join(DAT_FILES_FOLDER, filename)
-        file_type = filename.split("-")[-1].replace(".dat", "").replace(".DAT", "")
-        category = FILE_MAPPING.get(file_type)
-
-        if not category:
-            continue  # Skip unrecognized files
-
-        # Define paths
-        category_folder = os.path.join(OUTPUT_FOLDER, category)
-        current_folder = os.path.join(category_folder, "current")
-        temp_path = os.path.join(TEMP_FOLDER, filename)  # Temp file path
-        output_path = os.path.join(current_folder, f"{category}.dat")  # Final .dat file
-
-        os.makedirs(current_folder, exist_ok=True)  # Ensure category and current folder exist
-
-        is_new_file = not os.path.exists(output_path)
-
+        size_before = os.path.getsize(output_path) if os.path.exists(output_path) else 0
         try:
-            with open(file_path, "r", encoding="utf-8") as f:
-                content = f.read()
-
-            df = pd.read_csv(StringIO(content), delimiter=';', dtype=str)
-
-            if df.empty:
-                print(f"Skipping empty file: {filename}")
-                continue
-
-            # Write fully processed data to the temp folder first
-            with open(temp_path, "w", encoding="utf-8") as f_temp:
-                df.to_csv(f_temp, sep=';', index=False, header=is_new_file)
-
-            # Move the fully processed file to the final location
-            with open(temp_path, "r", encoding="utf-8") as f_temp, open(output_path, "a", encoding="utf-8") as f_out:
-                if not is_new_file:  # Skip header if appending to an existing file
-                    next(f_temp)
-                for line in f_temp:
-                    f_out.write(line)
-
-            # Remove the temporary file after successful processing
-            os.remove(temp_path)
-
-            print(f"Merged {filename} into {output_path}")
-
-            #  Backup before marking as processed
-            backup_file(output_path, category_folder)
-
-            #  IMMEDIATELY mark file as processed
-            save_processed_file(filename)
-
+            mtime = os.stat(file_path).st_mtime
+            with metrics.timer("validate", category):
+                info = inspect(filename)
+            with metrics.timer("write", category):
+                start, end = append_source(file_path, info, output_path, columns)
+
+            if start == end:
+                metrics.count("files_empty", category=category)
+                log(f"Skipping empty file: {filename}")
+            elif plans[filename][1]:
+                log(f"Merged {end - start} new bytes of {filename} into {output_path}")
+            elif filename in entries:
+                log(f"{filename} changed since it was merged, merged it again into {output_path}")
+            else:
+                log(f"Merged {filename} into {output_path}")
+
+            if start != end:
+                metrics.count("files_merged", category=category)
+                metrics.count("bytes_merged", end - start, category=category)
+                metrics.count("rows_read", info.lines, category=category)
+            registry.add(filename, info.size, mtime, info.md5, category, (start, end))
+            if registry.batch_full(category):
+                with metrics.timer("write", category):
+                    commit_category(registry, category)
+
+        except SourceRejected as e:
+            metrics.warn("file_rejected", "file(s) rejected", samples=[str(e)], category=category)
+            log(f"Error: {e}, file skipped")  # Retried on the next run
         except Exception as e:
-            print(f"Error processing file {filename}: {e}")
-            if os.path.exists(temp_path):
-                os.remove(temp_path)  # Cleanup temp file on failure
+            metrics.warn("file_failed", "file(s) failed", samples=[f"{filename}: {e}"], category=category)
+            log(f"Error processing file {filename}: {e}")
+            if os.path.exists(output_path):
+                truncate(output_path, size_before)  # Remove what was appended
+
+    with metrics.timer("write", category):
+        commit_category(registry, category)
+
+# Inspect the new files in a pool of processes (header, UTF-8, checksum) and
+# append them through one writer thread per category
+def process_files(plans, registry, entries, metrics, workers=EXTRACT_WORKERS):
+    registry.touch_many(
+        (filename, os.stat(os.path.join(DAT_FILES_FOLDER, filename)).st_mtime)
+        for filename, (action, _) in plans.items() if action == "touch"
+    )
+
+    to_merge = sorted(f for f, (action, _) in plans.items() if action == "merge")
+    by_category = {}
+    for filename in to_merge:
+        by_category.setdefault(file_category(filename), []).append(filename)
+    if not to_merge:
+        return
+
+    def inspect_args(filename):
+        return os.path.join(DAT_FILES_FOLDER, filename), plans[filename][1]
+
+    workers = min(max(1, workers), len(to_merge))
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        if pool:
+            futures = {filename: pool.submit(inspect_source, *inspect_args(filename)) for filename in to_merge}
+            inspect = lambda filename: futures[filename].result()
+        else:
+            inspect = lambda filename: inspect_source(*inspect_args(filename))
+
+        with ThreadPoolExecutor(max_workers=len(by_category)) as writers:
+            list(writers.map(
+                lambda category: write_category(category, by_category[category], plans, inspect, registry, entries,
+                                                metrics),
+                by_category,
+            ))
+    finally:
+        if pool:
+            pool.shutdown(cancel_futures=True)
 
 # Ensure that at least one file exists in each "current" folder
-def ensure_current_files():
+def ensure_current_files(metrics):
     for category in FILE_MAPPING.values():
         category_folder = os.path.join(OUTPUT_FOLDER, category)
         current_folder = os.path.join(category_folder, "current")
@@ -129,27 +191,52 @@ def ensure_current_files():
 
             print(f"Created empty placeholder file: {output_path}")
 
-        # Always create a backup even if no new files were processed
-        backup_file(output_path, category_folder)
+        # One history entry per run with everything appended to the file
+        backup_file(output_path, category_folder, metrics)
 
 # Main function
-def main():
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Merge the downloaded Eversys DAT files into the Bronze layer.")
+    parser.add_argument("--workers", type=int, default=EXTRACT_WORKERS,
+                        help="Processes inspecting the new files in parallel (default: %(default)s)")
+    parser.add_argument("--prometheus", action="store_true", default=PROMETHEUS_OUTPUT,
+                        help="Also write the run metrics as a Prometheus text file next to the JSON report")
+    args = parser.parse_args(argv)
+    metrics = RunMetrics("extract")
+
     if not os.path.exists(DAT_FILES_FOLDER):
         print(f"The folder '{DAT_FILES_FOLDER}' does not exist. Exiting process.")
         return
 
-    processed_files = load_processed_files()
-    all_files = list_local_files()
-    new_files = [f for f in all_files if f not in processed_files]  # Only process untracked files
-
+    registry = open_registry(REGISTRY_PATH, PROCESSED_FILES_TRACKER, DAT_FILES_FOLDER)
+    recover_targets(registry)
+    entries = registry.latest()
+
+    # Only process untracked or changed files, in a stable order
+    with metrics.timer("list"):
+        filenames = sorted(f for f in list_local_files() if file_category(f))
+    metrics.count("files_listed", len(filenames))
+    plans = {}
+    with metrics.timer("dedup"):
+        for filename in filenames:
+            plan = merge_plan(os.path.join(DAT_FILES_FOLDER, filename), entries.get(filename))
+            if plan[0] != "skip":
+                plans[filename] = plan
+    metrics.count("files_touched", sum(1 for action, _ in plans.values() if action == "touch"))
+
+    new_files = [f for f, (action, _) in plans.items() if action == "merge"]
+    if new_files:
+        print(f"Found {len(new_files)} new or changed DAT files to process.")
+    process_files(plans, registry, entries, metrics, args.workers)
     if new_files:
-        print(f"Found {len(new_files)} new DAT files to process.")
-        process_files(new_files, processed_files)
         print("Processing complete.")
     else:
         print("🔹 No new files to process.")
+    registry.close()
 
-    ensure_current_files()
+    ensure_current_files(metrics)
+    metrics.print_warnings()
+    print(f"Run report written to {metrics.write_report(0, args.prometheus)}")
 
 if __name__ == "__main__":
     print("Starting new execution cycle...")
@@ -0,0 +1,139 @@
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from BronzeMerge import truncate
+
+# Registry of the source files merged into the bronze layer.
+#
+# Replaces the processed_files.txt tracker (one file name per line, appended
+# and flushed once per file and loaded into a set on every run). The registry
+# is an SQLite database in WAL mode holding, for every merge, the source
+# file's name, size, modification time and MD5, its category and the byte
+# range it was appended to in <Category>.dat, plus the committed size of each
+# bronze file. Entries are kept in memory and committed in batches, per
+# category, together with the size of that category's bronze file: bytes
+# found after the committed size of a bronze file were appended by a run that
+# stopped before committing, and are truncated by recover_target() so that
+# their sources are merged again. The registry can be shared by the writer
+# threads of the different categories.
+
+COMMIT_BATCH = 200  # files merged between two commits
+
+
+class FileRegistry:
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            " id INTEGER PRIMARY KEY,"
+            " filename TEXT NOT NULL,"
+            " size INTEGER,"
+            " mtime REAL,"
+            " md5 TEXT,"
+            " category TEXT,"
+            " bronze_start INTEGER,"
+            " bronze_end INTEGER,"
+            " processed_at TEXT)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS files_filename ON files (filename)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS targets (category TEXT PRIMARY KEY, size INTEGER)")
+        self.conn.commit()
+        self.pending = {}  # category -> entries not committed yet
+
+    def latest(self):
+        """Return the last entry of every registered file, by file name."""
+        rows = self.conn.execute(
+            "SELECT filename, size, mtime, md5, category, bronze_start, bronze_end FROM files"
+            " WHERE id IN (SELECT MAX(id) FROM files GROUP BY filename)"
+        )
+        return {
+            row[0]: dict(zip(("filename", "size", "mtime", "md5", "category", "bronze_start", "bronze_end"), row))
+            for row in rows
+        }
+
+    def add(self, filename, size, mtime, md5, category, bronze_range):
+        """Register a merged file; it is committed with its category's next batch."""
+        entry = (filename, size, mtime, md5, category, *bronze_range, datetime.now().isoformat(timespec="seconds"))
+        with self.lock:
+            self.pending.setdefault(category, []).append(entry)
+
+    # Remember that unchanged files were touched (e.g. downloaded again),
+    # given as (filename, mtime) pairs
+    def touch_many(self, touched):
+        with self.lock:
+            self.conn.executemany(
+                "UPDATE files SET mtime = ? WHERE id = (SELECT MAX(id) FROM files WHERE filename = ?)",
+                ((mtime, filename) for filename, mtime in touched),
+            )
+            self.conn.commit()
+
+    def batch_full(self, category):
+        with self.lock:
+            return len(self.pending.get(category, [])) >= COMMIT_BATCH
+
+    def committed_size(self, category):
+        with self.lock:
+            row = self.conn.execute("SELECT size FROM targets WHERE category = ?", (category,)).fetchone()
+        return None if row is None else row[0]
+
+    def commit(self, category, target_size):
+        """Commit the pending entries of a category together with the size of its bronze file.
+
+        The bronze file must have been flushed to disk before.
+        """
+        with self.lock:
+            self.conn.executemany(
+                "INSERT INTO files (filename, size, mtime, md5, category, bronze_start, bronze_end, processed_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                self.pending.pop(category, []),
+            )
+            self.conn.execute("INSERT OR REPLACE INTO targets (category, size) VALUES (?, ?)", (category, target_size))
+            self.conn.commit()
+
+    def recover_target(self, category, target_file):
+        """Bring a bronze file back to its committed size."""
+        size = os.path.getsize(target_file) if os.path.exists(target_file) else 0
+        committed = self.committed_size(category)
+        if committed is None:
+            # First run with the registry, adopt the file as it is
+            self.commit(category, size)
+        elif size > committed:
+            print(f"Warning: {target_file} has {size - committed} uncommitted bytes from an interrupted run, truncating")
+            truncate(target_file, committed)
+        elif size < committed:
+            print(f"Warning: {target_file} is smaller than its committed size ({size} < {committed}), resetting it")
+            self.commit(category, size)
+
+    def close(self):
+        self.conn.close()
+
+    # One-time import of a processed_files.txt tracker, renamed once imported.
+    # Size and modification time are taken from the local copy when there is
+    # one, so that later changes to the file are noticed.
+    def migrate_text_tracker(self, tracker_path, files_folder):
+        if not os.path.exists(tracker_path):
+            return
+        entries = []
+        with open(tracker_path, "r") as f:
+            for filename in dict.fromkeys(line.strip() for line in f):
+                if not filename:
+                    continue
+                path = os.path.join(files_folder, filename)
+                stat = os.stat(path) if os.path.exists(path) else None
+                entries.append((filename, stat and stat.st_size, stat and stat.st_mtime))
+        self.conn.executemany("INSERT INTO files (filename, size, mtime) VALUES (?, ?, ?)", entries)
+        self.conn.commit()
+        imported = len(entries)
+        os.replace(tracker_path, tracker_path + ".migrated")
+        print(f"Migrated {imported} file names from {tracker_path} to {self.path}")
+
+
+def open_registry(registry_path, legacy_tracker=None, files_folder=None):
+    registry = FileRegistry(registry_path)
+    if legacy_tracker:
+        registry.migrate_text_tracker(legacy_tracker, files_folder)
+    return registry
@@ -0,0 +1,171 @@
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+# Structured run metrics shared by the download, extract and silver scripts.
+#
+# A RunMetrics collects, for one job run:
+#   timers    wall time spent in each stage (list, download, parse, validate,
+#             dedup, write, backup), per category
+#   counters  rows read / accepted / rejected / deduplicated, files and bytes,
+#             per category and, where it applies, per column
+#   warnings  aggregated by code, category and column: a count and a few
+#             sample values, instead of one printed line per occurrence
+# and writes them as a JSON run report in RunMetrics/<job>.json, plus, when
+# asked, a Prometheus text-format file RunMetrics/<job>.prom for the
+# node_exporter textfile collector. Metrics gathered in worker processes are
+# sent back with to_dict() and added with merge(). Safe to share between
+# threads.
+
+# === CONFIG ===
+BASE_DIR = os.path.abspath(os.path.join(os.getcwd(), ".."))
+METRICS_DIR = os.path.join(BASE_DIR, "RunMetrics")
+PROMETHEUS_OUTPUT = False
+MAX_SAMPLES = 5  # example values kept per warning
+METRIC_PREFIX = "eversys"
+
+
+class RunMetrics:
+    def __init__(self, job, category=None):
+        self.job = job
+        self.category = category  # default category of the entries
+        self.started_at = datetime.now()
+        self.started = time.perf_counter()
+        self.lock = threading.Lock()
+        self.timers = {}    # (stage, category) -> [seconds, calls]
+        self.counters = {}  # (name, category, column) -> value
+        self.warnings = {}  # (code, category, column) -> {"message", "count", "samples"}
+
+    @contextmanager
+    def timer(self, stage, category=None):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(stage, time.perf_counter() - started, category)
+
+    def add_time(self, stage, seconds, category=None, calls=1):
+        key = (stage, category or self.category)
+        with self.lock:
+            total = self.timers.setdefault(key, [0.0, 0])
+            total[0] += seconds
+            total[1] += calls
+
+    def count(self, name, value=1, category=None, column=None):
+        key = (name, category or self.category, column)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + int(value)
+
+    def warn(self, code, message, count=1, samples=(), category=None, column=None):
+        """Record count occurrences of a warning; message describes one kind, e.g. "invalid value(s) in x"."""
+        key = (code, category or self.category, column)
+        with self.lock:
+            warning = self.warnings.setdefault(key, {"message": message, "count": 0, "samples": []})
+            warning["count"] += int(count)
+            for sample in samples:
+                if len(warning["samples"]) >= MAX_SAMPLES:
+                    break
+                if hasattr(sample, "item"):
+                    sample = sample.item()  # numpy scalar
+                if sample not in warning["samples"]:
+                    warning["samples"].append(sample)
+
+    # === TRANSFER BETWEEN PROCESSES ===
+    def to_dict(self):
+        with self.lock:
+            return {
+                "timers": [
+                    {"stage": stage, "category": category, "seconds": round(seconds, 6), "calls": calls}
+                    for (stage, category), (seconds, calls) in sorted(self.timers.items(), key=sort_key)
+                ],
+                "counters": [
+                    {"name": name, "category": category, "column": column, "value": value}
+                    for (name, category, column), value in sorted(self.counters.items(), key=sort_key)
+                ],
+                "warnings": [
+                    {"code": code, "category": category, "column": column, **warning}
+                    for (code, category, column), warning in sorted(self.warnings.items(), key=sort_key)
+                ],
+            }
+
+    def merge(self, data):
+        for timer in data["timers"]:
+            self.add_time(timer["stage"], timer["seconds"], timer["category"], timer["calls"])
+        for counter in data["counters"]:
+            self.count(counter["name"], counter["value"], counter["category"], counter["column"])
+        for warning in data["warnings"]:
+            self.warn(warning["code"], warning["message"], warning["count"], warning["samples"],
+                      warning["category"], warning["column"])
+
+    # === OUTPUT ===
+    def print_warnings(self):
+        for warning in self.to_dict()["warnings"]:
+            samples = ", ".join(repr(sample) for sample in warning["samples"])
+            print(f"Warning: {warning['count']} {warning['message']}" + (f" (e.g. {samples})" if samples else ""))
+
+    def report(self, status=0):
+        return {
+            "job": self.job,
+            "started_at": self.started_at.isoformat(timespec="seconds"),
+            "seconds": round(time.perf_counter() - self.started, 3),
+            "status": status,
+            **self.to_dict(),
+        }
+
+    def write_report(self, status=0, prometheus=PROMETHEUS_OUTPUT, folder=None):
+        """Write <job>.json, and <job>.prom when prometheus is set; returns the JSON path."""
+        folder = folder or METRICS_DIR
+        os.makedirs(folder, exist_ok=True)
+        report = self.report(status)
+        path = os.path.join(folder, f"{self.job}.json")
+        write_atomic(path, json.dumps(report, indent=2, default=str) + "\n")
+        if prometheus:
+            write_atomic(os.path.join(folder, f"{self.job}.prom"), prometheus_text(report))
+        return path
+
+
+# === HELPERS ===
+# Sort entries whose keys may hold None
+def sort_key(item):
+    return tuple("" if part is None else str(part) for part in item[0])
+
+def write_atomic(path, text):
+    temp_path = path + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(temp_path, path)
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def labels(**values):
+    return ",".join(f'{name}="{escape_label(value)}"' for name, value in values.items() if value is not None)
+
+# Run report in the Prometheus text exposition format
+def prometheus_text(report):
+    job = report["job"]
+    lines = []
+
+    def metric(name, help_text, samples):
+        lines.append(f"# HELP {METRIC_PREFIX}_{name} {help_text}")
+        lines.append(f"# TYPE {METRIC_PREFIX}_{name} gauge")
+        for label_values, value in samples:
+            lines.append(f"{METRIC_PREFIX}_{name}{{{labels(job=job, **label_values)}}} {value}")
+
+    metric("run_seconds", "Wall time of the last run", [({}, report["seconds"])])
+    metric("run_status", "Exit status of the last run (0 is success)", [({}, report["status"])])
+    metric("run_timestamp_seconds", "Start time of the last run",
+           [({}, int(datetime.fromisoformat(report["started_at"]).timestamp()))])
+    metric("stage_seconds", "Wall time spent in a stage during the last run",
+           [({"stage": t["stage"], "category": t["category"]}, t["seconds"]) for t in report["timers"]])
+    for name in dict.fromkeys(c["name"] for c in report["counters"]):
+        metric(name, f"{name.replace('_', ' ').capitalize()} during the last run",
+               [({"category": c["category"], "column": c["column"]}, c["value"])
+                for c in report["counters"] if c["name"] == name])
+    metric("warnings", "Warnings of the last run, by code",
+           [({"code": w["code"], "category": w["category"], "column": w["column"]}, w["count"])
+            for w in report["warnings"]])
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,384 @@
+import os
+import sys
+import json
+import hashlib
+import argparse
+import numpy as np
+from BronzeMerge import file_md5, truncate
+
+# Bulk-load artifact of the silver tables, written as per-run delta files.
+#
+# The sp_Import*Logs procedures read Silver_<Category>.dat line by line with
+# xp_cmdshell and split the strings in T-SQL, re-reading the whole history on
+# every import. Alongside the silver files, every run that stores rows now
+# also writes them, and only them, without a header, to
+# SilverRawData/<Category>/bulk/Bulk_<Category>_<seq>.dat, one file per run
+# numbered in sequence. Fields are in the column order of the <category>_logs
+# table (pair columns as their _1 / _2 halves), ';' separated, empty for
+# NULL, timestamps as "YYYY-MM-DD HH:MM:SS".
+#
+# bulk/<Category>.fmt is the matching bcp format file (character mode, the
+# log_id identity column skipped), so a file can be loaded with BULK INSERT
+# or bcp. bulk/manifest.json lists the columns with the SQL type of their
+# table column (the Column's sql_type, by default from its kind) and, for
+# every file, its seq, rows, committed size, MD5 (set when its run is over)
+# and its batches of up to BATCH_ROWS rows, as FIRSTROW / LASTROW numbers and
+# byte ranges. BulkLoader pushes the batches through any DB-API connection.
+#
+# An importer takes the complete files after the last seq it acknowledged
+# (pending_files) and acknowledges each one once loaded; acknowledgements are
+# kept per consumer in bulk/acks.json. compact() folds the files every
+# consumer has acknowledged into Bulk_<Category>_base.dat, which stays in
+# the manifest for a consumer starting from scratch, with the seq of the last
+# file folded into it.
+#
+# The manifest is saved by commit() once the dedup index has committed the
+# digests of the appended rows together with commit_state(); a run that
+# stopped between the two is brought forward to that state by roll_forward().
+# Otherwise a file larger than its size in the manifest, or missing from it,
+# is from a run (or a compaction) that stopped half way and is cut back (or
+# removed) by the next run.
+
+MANIFEST_NAME = "manifest.json"
+ACKS_NAME = "acks.json"
+DATA_PREFIX = "Bulk_"
+DATA_SUFFIX = ".dat"
+BATCH_ROWS = 50_000
+FORMAT_VERSION = "10.0"  # bcp format files of SQL Server 2008 and later
+KEY_COLUMNS = 1  # log_id, the identity column in front of the data columns
+
+SQL_TYPES = {
+    "int": "INT",
+    "pair": "INT",
+    "float": "FLOAT",
+    "datetime": "DATETIME",
+    "string": "NVARCHAR(255)",
+}
+HOST_LENGTHS = {"TINYINT": 4, "SMALLINT": 7, "INT": 12, "FLOAT": 30, "DATETIME": 24}  # longest text of a value
+STRING_LENGTH = 510
+
+
+def table_name(category):
+    return f"{category.lower()}_logs"
+
+def data_name(category, seq):
+    return f"{DATA_PREFIX}{category}_{seq:06d}{DATA_SUFFIX}"
+
+def base_name(category):
+    return f"{DATA_PREFIX}{category}_base{DATA_SUFFIX}"
+
+def format_name(category):
+    return f"{category}.fmt"
+
+# [name, SQL type] of each field, in table order
+def bulk_columns(spec):
+    return [[name, column.sql_type or SQL_TYPES[column.kind]]
+            for column in spec.columns for name in column.output_names]
+
+# Bytes of the longest text of a field: NVARCHAR(n) holds n two-byte characters
+def host_length(sql_type):
+    if sql_type.startswith("NVARCHAR("):
+        return 2 * int(sql_type[len("NVARCHAR("):-1])
+    return HOST_LENGTHS.get(sql_type, STRING_LENGTH)
+
+# bcp non-XML format file: every field is read as text up to its terminator
+# and converted by the server into the type of its table column
+def format_file_text(columns):
+    lines = [FORMAT_VERSION, str(len(columns))]
+    for number, (name, sql_type) in enumerate(columns, 1):
+        terminator = "\\n" if number == len(columns) else ";"
+        length = host_length(sql_type)
+        lines.append(f'{number}\tSQLCHAR\t0\t{length}\t"{terminator}"\t{number + KEY_COLUMNS}\t{name}\t""')
+    return "\n".join(lines) + "\n"
+
+
+def load_json(path, default):
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+def load_manifest(root):
+    return load_json(os.path.join(root, MANIFEST_NAME), None)
+
+def load_acks(root):
+    return load_json(os.path.join(root, ACKS_NAME), {})
+
+def write_atomic(path, text):
+    temp_path = path + ".tmp"
+    with open(temp_path, "w", encoding="utf-8", newline="") as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+def save_manifest(root, manifest):
+    os.makedirs(root, exist_ok=True)
+    write_atomic(os.path.join(root, MANIFEST_NAME), json.dumps(manifest, indent=1))
+
+# Extend the batches of a file entry with rows appended at its end: the last
+# batch is filled up to BATCH_ROWS rows before a new one starts
+def add_batches(entry, rows, batch_rows=BATCH_ROWS):
+    sizes = np.fromiter((len(row.encode("utf-8")) + 1 for row in rows), dtype=np.int64, count=len(rows))
+    offsets = entry["bytes"] + np.concatenate([[0], np.cumsum(sizes)])
+    batches = entry["batches"]
+    done = 0
+    while done < len(rows):
+        if batches and batches[-1]["last_row"] - batches[-1]["first_row"] + 1 < batch_rows:
+            batch = batches[-1]
+        else:
+            batch = {"first_row": entry["rows"] + done + 1, "last_row": entry["rows"] + done,
+                     "start": int(offsets[done]), "end": int(offsets[done])}
+            batches.append(batch)
+        done += min(batch_rows - (batch["last_row"] - batch["first_row"] + 1), len(rows) - done)
+        batch["last_row"] = entry["rows"] + done
+        batch["end"] = int(offsets[done])
+    entry["rows"] += len(rows)
+    entry["bytes"] = int(offsets[-1])
+
+# Cut the files back to their committed size, remove the files the manifest
+# does not list and set the MD5 of the files whose run stopped before it.
+# Returns True when the manifest changed.
+def recover_files(root, manifest):
+    if not os.path.isdir(root):
+        return False
+    committed = {entry["file"]: entry for entry in manifest["files"]}
+    changed = False
+    for name in sorted(os.listdir(root)):
+        if not (name.startswith(DATA_PREFIX) and name.endswith(DATA_SUFFIX)):
+            continue
+        path = os.path.join(root, name)
+        entry = committed.get(name)
+        if entry is None:
+            print(f"Warning: removing bulk file {path}, which is not in the manifest")
+            os.remove(path)
+            continue
+        if os.path.getsize(path) > entry["bytes"]:
+            print(f"Warning: truncating uncommitted rows of bulk file {path}")
+            truncate(path, entry["bytes"])
+        if "md5" not in entry:
+            entry["md5"] = file_md5(path)
+            changed = True
+    return changed
+
+
+class BulkExport:
+    def __init__(self, root, spec, batch_rows=BATCH_ROWS):
+        self.root = root
+        self.category = spec.category
+        self.columns = bulk_columns(spec)
+        self.batch_rows = batch_rows
+        self.manifest = load_manifest(root) or {
+            "category": spec.category,
+            "table": table_name(spec.category),
+            "columns": self.columns,
+            "format_file": format_name(spec.category),
+            "seq": 0,
+            "files": [],
+        }
+        if [name for name, _ in self.manifest["columns"]] == [name for name, _ in self.columns]:
+            self.manifest["columns"] = self.columns  # the types follow the spec
+        self.entry = None  # file of this run, started by the first append
+        self.hasher = None
+
+    def path_of(self, name):
+        return os.path.join(self.root, name)
+
+    def save(self):
+        save_manifest(self.root, self.manifest)
+
+    def recover(self):
+        if recover_files(self.root, self.manifest):
+            self.save()
+
+    def append(self, rows):
+        """Append rendered rows to this run's bulk file; commit() records them in the manifest."""
+        if not rows:
+            return True
+        if self.manifest["columns"] != self.columns:
+            print(f"Error: columns of the bulk export in {self.root} do not match the new rows, nothing appended")
+            return False
+        if self.entry is None:
+            os.makedirs(self.root, exist_ok=True)
+            write_atomic(self.path_of(self.manifest["format_file"]), format_file_text(self.columns))
+            self.manifest["seq"] += 1
+            self.entry = {"seq": self.manifest["seq"], "file": data_name(self.category, self.manifest["seq"]),
+                          "rows": 0, "bytes": 0, "batches": []}
+            self.manifest["files"].append(self.entry)
+            self.hasher = hashlib.md5()
+
+        data = ("\n".join(rows) + "\n").encode("utf-8")
+        with open(self.path_of(self.entry["file"]), "ab") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        self.hasher.update(data)
+        add_batches(self.entry, rows, self.batch_rows)
+        return True
+
+    # Manifest state commit() is going to save, for the dedup index journal
+    def commit_state(self):
+        return {"seq": self.manifest["seq"], "entry": self.entry}
+
+    def commit(self):
+        if self.entry is not None:
+            self.save()
+
+    # Apply a commit_state() the run did not get to save: the entry of its
+    # file is added, or replaced when the manifest has fewer of its rows. The
+    # file is cut back to the committed size by the next recover().
+    def roll_forward(self, state):
+        entry = state["entry"]
+        if entry is None:
+            return
+        files = self.manifest["files"]
+        current = next((i for i, e in enumerate(files) if e["file"] == entry["file"]), None)
+        if current is not None and files[current]["bytes"] < entry["bytes"]:
+            files[current] = entry
+        elif current is None and self.manifest["seq"] == state["seq"] - 1:
+            files.append(entry)
+            self.manifest["seq"] = state["seq"]
+        else:
+            return
+        print(f"Warning: committing the rows of bulk file {entry['file']} from an interrupted run")
+        self.save()
+
+    # Seal this run's file at the rows last committed, for a run that failed
+    # after appending rows it did not commit. state is the commit_state() in
+    # the dedup index journal, whose rows are committed even when the run
+    # failed before commit().
+    def abort(self, state=None):
+        if self.entry is None:
+            return
+        committed = load_manifest(self.root)
+        if committed is None:
+            self.manifest["files"].remove(self.entry)
+            self.manifest["seq"] -= 1
+        else:
+            self.manifest = committed
+        self.entry = None
+        if state is not None:
+            self.roll_forward(state)
+        if recover_files(self.root, self.manifest):
+            self.save()
+
+    # Seal this run's file: from now on importers may take it
+    def close(self):
+        if self.entry is not None and "md5" not in self.entry:
+            self.entry["md5"] = self.hasher.hexdigest()
+            self.save()
+
+
+def read_batch(root, entry, batch):
+    """Return the lines of one batch of a bulk file entry."""
+    with open(os.path.join(root, entry["file"]), "rb") as f:
+        f.seek(batch["start"])
+        data = f.read(batch["end"] - batch["start"])
+    return data.decode("utf-8").split("\n")[:-1]
+
+def verify_file(root, entry):
+    return file_md5(os.path.join(root, entry["file"])) == entry["md5"]
+
+
+# === CONSUMERS ===
+def pending_files(root, consumer):
+    """Return the manifest entries of the complete files after the consumer's last acknowledged seq.
+
+    A file whose run is still writing it (no MD5 yet) ends the list.
+    """
+    manifest = load_manifest(root)
+    if manifest is None:
+        return []
+    after = load_acks(root).get(consumer, 0)
+    pending = []
+    for entry in manifest["files"]:
+        if entry["seq"] <= after:
+            continue
+        if "md5" not in entry:
+            break
+        pending.append(entry)
+    return pending
+
+def acknowledge(root, consumer, seq):
+    """Record that consumer has loaded every file up to seq."""
+    acks = load_acks(root)
+    acks[consumer] = seq
+    os.makedirs(root, exist_ok=True)
+    write_atomic(os.path.join(root, ACKS_NAME), json.dumps(acks, indent=1, sort_keys=True))
+
+def compact(root):
+    """Fold the files every consumer has acknowledged into the base file; returns the number folded.
+
+    Not to be run while the silver step is writing the same category.
+    """
+    manifest = load_manifest(root)
+    acks = load_acks(root)
+    if manifest is None or not acks:
+        return 0
+    if recover_files(root, manifest):
+        save_manifest(root, manifest)
+    upto = min(acks.values())
+    name = base_name(manifest["category"])
+    base = next((entry for entry in manifest["files"] if entry["file"] == name), None)
+    folded = [entry for entry in manifest["files"]
+              if entry is not base and "md5" in entry and entry["seq"] <= upto]
+    if not folded:
+        return 0
+
+    if base is None:
+        base = {"seq": 0, "file": name, "rows": 0, "bytes": 0, "batches": []}
+    path = os.path.join(root, name)
+    with open(path, "ab") as f:
+        for entry in folded:
+            for batch in entry["batches"]:
+                rows = read_batch(root, entry, batch)
+                f.write(("\n".join(rows) + "\n").encode("utf-8"))
+                add_batches(base, rows)
+        f.flush()
+        os.fsync(f.fileno())
+    base["seq"] = folded[-1]["seq"]
+    base["md5"] = file_md5(path)
+    manifest["files"] = [base] + [entry for entry in manifest["files"]
+                                  if entry is not base and entry not in folded]
+    save_manifest(root, manifest)
+    for entry in folded:
+        os.remove(os.path.join(root, entry["file"]))
+    return len(folded)
+
+
+# List the bulk files of a category, or acknowledge or compact them
+def main(argv=None):
+    from SilverEngine import category_paths
+
+    parser = argparse.ArgumentParser(description="List, acknowledge or compact the bulk-load files of a category.")
+    parser.add_argument("category", help="Cleaning, Info, Rinse or Product")
+    parser.add_argument("--consumer", default=None, help="Only list the files this consumer has not acknowledged")
+    parser.add_argument("--ack", type=int, default=None, help="Acknowledge the files up to this seq for --consumer")
+    parser.add_argument("--compact", action="store_true",
+                        help="Fold the files every consumer has acknowledged into the base file")
+    args = parser.parse_args(argv)
+
+    root = category_paths(args.category).bulk_dir
+    if args.ack is not None:
+        if not args.consumer:
+            parser.error("--ack needs --consumer")
+        acknowledge(root, args.consumer, args.ack)
+        print(f"{args.consumer} acknowledged {args.category} bulk files up to seq {args.ack}")
+        return 0
+    if args.compact:
+        print(f"Folded {compact(root)} acknowledged bulk file(s) of {args.category}")
+        return 0
+
+    if args.consumer:
+        entries = pending_files(root, args.consumer)
+    else:
+        entries = (load_manifest(root) or {"files": []})["files"]
+    for entry in entries:
+        print(f"{os.path.join(root, entry['file'])};{entry['seq']};{entry['rows']};{entry.get('md5', '')}")
+    for consumer, seq in sorted(load_acks(root).items()):
+        print(f"ack;{consumer};{seq}", file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,849 @@
+import io
+import os
+import sys
+import math
+import csv
+import argparse
+import hashlib
+from collections import deque
+from contextlib import redirect_stdout
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+from SilverOutput import append_text, load_checkpoint, recover_output, render_rows, roll_forward, save_checkpoint
+from BronzeCursor import iter_line_chunks, line_aligned_ranges, locate_new_data, save_cursor
+from DedupIndex import open_index
+import SilverParquet
+from SilverBulk import BulkExport
+from SilverRollups import update_rollups
+from DeltaHistory import record_changes
+from CategoryColumns import COLUMNS
+from RunMetrics import MAX_SAMPLES, PROMETHEUS_OUTPUT, RunMetrics
+from SilverPartitions import PartitionStore, partition_keys
+from SilverQuarantine import (REASON_INVALID, REASON_MISSING_FIELDS, append_entries, iter_entries,
+                              quarantine_path, set_aside)
+from TimestampParser import OUTPUT_FORMAT, parse_timestamp, to_canonical
+
+# Shared bronze -> silver transformation engine.
+#
+# Each Silver*Script declares its table as a CategorySpec: the output columns,
+# their type, valid range and null marker, and how the bronze line is split.
+# The spec is compiled once into column-wise pandas operations, so every
+# category gets the same cleaning rules, the same vectorized validators and
+# the same append / dedup / cursor handling. Rejected lines go to the
+# category's quarantine (see SilverQuarantine), the new rows also to the
+# bulk-load files (see SilverBulk). With --rollups the new rows are then
+# folded into per-machine hourly and daily rollups (see SilverRollups).
+# Timings, row counts and the aggregated warnings of a run are collected in
+# a RunMetrics.
+
+# === CONFIG ===
+BASE_DIR = os.path.abspath(os.path.join(os.getcwd(), ".."))
+
+OUTPUT_DATE_FORMAT = OUTPUT_FORMAT
+CLEAN_PATTERN = r"[\n\r\"']"
+
+# Fields read straight from their digits, without to_numeric or a split.
+# Pair halves are limited to 9 digits so that both fit in one int64.
+PLAIN_INT_PATTERN = r"-?[0-9]{1,15}"
+PLAIN_PAIR_PATTERN = r"[0-9]{1,9};[0-9]{1,9}"
+
+# float64 holds every integer exactly only up to this magnitude
+EXACT_INT_LIMIT = 2 ** 53
+INT64_RANGE = (-2 ** 63, 2 ** 63 - 1)
+
+# Bronze input is processed in chunks sized so that the peak memory of one
+# chunk (raw lines, split fields and validated columns) stays under this limit
+MEMORY_LIMIT_MB = 1024
+MEMORY_PER_BRONZE_BYTE = 40  # measured ~32x peak growth per bronze byte, plus margin
+
+# Validation worker processes per category, 1 validates in-process
+WORKERS = 1
+
+# Also write the typed, date-partitioned Parquet tier (needs pyarrow)
+PARQUET_OUTPUT = False
+
+# Keep appending to current/Silver_<Category>.dat next to the date
+# partitions, for consumers that still read the single file
+WRITE_CURRENT = True
+
+# Also write the new rows of each run as a bulk-load file for the database
+BULK_EXPORT = True
+
+# Fold the new rows into the hourly / daily rollups of the categories that
+# define rollup_measures. Off by default as it costs about as much as the
+# cleaning itself; a run with it on folds every row committed since the
+# last fold, so the rollups can be updated by a later or separate run.
+ROLLUPS = False
+
+
+# === SPECS ===
+@dataclass
+class Column:
+    """One output column.
+
+    kind is "int", "float", "datetime", "string" or "pair". Values outside
+    [min_value, max_value] become empty, values equal to null_marker are
+    treated as missing. A "pair" column reads an "X;Y" source field and
+    produces <name>_1 and <name>_2. Integers are truncated like int(float(x))
+    unless strict is set, in which case they are read like int(x) and
+    anything else ("3.7", "3.0", "1e3", "true") is invalid. When
+    required is set, rows where the value is missing or invalid are dropped.
+    sql_type is the type of the column in the <category>_logs table, by
+    default the one of its kind (see SilverBulk.SQL_TYPES).
+    """
+    name: str
+    kind: str
+    min_value: float = None
+    max_value: float = None
+    null_marker: float = None
+    decimals: int = 2
+    strict: bool = False
+    required: bool = False
+    sql_type: str = None
+
+    @property
+    def output_names(self):
+        if self.kind == "pair":
+            return [f"{self.name}_1", f"{self.name}_2"]
+        return [self.name]
+
+
+@dataclass
+class CategorySpec:
+    """Declarative description of one silver table.
+
+    quoted_fields enables csv quoting for bronze files whose fields may
+    contain the ';' delimiter (e.g. Cleaning's "X;Y" columns). bool_words maps
+    "true"/"false" to 1/0 in integer columns. rollup_measures are the columns
+    (or measures derived in SilverRollups) summed up per machine, hour and day.
+    """
+    category: str
+    columns: list
+    quoted_fields: bool = False
+    bool_words: bool = False
+    rollup_measures: list = field(default_factory=list)
+    validators: list = field(init=False, repr=False)
+
+    def __post_init__(self):
+        names = [column.name for column in self.columns]
+        if self.category in COLUMNS and names != COLUMNS[self.category]:
+            raise ValueError(f"columns of the {self.category} spec do not match CategoryColumns.COLUMNS")
+        self.validators = [compile_column(self, column) for column in self.columns]
+
+    # Validators are closures, compile them again in worker processes
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["validators"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.__post_init__()
+
+    @property
+    def output_columns(self):
+        return [name for column in self.columns for name in column.output_names]
+
+    # The record's own timestamp, used to partition the data by date
+    @property
+    def partition_column(self):
+        return next(column.name for column in self.columns if column.kind == "datetime")
+
+
+@dataclass
+class RunOptions:
+    memory_limit_mb: int = MEMORY_LIMIT_MB
+    workers: int = WORKERS
+    parquet: bool = PARQUET_OUTPUT
+    write_current: bool = WRITE_CURRENT
+    bulk_export: bool = BULK_EXPORT
+    rollups: bool = ROLLUPS
+    prometheus: bool = PROMETHEUS_OUTPUT
+    reprocess_quarantine: bool = False
+
+
+@dataclass
+class CategoryPaths:
+    input_file: str
+    cursor_file: str
+    index_file: str
+    legacy_tracker: str
+    output_file: str
+    history_root: str
+    parquet_dir: str
+    partition_dir: str
+    quarantine_file: str
+    bulk_dir: str
+    rollup_dir: str
+
+
+def category_paths(category):
+    bronze_current = os.path.join(BASE_DIR, "BronzeRawData", category, "current")
+    silver_base = os.path.join(BASE_DIR, "SilverRawData", category)
+    filename_out = f"Silver_{category}.dat"
+    return CategoryPaths(
+        input_file=os.path.join(bronze_current, f"{category}.dat"),
+        cursor_file=os.path.join(bronze_current, "silver_cursor.json"),
+        index_file=os.path.join(bronze_current, "cleaned_lines.db"),
+        legacy_tracker=os.path.join(bronze_current, "cleaned_lines.txt"),
+        output_file=os.path.join(silver_base, "current", filename_out),
+        history_root=silver_base,
+        parquet_dir=os.path.join(silver_base, "parquet"),
+        partition_dir=os.path.join(silver_base, "partitions"),
+        quarantine_file=quarantine_path(silver_base, category),
+        bulk_dir=os.path.join(silver_base, "bulk"),
+        rollup_dir=os.path.join(silver_base, "rollups"),
+    )
+
+
+# === SCALAR PARSERS ===
+# Only used for the few cells the bulk parsers cannot settle
+def hash_line(line):
+    return hashlib.md5(line.encode("utf-8")).digest()
+
+def clean_value(val):
+    if not isinstance(val, str):
+        val = str(val)
+    return val.replace("\n", "").replace("\r", "").replace('"', "").replace("'", "").strip()
+
+def parse_float(val):
+    try:
+        return float(val)
+    except (ValueError, OverflowError):
+        return None
+
+def parse_int(val, bool_words=False):
+    if bool_words:
+        if val.lower() == "true":
+            return 1
+        if val.lower() == "false":
+            return 0
+    try:
+        return int(float(val))
+    except (ValueError, OverflowError):
+        return None
+
+# int(val) as a float; numbers beyond the float range are clamped to it, the
+# exact value is read again from the text by exact_ints
+def parse_strict_int(val):
+    try:
+        number = int(val)
+    except ValueError:
+        return None
+    try:
+        return float(number)
+    except OverflowError:
+        return math.copysign(sys.float_info.max, number)
+
+
+# === VECTORIZED VALIDATORS ===
+# Bulk parsers tolerate surrounding whitespace, so cells only go through
+# clean_value when the bulk parse fails and the scalar retry kicks in.
+def retry_candidates(series, failed):
+    cleaned = series[failed & series.notna()].map(clean_value)
+    return cleaned[cleaned != ""]
+
+def report_invalid(invalid, col_name, metrics):
+    if metrics is None or not len(invalid):
+        return
+    metrics.warn("invalid_value", f"invalid value(s) in {col_name}", len(invalid),
+                 invalid.iloc[:MAX_SAMPLES].tolist(), column=col_name)
+
+def round_like_builtin(values, decimals):
+    rounded = values.round(decimals)
+    # Series.round() may disagree with the correctly rounded builtin on
+    # near-ties and on large magnitudes, settle only those with round()
+    scaled = values * 10 ** decimals
+    unsure = (np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6) | (np.abs(values) >= 1e7)
+    if unsure.any():
+        rounded[unsure] = values[unsure].map(lambda v: round(v, decimals))
+    return rounded
+
+def apply_bounds(values, column, metrics):
+    if column.null_marker is not None:
+        values[values == column.null_marker] = np.nan
+    out_of_range = pd.Series(False, index=values.index)
+    if column.min_value is not None:
+        out_of_range |= values < column.min_value
+    if column.max_value is not None:
+        out_of_range |= values > column.max_value
+    if out_of_range.any():
+        report_invalid(values[out_of_range], column.name, metrics)
+        values[out_of_range] = np.nan
+    return values
+
+def to_float(series, column, metrics):
+    values = pd.to_numeric(series, errors="coerce").astype("float64")
+    values[~np.isfinite(values)] = np.nan
+
+    # to_numeric is stricter than float() for a few spellings (e.g. "1_0")
+    retry = retry_candidates(series, values.isna())
+    if len(retry):
+        parsed = retry.map(parse_float).astype("float64")
+        parsed[~np.isfinite(parsed)] = np.nan
+        values[retry.index] = parsed
+        invalid = retry[parsed.isna() & ~retry.str.lower().str.lstrip("+-").eq("nan")]
+        report_invalid(invalid, column.name, metrics)
+    values = round_like_builtin(values, column.decimals)
+    return apply_bounds(values, column, metrics)
+
+# Numeric value of raw fields as float64, NaN where to_numeric fails. Plain
+# integers are cast from their text in bulk, only the others go through
+# to_numeric, which is much slower on text. With plain_only the others are
+# left NaN, for strict columns where to_numeric accepts too much.
+def numeric_values(series, plain_only=False):
+    text = series.astype(pd.StringDtype())
+    plain = text.str.fullmatch(PLAIN_INT_PATTERN).to_numpy(dtype=bool, na_value=False)
+    values = pd.Series(np.nan, index=series.index)
+    if plain.any():
+        values[plain] = text[plain].astype("int64").to_numpy(dtype="float64")
+    if not plain.all() and not plain_only:
+        values[~plain] = pd.to_numeric(series[~plain], errors="coerce").astype("float64").to_numpy()
+    return values
+
+def to_int(series, column, metrics, bool_words=False):
+    values = numeric_values(series, plain_only=column.strict)
+    values[~np.isfinite(values)] = np.nan
+
+    # Covers "true"/"false" as well as the spellings only float() accepts
+    retry = retry_candidates(series, values.isna())
+    if len(retry):
+        parse = parse_strict_int if column.strict else lambda v: parse_int(v, bool_words)
+        parsed = retry.map(parse).astype("float64")
+        parsed[~np.isfinite(parsed)] = np.nan
+        values[retry.index] = parsed
+        report_invalid(retry[parsed.isna()], column.name, metrics)
+
+    values = np.trunc(values) + 0.0  # int() has no negative zero
+    values = apply_bounds(values, column, metrics)
+    return exact_ints(values, series, column)
+
+# Integer column from float64 values. Beyond EXACT_INT_LIMIT the values are
+# read again from their text as Python ints, since to_numeric does not round
+# those correctly. A column only stays object when it holds values outside
+# int64, so that they are written out in full.
+def exact_ints(values, series, column):
+    big = (np.abs(values) >= EXACT_INT_LIMIT).to_numpy()
+    ints = values.where(~big).astype("Int64")
+    if not big.any():
+        return ints
+    positions = np.flatnonzero(big)
+    parse = int if column.strict else parse_int
+    parsed = [parse(clean_value(series.iloc[i])) for i in positions]
+    low, high = INT64_RANGE
+    if all(low <= value <= high for value in parsed):
+        ints.iloc[positions] = parsed
+        return ints
+    exact = ints.to_numpy(dtype=object, na_value=None)
+    exact[positions] = parsed
+    return pd.Series(exact, index=values.index, dtype=object)
+
+def to_datetime_text(series, column, metrics):
+    canonical = to_canonical(series)
+    formatted = canonical.fillna("")
+
+    retry = retry_candidates(series, canonical.isna())
+    if len(retry):
+        fallback = retry.map(parse_timestamp)
+        formatted[retry.index] = fallback.fillna("")
+        report_invalid(retry[fallback.isna()], column.name, metrics)
+    return formatted
+
+def to_string(series, column, metrics):
+    return series.fillna("").str.replace(CLEAN_PATTERN, "", regex=True).str.strip()
+
+# "digits;digits" pairs as two integer arrays: the pair read as one number
+# with the separator removed, divided by 10 ** (digits after the separator)
+def split_plain_pairs(text):
+    joined = text.str.replace(";", "", regex=False).astype("int64").to_numpy()
+    scale = 10 ** (text.str.len() - text.str.find(";") - 1).to_numpy(dtype="int64")
+    return joined // scale, joined % scale
+
+def to_pair(series, column, metrics):
+    # "X;Y" -> two integers, both empty unless exactly two numbers are given.
+    # Plain digit pairs, nearly all of them, are split in bulk; the others
+    # go through parse_pairs.
+    text = series.astype(pd.StringDtype())
+    plain = text.str.fullmatch(PLAIN_PAIR_PATTERN).to_numpy(dtype=bool, na_value=False)
+    first = pd.Series(pd.NA, index=series.index, dtype="Int64")
+    second = first.copy()
+    if plain.any():
+        first[plain], second[plain] = split_plain_pairs(text[plain])
+    if not plain.all():
+        rest_first, rest_second = parse_pairs(series[~plain], column, metrics)
+        first = fill_ints(first, ~plain, rest_first)
+        second = fill_ints(second, ~plain, rest_second)
+    return first, second
+
+# Values beyond int64 only fit an object column
+def fill_ints(target, mask, values):
+    if values.dtype == object:
+        target = target.astype(object)
+        target[mask] = values.to_numpy()
+    else:
+        target[mask] = values.array
+    return target
+
+def parse_pairs(series, column, metrics):
+    cleaned = series.fillna("").str.replace(CLEAN_PATTERN, "", regex=True)
+    parts = cleaned.str.split(";", expand=True).reindex(columns=range(3))
+    well_formed = parts[1].notna() & parts[2].isna()
+
+    malformed = cleaned[~well_formed & cleaned.str.strip().ne("")]
+    report_invalid(malformed, column.name, metrics)
+
+    part_column = Column(column.name, "int")
+    first = to_int(parts[0].where(well_formed), part_column, None)
+    second = to_int(parts[1].where(well_formed), part_column, None)
+    both = first.notna() & second.notna()
+    report_invalid(cleaned[well_formed & ~both], column.name, metrics)
+    return first.where(both), second.where(both)
+
+def compile_column(spec, column):
+    """Bind a column spec to its vectorized validator.
+
+    The returned function maps the raw source series and a RunMetrics (or
+    None) to a list of output series, one per output column.
+    """
+    if column.kind == "int":
+        return lambda s, counts: [to_int(s, column, counts, spec.bool_words)]
+    if column.kind == "float":
+        return lambda s, counts: [to_float(s, column, counts)]
+    if column.kind == "datetime":
+        return lambda s, counts: [to_datetime_text(s, column, counts)]
+    if column.kind == "string":
+        return lambda s, counts: [to_string(s, column, counts)]
+    if column.kind == "pair":
+        return lambda s, counts: list(to_pair(s, column, counts))
+    raise ValueError(f"Unknown column kind '{column.kind}' for {column.name}")
+
+
+# === PARSING ===
+def parse_header(spec, header_line):
+    if spec.quoted_fields:
+        return next(csv.reader([header_line], delimiter=";", quotechar='"'))
+    return header_line.strip().split(";")
+
+def split_fields(spec, header, lines):
+    """Split bronze lines into a DataFrame of raw fields (one column per header field).
+
+    Returns the fields, the digest of each line used for deduplication and
+    the source of each line (see source_line).
+    """
+    width = len(header)
+    if spec.quoted_fields:
+        rows = [row for row in csv.reader(lines, delimiter=";", quotechar='"') if row]
+        # The line identity is the parsed fields joined back, without quotes
+        hashes = [hash_line(";".join(row[:width])) for row in rows]
+        fields = pd.DataFrame(rows, dtype=object)
+        sources = rows
+    else:
+        stripped = [line.strip() for line in lines if line.strip()]
+        hashes = [hash_line(line) for line in stripped]
+        fields = pd.Series(stripped, dtype=object).str.split(";", expand=True)
+        sources = stripped
+    return fields.reindex(columns=range(width)), hashes, sources
+
+# A line as split_fields reads it back with the same digest: the stripped
+# line, or the parsed fields quoted again
+def source_line(spec, source):
+    if not spec.quoted_fields:
+        return source
+    text = io.StringIO()
+    csv.writer(text, delimiter=";", quotechar='"', lineterminator="").writerow(source)
+    return text.getvalue()
+
+# Quarantine entries of the lines validate_fields rejected
+def rejected_entries(spec, reasons, hashes, sources):
+    return [
+        (reason, digest, source_line(spec, source))
+        for reason, digest, source in zip(reasons, hashes, sources) if reason is not None
+    ]
+
+def validate_fields(spec, header, fields, metrics=None):
+    """Validate raw fields column-wise.
+
+    Returns the cleaned DataFrame, the boolean mask of kept rows and the
+    reason code of each dropped row (None for the kept ones). Invalid cells
+    and dropped rows are reported to metrics.
+    """
+    fields = fields.reset_index(drop=True)
+
+    complete = fields[len(header) - 1].notna()
+    reasons = np.where(complete.to_numpy(), None, REASON_MISSING_FIELDS).astype(object)
+    skipped = int((~complete).sum())
+    if skipped and metrics is not None:
+        samples = [";".join(row.dropna()) for _, row in fields[~complete].head(MAX_SAMPLES).iterrows()]
+        metrics.warn("missing_fields", "line(s) skipped due to missing fields", skipped, samples)
+    rows = fields[complete].reset_index(drop=True)
+
+    # Last occurrence wins, as with dict(zip(header, parts))
+    positions = {name: i for i, name in enumerate(header)}
+    outputs = {}
+    valid = pd.Series(True, index=rows.index)
+    for column, validator in zip(spec.columns, spec.validators):
+        for name, series in zip(column.output_names, validator(rows[positions[column.name]], metrics)):
+            outputs[name] = series
+        if column.required:
+            for name in column.output_names:
+                present = outputs[name].notna()
+                dropped = valid & ~present
+                if dropped.any():
+                    reasons[np.flatnonzero(complete)[dropped.to_numpy()]] = REASON_INVALID + name
+                    if metrics is not None:
+                        metrics.warn("missing_required", f"line(s) skipped due to invalid {name}",
+                                     int(dropped.sum()), column=name)
+                valid &= present
+
+    df = pd.DataFrame({name: outputs[name][valid] for name in spec.output_columns})
+    keep = complete.to_numpy().copy()
+    keep[keep] = valid.to_numpy()
+    return df.reset_index(drop=True), keep, reasons
+
+
+# === WRITING ===
+# Validated rows as written to the silver files, with their date partition
+def render_with_keys(spec, df):
+    return render_rows(df).split("\n")[:-1], partition_keys(df[spec.partition_column])
+
+# Write the new rows of a chunk to every silver output and its rejected lines
+# to the quarantine, then mark both as processed. The digests are committed
+# to the index with a journal of the sizes the current and quarantine files
+# reach, of the partition and bulk manifests and of the Parquet parts
+# written, and only then are the checkpoints and the manifests saved, see
+# recover_outputs. Returns False
+# when an append failed.
+def store_rows(spec, paths, store, bulk, index, options, rows, keys, frame, new_hashes, rejected):
+    journal = {}
+    if rows:
+        if options.write_current:
+            os.makedirs(os.path.dirname(paths.output_file), exist_ok=True)
+            if not append_text(spec.output_columns, "\n".join(rows) + "\n", paths.output_file, commit=False):
+                return False
+            journal["current"] = os.path.getsize(paths.output_file)
+        if not store.append(rows, keys):
+            return False
+        journal["partitions"] = store.commit_state()
+        if options.parquet:
+            journal["parquet"] = SilverParquet.write_rows(spec, frame, new_hashes, paths.parquet_dir,
+                                                          OUTPUT_DATE_FORMAT)
+        if bulk is not None:
+            if not bulk.append(rows):
+                return False
+            journal["bulk"] = bulk.commit_state()
+
+    if rejected:
+        if not append_entries(rejected, paths.quarantine_file, commit=False):
+            return False
+        journal["quarantine"] = os.path.getsize(paths.quarantine_file)
+    index.add_many(list(new_hashes) + [digest for _, digest, _ in rejected], journal=journal or None)
+    if "current" in journal:
+        save_checkpoint(paths.output_file, journal["current"])
+    if "quarantine" in journal:
+        save_checkpoint(paths.quarantine_file, journal["quarantine"])
+    store.commit()
+    if "parquet" in journal:
+        SilverParquet.commit(paths.parquet_dir, journal["parquet"], ["machine_id", spec.partition_column])
+    if bulk is not None:
+        bulk.commit()
+    return True
+
+# Bring the outputs back to their last committed state. Outputs whose rows
+# the index has committed (its journal) but whose checkpoint was not saved
+# yet keep those rows; anything written after the checkpoints is cut.
+def recover_outputs(spec, paths, index, store):
+    journal = index.journal() or {}
+    if "current" in journal:
+        roll_forward(paths.output_file, journal["current"])
+    if "quarantine" in journal:
+        roll_forward(paths.quarantine_file, journal["quarantine"])
+    if "partitions" in journal:
+        store.roll_forward(journal["partitions"])
+    if "bulk" in journal:
+        BulkExport(paths.bulk_dir, spec).roll_forward(journal["bulk"])
+    SilverParquet.recover(paths.parquet_dir, journal.get("parquet", []))
+    recover_output(paths.output_file)
+    recover_output(paths.quarantine_file)
+    store.recover()
+
+
+# === PARALLEL VALIDATION ===
+# Worker side: validate the complete lines of one byte range of the bronze
+# file. Deduplication needs the index and stays in the parent, so every line
+# of the range is validated and rendered; the parent then keeps the rows of
+# the lines it has not seen, in file order. Validation is row-wise, so this
+# gives the same rows as validating the new lines only (the warnings, though,
+# also cover lines already cleaned). The worker's metrics go back as a dict.
+def validate_range(spec, header, input_file, start, end, with_frame=False):
+    output = io.StringIO()
+    metrics = RunMetrics("silver", spec.category)
+    with redirect_stdout(output):
+        lines, offset = [], start
+        for lines, offset in iter_line_chunks(input_file, start, end):
+            pass
+        if not any(line.strip() for line in lines):
+            return [], np.zeros(0, dtype=bool), [], [], None, offset, output.getvalue(), metrics.to_dict(), []
+        with metrics.timer("parse"):
+            fields, hashes, sources = split_fields(spec, header, lines)
+        with metrics.timer("validate"):
+            df, keep, reasons = validate_fields(spec, header, fields, metrics)
+        with metrics.timer("write"):
+            rows, keys = render_with_keys(spec, df)
+            rejected = [(position, entry) for position, entry in zip(
+                np.flatnonzero(~keep), rejected_entries(spec, reasons, hashes, sources))]
+    return (hashes, keep, rows, keys, df if with_frame else None, offset, output.getvalue(), metrics.to_dict(),
+            rejected)
+
+# Validate line-aligned ranges in a process pool, yielding the results in
+# file order with a bounded number of ranges in flight
+def iter_validated_ranges(spec, header, input_file, start, end, chunk_bytes, workers, with_frame=False):
+    ranges = line_aligned_ranges(input_file, start, end, max(1, chunk_bytes // workers))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for range_start, range_end in ranges:
+            pending.append(executor.submit(validate_range, spec, header, input_file, range_start, range_end, with_frame))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+# Parent side: keep the rows of the lines not seen yet and store them
+def commit_range(spec, result, index, store, bulk, paths, options, metrics):
+    hashes, keep, rows, keys, df, offset, output, worker_metrics, rejected = result
+    print(output, end="")
+    metrics.merge(worker_metrics)
+
+    with metrics.timer("dedup"):
+        is_new = np.array(index.filter_new(hashes), dtype=bool)
+    count_rows(metrics, len(hashes), int(is_new.sum()), int((keep & is_new).sum()))
+    kept_new = is_new[keep]
+    new_rows = [row for row, new in zip(rows, kept_new) if new]
+    new_keys = [key for key, new in zip(keys, kept_new) if new]
+    new_hashes = [h for h, new in zip(hashes, keep & is_new) if new]
+    frame = df[kept_new] if df is not None else None
+    new_rejected = [entry for position, entry in rejected if is_new[position]]
+
+    with metrics.timer("write"):
+        if not store_rows(spec, paths, store, bulk, index, options, new_rows, new_keys, frame, new_hashes, new_rejected):
+            return None
+    return len(new_hashes)
+
+
+# === MAIN PROCESS ===
+def chunk_size(memory_limit_mb):
+    return max(1, memory_limit_mb * 1024 * 1024 // MEMORY_PER_BRONZE_BYTE)
+
+def count_rows(metrics, read, new, accepted):
+    metrics.count("rows_read", read)
+    metrics.count("rows_deduplicated", read - new)
+    metrics.count("rows_accepted", accepted)
+    metrics.count("rows_rejected", new - accepted)
+
+# Validate one chunk of bronze lines and store its new rows, returns the
+# number of rows stored or None when an append failed
+def process_chunk(spec, header, lines, index, store, bulk, paths, options, metrics):
+    with metrics.timer("parse"):
+        fields, line_hashes, sources = split_fields(spec, header, lines)
+
+    with metrics.timer("dedup"):
+        is_new = np.array(index.filter_new(line_hashes), dtype=bool)
+    new_hashes, rows, keys, df, rejected = [], [], [], None, []
+    if is_new.any():
+        with metrics.timer("validate"):
+            df, keep, reasons = validate_fields(spec, header, fields[is_new], metrics)
+        candidates = np.array(line_hashes, dtype=object)[is_new]
+        new_hashes = [h for h, kept in zip(candidates, keep) if kept]
+        with metrics.timer("write"):
+            rows, keys = render_with_keys(spec, df)
+            new_sources = [source for source, new in zip(sources, is_new) if new]
+            rejected = rejected_entries(spec, reasons, candidates, new_sources)
+    del fields, sources
+    count_rows(metrics, len(line_hashes), int(is_new.sum()), len(new_hashes))
+
+    with metrics.timer("write"):
+        if not store_rows(spec, paths, store, bulk, index, options, rows, keys, df, new_hashes, rejected):
+            return None
+    return len(new_hashes)
+
+# Validate the quarantined lines again, returns the number of rows now
+# stored or None when an append failed
+def replay_quarantine(spec, header, index, store, bulk, paths, options, metrics):
+    replay_file = set_aside(paths.quarantine_file, index)
+    if replay_file is None:
+        print("No quarantined lines to reprocess.")
+        return 0
+    stored = replayed = 0
+    for entries in iter_entries(replay_file):
+        rows = process_chunk(spec, header, [line for _, _, line in entries], index, store, bulk, paths,
+                             options, metrics)
+        if rows is None:
+            return None
+        stored += rows
+        replayed += len(entries)
+    os.remove(replay_file)
+    print(f"Reprocessed {replayed} quarantined line(s), {stored} row(s) now accepted")
+    return stored
+
+def run_category(spec, options=None, metrics=None):
+    """Clean the new bronze rows of one category. Returns 0 on success, 1 on error.
+
+    The new bytes are streamed in chunks bounded by options.memory_limit_mb;
+    each chunk is stored, indexed and checkpointed in the cursor before the
+    next one is read, so an interrupted backfill resumes where it stopped.
+    With options.workers > 1 each chunk is split between that many processes
+    and the results are committed in file order, giving the same output.
+    Rows go to the date partitions, and to the current file, the Parquet
+    tier and the run's bulk-load file when enabled, rejected lines to the
+    quarantine; with options.rollups the rows committed to the partitions
+    are then folded into the rollups. With options.reprocess_quarantine the quarantined lines are
+    validated again first. Stage timings, row counts and warnings go to
+    metrics; the warnings are printed once, aggregated, at the end.
+    """
+    options = options or RunOptions()
+    metrics = metrics if metrics is not None else RunMetrics("silver", spec.category)
+    paths = category_paths(spec.category)
+
+    if not os.path.exists(paths.input_file):
+        print(f"Input file not found: {paths.input_file}")
+        return 0
+
+    index = open_index(paths.index_file, legacy_tracker=paths.legacy_tracker)
+    bulk = None
+    completed = False
+    try:
+        store = PartitionStore(paths.partition_dir, os.path.basename(paths.output_file), spec.output_columns)
+        recover_outputs(spec, paths, index, store)
+        if options.bulk_export:
+            bulk = BulkExport(paths.bulk_dir, spec)
+            bulk.recover()
+
+        # Only the bytes appended since the last run are read
+        header_line, start, cursor = locate_new_data(paths.input_file, paths.cursor_file)
+
+        if not header_line.strip():
+            print("Input file is empty or only contains blank lines.")
+            return 0
+
+        header = parse_header(spec, header_line)
+        missing = [column.name for column in spec.columns if column.name not in header]
+        if missing:
+            print(f"Error: {paths.input_file} is missing column(s) {missing}")
+            return 1
+
+        if options.parquet and not SilverParquet.available():
+            print("Warning: pyarrow is not installed, skipping the Parquet output")
+            options.parquet = False
+
+        chunk_bytes = chunk_size(options.memory_limit_mb)
+        new_bytes = cursor["size"] - start
+        if new_bytes > chunk_bytes:
+            print(f"Streaming {new_bytes} new bytes in chunks of {chunk_bytes} bytes")
+
+        appended = 0
+        if options.reprocess_quarantine:
+            appended = replay_quarantine(spec, header, index, store, bulk, paths, options, metrics)
+            if appended is None:
+                metrics.print_warnings()
+                return 1
+        if options.workers > 1:
+            results = iter_validated_ranges(spec, header, paths.input_file, start, cursor["size"], chunk_bytes,
+                                            options.workers, options.parquet)
+            chunks = ((commit_range(spec, result, index, store, bulk, paths, options, metrics), result[5])
+                      for result in results)
+        else:
+            chunks = ((process_chunk(spec, header, lines, index, store, bulk, paths, options, metrics), offset)
+                      for lines, offset in iter_line_chunks(paths.input_file, start, cursor["size"], chunk_bytes))
+
+        for rows, offset in chunks:
+            if rows is None:
+                metrics.print_warnings()
+                return 1
+            appended += rows
+            cursor["offset"] = offset
+            save_cursor(paths.cursor_file, cursor)
+            if new_bytes > chunk_bytes:
+                print(f"Processed {offset - start}/{new_bytes} bytes, {appended} row(s) appended so far")
+        save_cursor(paths.cursor_file, cursor)
+        completed = True
+    finally:
+        # The run's bulk file is sealed with the rows committed so far,
+        # whichever way the run ends; the journal holds those of a chunk that
+        # failed after the index commit
+        journal = index.journal() or {}
+        index.close()
+        if bulk is not None:
+            if completed:
+                bulk.close()
+            else:
+                bulk.abort(journal.get("bulk"))
+
+    rolled_up = 0
+    if options.rollups and spec.rollup_measures:
+        with metrics.timer("rollup"):
+            rolled_up = update_rollups(spec, paths)
+        metrics.count("rows_rolled_up", rolled_up)
+    metrics.print_warnings()
+
+    if appended:
+        print(f"Stored {appended} new row(s) in the date partitions of {paths.partition_dir}")
+        if bulk is not None and bulk.entry is not None:
+            print(f"Bulk-load file written: {os.path.join(paths.bulk_dir, bulk.entry['file'])}")
+        if rolled_up:
+            print(f"Rollups updated with {rolled_up} row(s): {paths.rollup_dir}")
+        if options.write_current:
+            print(f"Cleaned data appended to {paths.output_file}")
+    else:
+        print("No new data to clean.")
+    # The history follows the committed size of the current file, whichever
+    # run made it grow; without the current file there is no silver history
+    if options.write_current:
+        with metrics.timer("backup"):
+            delta = record_changes(paths.output_file, paths.history_root, end=load_checkpoint(paths.output_file))
+        if delta:
+            print(f"History delta recorded: {delta}")
+    return 0
+
+
+def add_run_arguments(parser):
+    parser.add_argument("--workers", type=int, default=WORKERS,
+                        help="Number of validation processes per category (default: %(default)s)")
+    parser.add_argument("--memory-limit-mb", type=int, default=MEMORY_LIMIT_MB,
+                        help="Approximate memory ceiling, bounds the bronze chunk size (default: %(default)s)")
+    parser.add_argument("--parquet", action="store_true", default=PARQUET_OUTPUT,
+                        help="Also write the date-partitioned Parquet tier (needs pyarrow)")
+    parser.add_argument("--no-current", dest="write_current", action="store_false", default=WRITE_CURRENT,
+                        help="Only write the date partitions, not current/Silver_<Category>.dat "
+                             "(no silver history is recorded then)")
+    parser.add_argument("--no-bulk", dest="bulk_export", action="store_false", default=BULK_EXPORT,
+                        help="Do not write the run's rows to the bulk-load files under bulk/")
+    parser.add_argument("--rollups", action="store_true", default=ROLLUPS,
+                        help="Also fold the new rows into the hourly / daily rollups under rollups/")
+    parser.add_argument("--prometheus", action="store_true", default=PROMETHEUS_OUTPUT,
+                        help="Also write the run metrics as a Prometheus text file next to the JSON report")
+    parser.add_argument("--reprocess-quarantine", action="store_true", default=False,
+                        help="Validate the quarantined lines again first, e.g. after a validator fix")
+
+def options_from_args(args):
+    return RunOptions(
+        memory_limit_mb=args.memory_limit_mb,
+        workers=args.workers,
+        parquet=args.parquet,
+        write_current=args.write_current,
+        bulk_export=args.bulk_export,
+        rollups=args.rollups,
+        prometheus=args.prometheus,
+        reprocess_quarantine=args.reprocess_quarantine,
+    )
+
+def cli(spec, argv=None):
+    parser = argparse.ArgumentParser(description=f"Clean the new {spec.category} bronze rows into the silver files.")
+    add_run_arguments(parser)
+    options = options_from_args(parser.parse_args(argv))
+    metrics = RunMetrics(f"silver_{spec.category}", spec.category)
+    status = run_category(spec, options, metrics)
+    print(f"Run report written to {metrics.write_report(status, options.prometheus)}")
+    return status
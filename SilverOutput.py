@@ -0,0 +1,119 @@
+import os
+
+# Shared append-only writer for the Silver_*.dat outputs.
+#
+# New rows are appended to the current file instead of re-reading and rewriting
+# the whole history on every run. After each append the file is fsynced and its
+# size is checkpointed next to it (Silver_<Category>.dat.offset). A size larger
+# than the checkpoint means a previous run crashed mid-append: the file is
+# truncated back to the checkpoint.
+#
+# The silver engine appends with commit=False and saves the checkpoint only
+# after the dedup index has committed the digests of the rows together with
+# the new size. Truncating is right for a run that stopped before that commit,
+# since the rows are produced again from the bronze lines. A run that stopped
+# after it would lose them, as their lines are now skipped: roll_forward()
+# moves the checkpoint up to the size the index committed instead.
+
+CHECKPOINT_SUFFIX = ".offset"
+
+def checkpoint_path(output_file):
+    return output_file + CHECKPOINT_SUFFIX
+
+def load_checkpoint(output_file):
+    try:
+        with open(checkpoint_path(output_file), "r") as f:
+            return int(f.read().strip())
+    except (OSError, ValueError):
+        return None
+
+def save_checkpoint(output_file, offset):
+    path = checkpoint_path(output_file)
+    temp_path = path + ".tmp"
+    with open(temp_path, "w") as f:
+        f.write(str(offset))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+# Move the checkpoint up to a size committed in the dedup index, when the
+# run stopped before saving it
+def roll_forward(output_file, size):
+    committed = load_checkpoint(output_file)
+    if committed is None or committed >= size or not os.path.exists(output_file):
+        return
+    if os.path.getsize(output_file) >= size:
+        print(f"Warning: keeping {size - committed} committed bytes of {output_file} from an interrupted run")
+        save_checkpoint(output_file, size)
+
+# Bring the output file back to its last committed size
+def recover_output(output_file):
+    if not os.path.exists(output_file):
+        if os.path.exists(checkpoint_path(output_file)):
+            os.remove(checkpoint_path(output_file))
+        return
+
+    size = os.path.getsize(output_file)
+    committed = load_checkpoint(output_file)
+
+    if committed is None:
+        # First run with append mode, adopt the file as it is
+        save_checkpoint(output_file, size)
+    elif size > committed:
+        print(f"Warning: {output_file} has {size - committed} uncommitted bytes from an interrupted run, truncating")
+        with open(output_file, "r+b") as f:
+            f.truncate(committed)
+            f.flush()
+            os.fsync(f.fileno())
+    elif size < committed:
+        print(f"Warning: {output_file} is smaller than its checkpoint ({size} < {committed}), resetting checkpoint")
+        save_checkpoint(output_file, size)
+
+def read_header(output_file):
+    with open(output_file, "r", encoding="utf-8") as f:
+        return f.readline().rstrip("\n").split(";")
+
+def ends_with_newline(output_file):
+    with open(output_file, "rb") as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b"\n"
+
+# Rows as they are written to the file, without the header
+def render_rows(df):
+    return df.to_csv(sep=";", index=False, header=False, lineterminator="\n")
+
+# Append the rows of df, writing the header only when the file is created
+def append_rows(df, output_file):
+    return append_text(list(df.columns), render_rows(df), output_file)
+
+# Append rows already rendered by render_rows under the given columns. With
+# commit=False the checkpoint is left for the caller to save.
+def append_text(columns, text, output_file, commit=True):
+    recover_output(output_file)
+    if not os.path.exists(output_file):
+        save_checkpoint(output_file, 0)  # so that an interrupted first append is cut too
+    if not write_text(columns, text, output_file):
+        return False
+    if commit:
+        save_checkpoint(output_file, os.path.getsize(output_file))
+    return True
+
+# Append rendered rows to a file without checkpointing it, writing the
+# header only when the file is created
+def write_text(columns, text, output_file):
+    is_new_file = not os.path.exists(output_file) or os.path.getsize(output_file) == 0
+    if not is_new_file:
+        header = read_header(output_file)
+        if header != list(columns):
+            print(f"Error: columns of {output_file} do not match the new rows, nothing appended")
+            return False
+
+    with open(output_file, "a", encoding="utf-8", newline="") as f:
+        if is_new_file:
+            f.write(";".join(columns) + "\n")
+        elif not ends_with_newline(output_file):
+            f.write("\n")
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    return True
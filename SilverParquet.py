@@ -0,0 +1,258 @@
+import os
+import json
+import hashlib
+import pandas as pd
+from SilverBulk import load_json, write_atomic
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow is optional, the .dat files do not need it
+    pa = ds = pq = None
+
+# Optional columnar copy of the silver tables.
+#
+# When enabled, the silver step also writes the rows it appends to
+# Silver_<Category>.dat as typed Parquet files under
+# SilverRawData/<Category>/parquet/month=YYYY-MM/, partitioned by the
+# record's own timestamp. Monthly partitions keep the number of files low
+# (a chunk spanning many days writes one file per month, not per day) while
+# files are sorted by machine_id and timestamp and carry row-group
+# statistics, so read_table() only opens the months of the requested range
+# and skips row groups outside the requested machines and times.
+#
+# A part file is named after the digests of the lines it holds. The names a
+# chunk is about to write are saved in parquet/pending.json first, and the
+# silver engine commits them with the dedup index, in its journal: on the
+# next run recover() keeps the pending parts the index committed and removes
+# the others, whose rows are produced again from the bronze lines (in chunks
+# that may be cut differently, so under other names). Partitions with many
+# small files are compacted once their parts are committed.
+
+DATE_PARTITION = "month"
+PARTITION_FORMAT = "%Y-%m"
+UNKNOWN_DATE = "unknown"  # rows without a valid timestamp
+ROW_GROUP_SIZE = 64 * 1024
+MAX_FILES_PER_PARTITION = 16
+SOURCES_KEY = b"compacted_from"
+PENDING_NAME = "pending.json"
+
+
+def available():
+    return pa is not None
+
+
+def arrow_type(kind):
+    return {
+        "int": pa.int64(),
+        "pair": pa.int64(),
+        "float": pa.float64(),
+        "datetime": pa.timestamp("s"),
+        "string": pa.string(),
+    }[kind]
+
+
+def arrow_schema(spec):
+    return pa.schema([
+        (name, arrow_type(column.kind))
+        for column in spec.columns
+        for name in column.output_names
+    ])
+
+
+# Typed copy of the validated rows (timestamps are text in the .dat files).
+# Integers outside int64 are kept in full in the .dat files only, they are
+# empty here.
+def to_typed_frame(spec, df, date_format):
+    typed = df.copy()
+    for column in spec.columns:
+        if column.kind == "datetime":
+            typed[column.name] = pd.to_datetime(typed[column.name], format=date_format, errors="coerce")
+        elif column.kind in ("int", "pair"):
+            for name in column.output_names:
+                if typed[name].dtype == object:
+                    typed[name] = typed[name].map(int64_or_none).astype("Int64")
+    return typed
+
+
+def int64_or_none(value):
+    if value is None or pd.isna(value) or not -2 ** 63 <= value < 2 ** 63:
+        return None
+    return value
+
+
+def partition_dirs(root):
+    if not os.path.isdir(root):
+        return []
+    return sorted(
+        os.path.join(root, name) for name in os.listdir(root)
+        if name.startswith(f"{DATE_PARTITION}=")
+    )
+
+
+def part_files(partition_dir):
+    return sorted(
+        os.path.join(partition_dir, name) for name in os.listdir(partition_dir)
+        if name.endswith(".parquet")
+    )
+
+
+def write_file(table, path, metadata=None):
+    if metadata:
+        table = table.replace_schema_metadata({**(table.schema.metadata or {}), **metadata})
+    # Dot files are ignored by dataset discovery
+    temp_path = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.tmp")
+    pq.write_table(table, temp_path, row_group_size=ROW_GROUP_SIZE, compression="zstd", write_statistics=True)
+    os.replace(temp_path, path)
+
+
+def write_rows(spec, df, line_hashes, root, date_format):
+    """Write validated rows to the date partitions under root; returns the part files written.
+
+    line_hashes are the digests of the bronze lines behind the rows; they
+    name the part files. The parts stay pending until commit() is called
+    with the returned names.
+    """
+    if df.empty:
+        return []
+    schema = arrow_schema(spec)
+    typed = to_typed_frame(spec, df, date_format)
+    timestamp = typed[spec.partition_column]
+    dates = timestamp.dt.strftime(PARTITION_FORMAT).fillna(UNKNOWN_DATE)
+    batch_id = hashlib.md5(b"".join(line_hashes)).hexdigest()[:16]
+
+    parts = []
+    for date, rows in typed.groupby(dates, sort=True):
+        partition_dir = os.path.join(root, f"{DATE_PARTITION}={date}")
+        os.makedirs(partition_dir, exist_ok=True)
+        name = f"part-{batch_id}.parquet"
+        if name in compacted_sources(partition_dir):
+            continue  # Written and compacted before an interrupted run
+        parts.append((f"{DATE_PARTITION}={date}/{name}", rows))
+    save_pending(root, [part for part, _ in parts])
+
+    for part, rows in parts:
+        rows = rows.sort_values(["machine_id", spec.partition_column], kind="stable")
+        table = pa.Table.from_pandas(rows, schema=schema, preserve_index=False)
+        write_file(table, os.path.join(root, *part.split("/")))
+    return [part for part, _ in parts]
+
+
+def save_pending(root, parts):
+    os.makedirs(root, exist_ok=True)
+    write_atomic(os.path.join(root, PENDING_NAME), json.dumps(parts))
+
+
+# Mark the parts written by write_rows as committed and compact their partitions
+def commit(root, parts, sort_keys):
+    pending_path = os.path.join(root, PENDING_NAME)
+    if os.path.exists(pending_path):
+        os.remove(pending_path)
+    for partition in sorted({part.split("/")[0] for part in parts}):
+        compact_partition(os.path.join(root, partition), sort_keys)
+
+
+# Remove the pending parts of an interrupted run that the dedup index did
+# not commit (committed: the parts of its journal), keep the others
+def recover(root, committed):
+    pending = load_json(os.path.join(root, PENDING_NAME), None)
+    if pending is None:
+        return
+    for part in pending:
+        path = os.path.join(root, *part.split("/"))
+        if part not in committed and os.path.exists(path):
+            print(f"Warning: removing uncommitted Parquet part {part}")
+            os.remove(path)
+    os.remove(os.path.join(root, PENDING_NAME))
+
+
+# Names of the part files already merged into a compact file of the partition
+def compacted_sources(partition_dir):
+    sources = {}
+    for path in part_files(partition_dir):
+        if os.path.basename(path).startswith("compact-"):
+            names = (pq.read_schema(path).metadata or {}).get(SOURCES_KEY, b"").decode()
+            sources.update((name, path) for name in names.split(",") if name)
+    return sources
+
+
+# Part files a file stands for: itself and, for a compact file, its sources
+def source_names(path):
+    names = [os.path.basename(path)]
+    if names[0].startswith("compact-"):
+        sources = (pq.read_schema(path).metadata or {}).get(SOURCES_KEY, b"").decode()
+        names += [name for name in sources.split(",") if name]
+    return names
+
+
+# Merge the part files of a partition once there are too many of them. The
+# merged file lists its sources, those of the compact files it merges
+# included, so sources left over by an interrupted compaction are removed on
+# the next pass instead of being read twice and a part written again is
+# recognised however many times it was compacted.
+def compact_partition(partition_dir, sort_keys):
+    for name, merged_into in compacted_sources(partition_dir).items():
+        leftover = os.path.join(partition_dir, name)
+        if leftover != merged_into and os.path.exists(leftover):
+            os.remove(leftover)
+    files = part_files(partition_dir)
+    if len(files) <= MAX_FILES_PER_PARTITION:
+        return
+
+    names = [os.path.basename(path) for path in files]
+    sources = list(dict.fromkeys(name for path in files for name in source_names(path)))
+    table = pa.concat_tables(pq.read_table(path) for path in files)
+    table = table.sort_by([(key, "ascending") for key in sort_keys])
+    merged = os.path.join(partition_dir, f"compact-{hashlib.md5(','.join(names).encode()).hexdigest()[:16]}.parquet")
+    write_file(table, merged, {SOURCES_KEY: ",".join(sources).encode()})
+    for path in files:
+        if path != merged:
+            os.remove(path)
+
+
+def read_table(spec, machine_ids=None, start=None, end=None, columns=None, root=None):
+    """Load the Parquet tier of a category as a DataFrame.
+
+    Only rows of the given machine_ids with a timestamp in [start, end) are
+    read; the month partitions outside the range are not opened and the row
+    groups are filtered on their statistics. start and end accept anything
+    pd.Timestamp does.
+    """
+    if not available():
+        raise ImportError("pyarrow is required to read the Parquet silver tier")
+    if root is None:
+        from SilverEngine import category_paths
+        root = category_paths(spec.category).parquet_dir
+    if not partition_dirs(root):
+        return arrow_schema(spec).empty_table().to_pandas()
+
+    dataset = ds.dataset(
+        root,
+        schema=arrow_schema(spec).append(pa.field(DATE_PARTITION, pa.string())),
+        format="parquet",
+        partitioning=ds.partitioning(pa.schema([(DATE_PARTITION, pa.string())]), flavor="hive"),
+        exclude_invalid_files=False,
+    )
+
+    ts = ds.field(spec.partition_column)
+    date = ds.field(DATE_PARTITION)
+    condition = None
+
+    def add(expression):
+        nonlocal condition
+        condition = expression if condition is None else condition & expression
+
+    if machine_ids is not None:
+        add(ds.field("machine_id").isin([int(m) for m in machine_ids]))
+    if start is not None:
+        start = pd.Timestamp(start)
+        add((date >= start.strftime(PARTITION_FORMAT)) & (date != UNKNOWN_DATE))
+        add(ts >= pa.scalar(start.to_pydatetime(), pa.timestamp("s")))
+    if end is not None:
+        end = pd.Timestamp(end)
+        add(date <= end.strftime(PARTITION_FORMAT))
+        add(ts < pa.scalar(end.to_pydatetime(), pa.timestamp("s")))
+
+    columns = columns or arrow_schema(spec).names
+    return dataset.to_table(columns=columns, filter=condition).to_pandas()
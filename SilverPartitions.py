@@ -0,0 +1,169 @@
+import os
+import sys
+import json
+import argparse
+from SilverOutput import write_text
+
+# Date-partitioned layout of the silver tables.
+#
+# Rows are appended to SilverRawData/<Category>/partitions/YYYY/MM/DD/
+# Silver_<Category>.dat, chosen by the record's own timestamp (timestamp_start
+# for Cleaning); rows without a valid timestamp go to partitions/unknown/.
+# Partition files have the same header and format as the current file.
+#
+# partitions/manifest.json lists every partition with its row count, size and
+# the sequence number of the last commit that changed it. The sequence grows
+# by one at every commit: a consumer keeps the sequence it has loaded up to
+# (its watermark) and only reloads the partitions changed after it.
+#
+# Before rows are appended, the sizes of the files about to change are saved
+# in the manifest as "pending". If a run stops before the commit, the next
+# run truncates those files back to the saved sizes. The silver engine
+# commits the partitions after the dedup index, which records their
+# commit_state() in its journal; a run that stopped between the two is
+# brought forward to that state with roll_forward() instead.
+
+MANIFEST_NAME = "manifest.json"
+UNKNOWN_PARTITION = "unknown"
+
+# YYYY/MM/DD of each "YYYY-MM-DD HH:MM:SS" timestamp, "unknown" when empty
+def partition_keys(timestamps):
+    keys = timestamps.fillna("").str.slice(0, 10).str.replace("-", "/", regex=False)
+    return keys.where(keys != "", UNKNOWN_PARTITION).tolist()
+
+
+def load_manifest(root):
+    try:
+        with open(os.path.join(root, MANIFEST_NAME), "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"seq": 0, "partitions": {}, "pending": None}
+
+
+class PartitionStore:
+    def __init__(self, root, filename, columns):
+        self.root = root
+        self.filename = filename
+        self.columns = columns
+        self.manifest = load_manifest(root)
+
+    def path_of(self, key):
+        return os.path.join(self.root, *key.split("/"), self.filename)
+
+    def save(self):
+        os.makedirs(self.root, exist_ok=True)
+        path = os.path.join(self.root, MANIFEST_NAME)
+        temp_path = path + ".tmp"
+        with open(temp_path, "w") as f:
+            json.dump(self.manifest, f, indent=1, sort_keys=True)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+
+    # Undo the appends of a run that stopped before committing them
+    def recover(self):
+        pending = self.manifest.get("pending")
+        if not pending:
+            return
+        for key, size in pending.items():
+            path = self.path_of(key)
+            if os.path.exists(path) and os.path.getsize(path) > size:
+                print(f"Warning: truncating uncommitted rows of partition {key}")
+                with open(path, "r+b") as f:
+                    f.truncate(size)
+                    f.flush()
+                    os.fsync(f.fileno())
+        self.manifest["pending"] = None
+        self.save()
+
+    def append(self, rows, keys):
+        """Append rendered rows to the partition of each row's key.
+
+        The new rows become visible to consumers once commit() is called.
+        """
+        groups = {}
+        for row, key in zip(rows, keys):
+            groups.setdefault(key, []).append(row)
+        if not groups:
+            return True
+
+        self.manifest["pending"] = {
+            key: os.path.getsize(self.path_of(key)) if os.path.exists(self.path_of(key)) else 0
+            for key in groups
+        }
+        self.save()
+
+        for key, lines in sorted(groups.items()):
+            path = self.path_of(key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            if not write_text(self.columns, "\n".join(lines) + "\n", path):
+                return False
+            stats = self.manifest["partitions"].setdefault(key, {"rows": 0, "bytes": 0, "seq": 0})
+            stats["rows"] += len(lines)
+            stats["bytes"] = os.path.getsize(path)
+        return True
+
+    # Manifest state commit() is going to save, for the dedup index journal
+    def commit_state(self):
+        pending = self.manifest.get("pending") or {}
+        return {"seq": self.manifest["seq"] + 1,
+                "partitions": {key: self.manifest["partitions"][key] for key in pending}}
+
+    # Apply a commit_state() the run did not get to save. The files are cut
+    # back to the committed sizes by the next recover().
+    def roll_forward(self, state):
+        if self.manifest["seq"] >= state["seq"]:
+            return
+        print(f"Warning: committing the partitions of an interrupted run (seq {state['seq']})")
+        for key, stats in state["partitions"].items():
+            self.manifest["partitions"][key] = {**stats, "seq": state["seq"]}
+        self.manifest["seq"] = state["seq"]
+        self.manifest["pending"] = {key: stats["bytes"] for key, stats in state["partitions"].items()}
+        self.save()
+
+    def commit(self):
+        pending = self.manifest.get("pending")
+        if not pending:
+            return
+        self.manifest["seq"] += 1
+        for key in pending:
+            self.manifest["partitions"][key]["seq"] = self.manifest["seq"]
+        self.manifest["pending"] = None
+        self.save()
+
+
+def changed_partitions(root, filename, watermark=0):
+    """Return the partitions changed after watermark and the new watermark.
+
+    Each partition is a dict with its key (YYYY/MM/DD), file path, rows,
+    bytes and seq. Only the first `bytes` bytes of a file are committed, a
+    run in progress may be appending after them. Pass the returned watermark
+    on the next call to only get newer changes.
+    """
+    manifest = load_manifest(root)
+    changed = [
+        {"partition": key, "path": os.path.join(root, *key.split("/"), filename), **stats}
+        for key, stats in sorted(manifest["partitions"].items())
+        if stats["seq"] > watermark
+    ]
+    return changed, manifest["seq"]
+
+
+# List the partition files changed since a watermark, e.g. for an import job
+def main(argv=None):
+    from SilverEngine import category_paths
+
+    parser = argparse.ArgumentParser(description="List the silver partitions changed since a watermark.")
+    parser.add_argument("category", help="Cleaning, Info, Rinse or Product")
+    parser.add_argument("--since", type=int, default=0, help="Watermark returned by the previous load (default: 0)")
+    args = parser.parse_args(argv)
+
+    paths = category_paths(args.category)
+    changed, watermark = changed_partitions(paths.partition_dir, os.path.basename(paths.output_file), args.since)
+    for partition in changed:
+        print(f"{partition['path']};{partition['rows']};{partition['bytes']};{partition['seq']}")
+    print(f"watermark;{watermark}", file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
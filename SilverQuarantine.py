@@ -0,0 +1,122 @@
+import os
+import sys
+import argparse
+import importlib
+from collections import Counter
+from SilverOutput import append_text, checkpoint_path, recover_output
+
+# Quarantine of the bronze lines the silver step rejects.
+#
+# A line that has fewer fields than the header, or whose required values are
+# invalid (e.g. machine_id), is not dropped silently: it is appended once to
+# SilverRawData/<Category>/quarantine/Quarantine_<Category>.dat with a reason
+# code and the digest the dedup index knows it by, and its digest is added to
+# the index so that the same line is skipped without being validated again.
+#
+# After a validator fix the quarantine is replayed (--reprocess-quarantine):
+# the digests are removed from the index, the file is set aside as
+# Quarantine_<Category>.dat.replay and its lines go through the validators
+# like new bronze lines. Lines still rejected are quarantined again. A replay
+# that stops half way is resumed by the next one.
+
+QUARANTINE_COLUMNS = ["reason", "line_md5", "line"]
+REPLAY_SUFFIX = ".replay"
+READ_BATCH = 100_000  # lines replayed at once
+REASON_MISSING_FIELDS = "missing_fields"
+REASON_INVALID = "invalid:"  # followed by the column name
+
+
+def quarantine_path(category_dir, category):
+    return os.path.join(category_dir, "quarantine", f"Quarantine_{category}.dat")
+
+# One record per line: a line break inside a quoted field (from a stray
+# quote in the bronze data) would split it
+def one_line(text):
+    return text.replace("\r", " ").replace("\n", " ")
+
+# Quarantine file lines for (reason, digest, line) entries
+def render_entries(entries):
+    return "".join(f"{reason};{digest.hex()};{one_line(line)}\n" for reason, digest, line in entries)
+
+def append_entries(entries, path, commit=True):
+    """Append quarantine entries, durably; returns False when the file could not be appended to.
+
+    With commit=False the file's checkpoint is left for the caller to save.
+    """
+    if not entries:
+        return True
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return append_text(QUARANTINE_COLUMNS, render_entries(entries), path, commit)
+
+def iter_entries(path, batch=READ_BATCH):
+    """Yield the (reason, digest, line) entries of a quarantine file, in lists of up to batch."""
+    entries = []
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        f.readline()  # header
+        for record in f:
+            parts = record.rstrip("\r\n").split(";", 2)
+            if len(parts) < 3:
+                continue
+            entries.append((parts[0], bytes.fromhex(parts[1]), parts[2]))
+            if len(entries) >= batch:
+                yield entries
+                entries = []
+    if entries:
+        yield entries
+
+# Take the quarantine file out of the way of the replay, after removing its
+# digests from the index, and return the file to replay (None when empty).
+# An existing replay file is from an interrupted replay, whose digests were
+# removed already.
+def set_aside(path, index):
+    replay_path = path + REPLAY_SUFFIX
+    if os.path.exists(replay_path):
+        return replay_path
+    if not os.path.exists(path):
+        return None
+    recover_output(path)
+    for entries in iter_entries(path):
+        index.remove_many([digest for _, digest, _ in entries])
+    os.replace(path, replay_path)
+    if os.path.exists(checkpoint_path(path)):
+        os.remove(checkpoint_path(path))
+    return replay_path
+
+
+# Count the quarantined lines of a category by reason, or replay them
+def main(argv=None):
+    from SilverEngine import RunOptions, category_paths, run_category
+    from SilverRunner import SPEC_MODULES
+
+    parser = argparse.ArgumentParser(description="Show or replay the quarantined lines of a silver category.")
+    parser.add_argument("category", help="Cleaning, Info, Rinse or Product")
+    parser.add_argument("--samples", type=int, default=3, help="Example lines shown per reason (default: %(default)s)")
+    parser.add_argument("--reprocess", action="store_true",
+                        help="Validate the quarantined lines again and store those now accepted")
+    args = parser.parse_args(argv)
+
+    if args.category not in SPEC_MODULES:
+        parser.error(f"unknown category: {args.category}")
+    if args.reprocess:
+        spec = importlib.import_module(SPEC_MODULES[args.category]).SPEC
+        return run_category(spec, RunOptions(reprocess_quarantine=True))
+
+    path = category_paths(args.category).quarantine_file
+    if not os.path.exists(path):
+        print(f"No quarantined lines for {args.category}")
+        return 0
+    reasons, samples = Counter(), {}
+    for entries in iter_entries(path):
+        for reason, _, line in entries:
+            reasons[reason] += 1
+            examples = samples.setdefault(reason, [])
+            if len(examples) < args.samples:
+                examples.append(line)
+    for reason, count in reasons.most_common():
+        print(f"{reason};{count}")
+        for line in samples[reason]:
+            print(f"    {line}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,298 @@
+import io
+import os
+import sys
+import argparse
+import importlib
+import pandas as pd
+from SilverBulk import load_json, save_manifest, write_atomic
+from SilverPartitions import UNKNOWN_PARTITION, changed_partitions
+
+# Per-machine hourly and daily rollups of the silver tables.
+#
+# Dashboards aggregate the product, rinse and cleaning history again and
+# again (drinks per machine and hour, mean ext_time / grind_time, cleaning
+# durations). After every silver run the rows it committed to the date
+# partitions are folded into per-machine buckets under
+# SilverRawData/<Category>/rollups/: hourly buckets in one file per month,
+# daily buckets in one file per year. A bucket holds its row count and, for
+# each measure of the spec's rollup_measures, the count, sum, min and max of
+# its values, which add up: a late row read from an old partition updates
+# the buckets of its own hour and day, and a year of daily KPIs is one small
+# file instead of the raw rows.
+#
+# Only partition bytes not folded yet are read: rollups/manifest.json keeps
+# the size folded so far of each partition and the partition manifest seq
+# read up to (see SilverPartitions), so a run reads the partitions changed
+# since and, in each, only the rows appended after the folded size. Files
+# are never rewritten in place: an updated month or year is written under
+# the manifest's next seq and the manifest switched to it in one save. A
+# fold that stops half way leaves files the manifest does not list, which
+# are removed, and the rows are folded again by the next run.
+#
+# As the buckets add up, a byte range must be folded exactly once. When the
+# partitions no longer extend what was folded (a partition cut below its
+# folded size or gone, a partition manifest seq behind the watermark), the
+# rollups are rebuilt from all partitions instead of folding on top.
+
+# === CONFIG ===
+MANIFEST_NAME = "manifest.json"
+FILE_PREFIX = "Rollup_"
+FILE_SUFFIX = ".dat"
+GRAINS = {
+    # grain: (bucket length in "YYYY-MM-DD HH:MM:SS", period length of a file)
+    "hourly": (13, 7),  # YYYY-MM-DD HH, one file per YYYY-MM
+    "daily": (10, 4),   # YYYY-MM-DD, one file per YYYY
+}
+KEY_COLUMNS = ["machine_id", "bucket"]
+STATISTICS = {"n": "sum", "sum": "sum", "min": "min", "max": "max"}  # how each statistic combines
+READ_BYTES = 64 * 1024 * 1024  # new partition bytes parsed at once
+
+
+# === MEASURES ===
+# Cleaning duration in minutes, left empty when the end is missing or
+# before the start
+def cleaning_duration_minutes(frame):
+    start = pd.to_datetime(frame["timestamp_start"], format="%Y-%m-%d %H:%M:%S", errors="coerce")
+    end = pd.to_datetime(frame["timestamp_end"], format="%Y-%m-%d %H:%M:%S", errors="coerce")
+    minutes = (end - start).dt.total_seconds() / 60
+    return minutes.where(minutes >= 0)
+
+# Measures computed from other columns: the columns they need and how
+DERIVED_MEASURES = {
+    "cleaning_duration_minutes": (["timestamp_start", "timestamp_end"], cleaning_duration_minutes),
+}
+
+
+# === HELPERS ===
+def file_name(category, grain, period, seq):
+    return f"{FILE_PREFIX}{category}_{grain}_{period}_{seq:06d}{FILE_SUFFIX}"
+
+def bucket_columns(measures):
+    return KEY_COLUMNS + ["rows"] + [f"{measure}_{stat}" for measure in measures for stat in STATISTICS]
+
+def new_manifest(spec):
+    return {"category": spec.category, "measures": list(spec.rollup_measures), "seq": 0, "watermark": 0,
+            "folded": {}, "files": {}}
+
+# Remove the rollup files the manifest does not list: superseded versions
+# and the output of a fold that stopped before its manifest was saved
+def remove_unlisted(root, manifest):
+    if not os.path.isdir(root):
+        return
+    listed = set(manifest["files"].values())
+    for name in sorted(os.listdir(root)):
+        if name.startswith(FILE_PREFIX) and name not in listed:
+            os.remove(os.path.join(root, name))
+
+# Why the folded ranges are not a prefix of the committed partitions any
+# more, None when the rollups can be updated in place
+def stale_reason(manifest, partitions, seq):
+    if seq < manifest["watermark"]:
+        return f"the partition manifest is at seq {seq}, behind the folded seq {manifest['watermark']}"
+    sizes = {partition["partition"]: partition["bytes"] for partition in partitions}
+    for key, folded in sorted(manifest["folded"].items()):
+        if sizes.get(key, 0) < folded:
+            return f"partition {key} is smaller than its folded size"
+    return None
+
+# Committed lines of a partition file between two byte offsets
+def read_lines(path, start, end):
+    with open(path, "rb") as f:
+        f.seek(start)
+        data = f.read(end - start)
+    if start == 0:
+        data = data.split(b"\n", 1)[1] if b"\n" in data else b""
+    return data
+
+# Rows of the lines read from the partitions, with the columns the rollups need
+def parse_rows(data, columns, needed):
+    return pd.read_csv(io.BytesIO(data), sep=";", header=None, names=columns, usecols=needed,
+                       dtype=str, keep_default_na=False)
+
+# Combine the rows of the same bucket, for buckets read from several sources
+def combine(buckets, measures):
+    if buckets.empty:
+        return buckets
+    how = {"rows": "sum", **{f"{m}_{stat}": agg for m in measures for stat, agg in STATISTICS.items()}}
+    return buckets.groupby(KEY_COLUMNS, as_index=False, sort=True).agg(how)[bucket_columns(measures)]
+
+# Hourly buckets of raw rows
+def hourly_buckets(spec, rows):
+    measures = spec.rollup_measures
+    values = pd.DataFrame(index=rows.index)
+    for measure in measures:
+        if measure in DERIVED_MEASURES:
+            values[measure] = DERIVED_MEASURES[measure][1](rows)
+        else:
+            values[measure] = pd.to_numeric(rows[measure], errors="coerce")
+    keys = [rows["machine_id"].astype("int64").rename("machine_id"),
+            rows[spec.partition_column].str.slice(0, GRAINS["hourly"][0]).rename("bucket")]
+    grouped = values.groupby(keys, sort=True)
+    buckets = pd.DataFrame({"rows": grouped.size()})
+    for measure in measures:
+        column = grouped[measure]
+        buckets[f"{measure}_n"] = column.count()
+        buckets[f"{measure}_sum"] = column.sum()
+        buckets[f"{measure}_min"] = column.min()
+        buckets[f"{measure}_max"] = column.max()
+    return buckets.reset_index()
+
+def daily_buckets(hourly, measures):
+    daily = hourly.assign(bucket=hourly["bucket"].str.slice(0, GRAINS["daily"][0]))
+    return combine(daily, measures)
+
+def read_buckets(path):
+    return pd.read_csv(path, sep=";", dtype={"machine_id": "int64", "bucket": str})
+
+# Counts are written as integers, the other statistics as floats
+def write_buckets(buckets, path):
+    counts = [name for name in buckets.columns if name == "rows" or name.endswith("_n")]
+    buckets = buckets.astype({name: "int64" for name in counts})
+    write_atomic(path, buckets.to_csv(sep=";", index=False, lineterminator="\n"))
+
+
+# === MAIN PROCESS ===
+def update_rollups(spec, paths, rebuild=False):
+    """Fold the partition rows committed since the last fold into the rollups; returns the rows folded.
+
+    With rebuild, when the spec's measures changed or when the partitions
+    no longer extend the folded rows, every partition is folded again from
+    its first row.
+    """
+    root = paths.rollup_dir
+    manifest = load_json(os.path.join(root, MANIFEST_NAME), None) or new_manifest(spec)
+    remove_unlisted(root, manifest)
+    previous_files = dict(manifest["files"])
+    filename = os.path.basename(paths.output_file)
+    partitions, watermark = changed_partitions(paths.partition_dir, filename)
+    stale = stale_reason(manifest, partitions, watermark)
+    if stale:
+        print(f"Warning: {stale}, rebuilding the {spec.category} rollups")
+    if rebuild or stale or manifest["measures"] != list(spec.rollup_measures):
+        print(f"Rebuilding the {spec.category} rollups from all partitions")
+        seq = manifest["seq"]
+        manifest = new_manifest(spec)
+        manifest["seq"] = seq  # so that the rebuilt files never take the name of a listed one
+
+    changed = [partition for partition in partitions if partition["seq"] > manifest["watermark"]]
+    if watermark == manifest["watermark"] and previous_files == manifest["files"]:
+        return 0
+
+    needed = ["machine_id", spec.partition_column]
+    for measure in spec.rollup_measures:
+        needed += DERIVED_MEASURES[measure][0] if measure in DERIVED_MEASURES else [measure]
+    needed = list(dict.fromkeys(needed))
+
+    parts, pending, pending_bytes, folded_rows = [], [], 0, 0
+
+    def fold_pending():
+        nonlocal pending_bytes, folded_rows
+        if pending:
+            rows = parse_rows(b"".join(pending), spec.output_columns, needed)
+            parts.append(hourly_buckets(spec, rows))
+            folded_rows += len(rows)
+            pending.clear()
+            pending_bytes = 0
+
+    for partition in changed:
+        key = partition["partition"]
+        start = manifest["folded"].get(key, 0)
+        if partition["bytes"] == start:
+            continue
+        if key != UNKNOWN_PARTITION:  # rows without a timestamp have no bucket
+            pending.append(read_lines(partition["path"], start, partition["bytes"]))
+            pending_bytes += len(pending[-1])
+            if pending_bytes >= READ_BYTES:
+                fold_pending()
+        manifest["folded"][key] = partition["bytes"]
+    fold_pending()
+
+    measures = spec.rollup_measures
+    hourly = combine(pd.concat(parts, ignore_index=True), measures) if parts else pd.DataFrame(
+        columns=bucket_columns(measures))
+    manifest["seq"] += 1
+    for grain, buckets in (("hourly", hourly), ("daily", daily_buckets(hourly, measures))):
+        period_length = GRAINS[grain][1]
+        for period, new in buckets.groupby(buckets["bucket"].str.slice(0, period_length), sort=True):
+            key = f"{grain}/{period}"
+            if key in manifest["files"]:
+                new = combine(pd.concat([read_buckets(os.path.join(root, manifest["files"][key])), new],
+                                        ignore_index=True), measures)
+            name = file_name(spec.category, grain, period, manifest["seq"])
+            os.makedirs(root, exist_ok=True)
+            write_buckets(new, os.path.join(root, name))
+            manifest["files"][key] = name
+    manifest["watermark"] = watermark
+    save_manifest(root, manifest)
+    remove_unlisted(root, manifest)
+    return folded_rows
+
+
+def read_rollups(root, grain, start=None, end=None, machine_ids=None):
+    """Buckets of one grain ("hourly" or "daily") with a bucket in [start, end), as a DataFrame.
+
+    Only the files of the periods in the range are read. Each measure gets
+    an <measure>_avg column next to its count, sum, min and max. start and
+    end accept anything pd.Timestamp does.
+    """
+    bucket_length, period_length = GRAINS[grain]
+    manifest = load_json(os.path.join(root, MANIFEST_NAME), None)
+    if manifest is None:
+        return pd.DataFrame(columns=KEY_COLUMNS + ["rows"])
+    start = None if start is None else pd.Timestamp(start).strftime("%Y-%m-%d %H:%M:%S")[:bucket_length]
+    end = None if end is None else pd.Timestamp(end).strftime("%Y-%m-%d %H:%M:%S")[:bucket_length]
+
+    frames = []
+    for key, name in sorted(manifest["files"].items()):
+        file_grain, period = key.split("/")
+        if file_grain != grain or (start is not None and period < start[:period_length]) or (
+                end is not None and period > end[:period_length]):
+            continue
+        frames.append(read_buckets(os.path.join(root, name)))
+    if not frames:
+        return pd.DataFrame(columns=bucket_columns(manifest["measures"]))
+    buckets = pd.concat(frames, ignore_index=True)
+    keep = pd.Series(True, index=buckets.index)
+    if start is not None:
+        keep &= buckets["bucket"] >= start
+    if end is not None:
+        keep &= buckets["bucket"] < end
+    if machine_ids is not None:
+        keep &= buckets["machine_id"].isin([int(m) for m in machine_ids])
+    buckets = buckets[keep].reset_index(drop=True)
+    for measure in manifest["measures"]:
+        buckets[f"{measure}_avg"] = buckets[f"{measure}_sum"] / buckets[f"{measure}_n"].where(
+            buckets[f"{measure}_n"] > 0)
+    return buckets
+
+
+# Print the rollups of a category, or fold them again from all partitions
+def main(argv=None):
+    from SilverEngine import category_paths
+    from SilverRunner import SPEC_MODULES
+
+    parser = argparse.ArgumentParser(description="Show or rebuild the hourly / daily rollups of a silver category.")
+    parser.add_argument("category", help="Cleaning, Rinse or Product")
+    parser.add_argument("--grain", choices=list(GRAINS), default="daily", help="Bucket size (default: %(default)s)")
+    parser.add_argument("--from", dest="start", help="First bucket, e.g. 2024-01-01")
+    parser.add_argument("--to", dest="end", help="End of the range, excluded, e.g. 2025-01-01")
+    parser.add_argument("--machine", type=int, nargs="*", help="Machine ids (default: all)")
+    parser.add_argument("--rebuild", action="store_true", help="Fold all the partition rows again")
+    args = parser.parse_args(argv)
+
+    if args.category not in SPEC_MODULES:
+        parser.error(f"unknown category: {args.category}")
+    spec = importlib.import_module(SPEC_MODULES[args.category]).SPEC
+    if not spec.rollup_measures:
+        print(f"No rollups defined for {args.category}")
+        return 0
+    paths = category_paths(args.category)
+    if args.rebuild:
+        print(f"{update_rollups(spec, paths, rebuild=True)} row(s) folded into {paths.rollup_dir}")
+        return 0
+    buckets = read_rollups(paths.rollup_dir, args.grain, args.start, args.end, args.machine)
+    sys.stdout.write(buckets.to_csv(sep=";", index=False, lineterminator="\n"))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,86 @@
+import io
+import sys
+import time
+import argparse
+import importlib
+import traceback
+from contextlib import redirect_stdout
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+from SilverEngine import add_run_arguments, options_from_args, run_category
+from RunMetrics import RunMetrics
+
+# Single entry point for the silver step.
+#
+# The four categories share no state, so they are cleaned concurrently in a
+# process pool: the silver phase takes as long as the slowest category instead
+# of the sum of all four, and pandas is imported once per worker instead of
+# once per script. Each category's output is buffered and printed as one block,
+# and the metrics of all categories are written as one silver run report.
+
+# Category -> module declaring its SPEC
+SPEC_MODULES = {
+    "Cleaning": "SilverCleaningScript",
+    "Info": "SilverInfoScript",
+    "Rinse": "SilverRinseScript",
+    "Product": "SilverProductScript",
+}
+
+# Run one category in a worker, returns (category, exit status, seconds,
+# output, metrics as a dict)
+def run_worker(category, options):
+    started = time.perf_counter()
+    output = io.StringIO()
+    metrics = RunMetrics("silver", category)
+    with redirect_stdout(output):
+        try:
+            spec = importlib.import_module(SPEC_MODULES[category]).SPEC
+            status = run_category(spec, options, metrics)
+        except Exception:
+            traceback.print_exc(file=output)
+            status = 1
+    metrics.add_time("total", time.perf_counter() - started)
+    return category, status, time.perf_counter() - started, output.getvalue(), metrics.to_dict()
+
+def run_all(categories, options, jobs=None, metrics=None):
+    results = {}
+    worker = partial(run_worker, options=options)
+    with ProcessPoolExecutor(max_workers=jobs or len(categories)) as executor:
+        for category, status, seconds, output, category_metrics in executor.map(worker, categories):
+            print(f"=== {category} ===")
+            print(output, end="")
+            results[category] = (status, seconds)
+            if metrics is not None:
+                metrics.merge(category_metrics)
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the silver transformation for all categories.")
+    parser.add_argument("categories", nargs="*",
+                        help=f"Categories to process, among {', '.join(SPEC_MODULES)} (default: all)")
+    parser.add_argument("--jobs", type=int, default=None,
+                        help="Number of categories processed at once (default: all of them)")
+    add_run_arguments(parser)
+    args = parser.parse_args(argv)
+
+    unknown = [c for c in args.categories if c not in SPEC_MODULES]
+    if unknown:
+        parser.error(f"unknown categories: {', '.join(unknown)}")
+
+    categories = args.categories or list(SPEC_MODULES)
+    started = time.perf_counter()
+    options = options_from_args(args)
+    metrics = RunMetrics("silver")
+    results = run_all(categories, options, args.jobs, metrics)
+
+    print("=== Summary ===")
+    for category, (status, seconds) in results.items():
+        print(f"{category:<10} {'OK' if status == 0 else 'FAILED':<7} {seconds:7.2f}s")
+    print(f"Silver phase finished in {time.perf_counter() - started:.2f}s")
+
+    status = 1 if any(status for status, _ in results.values()) else 0
+    print(f"Run report written to {metrics.write_report(status, options.prometheus)}")
+    return status
+
+if __name__ == "__main__":
+    sys.exit(main())
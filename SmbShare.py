@@ -0,0 +1,188 @@
+import os
+import uuid
+import queue
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from smbprotocol.connection import Connection
+from smbprotocol.session import Session
+from smbprotocol.tree import TreeConnect
+from smbprotocol.open import Open, FilePipePrinterAccessMask
+from smbprotocol.file_info import FileInformationClass
+from smbprotocol.open import ImpersonationLevel, CreateDisposition, CreateOptions, ShareAccess, FileAttributes
+
+# Access to the Eversys share for DownloadEversysFiles.
+#
+# SmbShare is one independent SMB connection, session and tree connect. The
+# downloader keeps a small SharePool of them so that each download thread
+# reads over its own connection instead of all threads serializing on one.
+# LocalShare exposes the same methods over a local folder and stands in for
+# the server when testing the downloader without it:
+#     python DownloadEversysFiles.py --local-share <folder>
+
+FILE_ATTRIBUTE_DIRECTORY = 0x10
+
+
+# One .dat file of the share as listed by list_files
+@dataclass
+class RemoteEntry:
+    name: str
+    size: int
+    last_write_time: str  # ISO 8601, UTC
+
+class SmbShare:
+    def __init__(self, server, share, user, password, port=445):
+        self.server = server
+        self.share = share
+        self.user = user
+        self.password = password
+        self.port = port
+        self.conn = self.session = self.tree = None
+        self.max_read_size = None
+
+    def connect(self):
+        self.conn = Connection(uuid.uuid4(), self.server, self.port)
+        self.conn.connect(timeout=30)
+
+        self.session = Session(self.conn, self.user, self.password)
+        self.session.connect()
+
+        self.tree = TreeConnect(self.session, f"\\\\{self.server}\\{self.share}")
+        self.tree.connect()
+
+        # A single read request may not ask for more than the negotiated size
+        self.max_read_size = self.conn.max_read_size
+
+    def list_files(self):
+        """Retrieve the DAT files of the SMB share with their size and last write time.
+
+        Uses a single FILE_ID_BOTH_DIRECTORY_INFORMATION enumeration, so no
+        file has to be opened or queried on its own.
+        """
+        dir_open = Open(self.tree, "")
+        dir_open.create(
+            impersonation_level=ImpersonationLevel.Impersonation,
+            desired_access=FilePipePrinterAccessMask.GENERIC_READ,
+            file_attributes=FileAttributes.FILE_ATTRIBUTE_NORMAL,
+            share_access=ShareAccess.FILE_SHARE_READ,
+            create_disposition=CreateDisposition.FILE_OPEN,
+            create_options=CreateOptions.FILE_DIRECTORY_FILE
+        )
+
+        entries = []
+        while True:
+            try:
+                batch = dir_open.query_directory(
+                    pattern="*",
+                    file_information_class=FileInformationClass.FILE_ID_BOTH_DIRECTORY_INFORMATION
+                )
+                if not batch:
+                    break
+
+                for entry in batch:
+                    name = entry["file_name"].get_value().decode("utf-16-le")
+                    # Filter only .DAT files, "." and ".." are directories
+                    if entry["file_attributes"].get_value() & FILE_ATTRIBUTE_DIRECTORY or not name.endswith(".dat"):
+                        continue
+                    last_write = entry["last_write_time"].get_value()
+                    entries.append(RemoteEntry(
+                        name=name,
+                        size=entry["end_of_file"].get_value(),
+                        last_write_time=last_write.replace(tzinfo=timezone.utc).isoformat(),
+                    ))
+            except Exception as e:
+                if "STATUS_NO_MORE_FILES" in str(e):
+                    print("No more files to retrieve from the server.")
+                else:
+                    print(f"Error retrieving batch: {e}")
+                break
+
+        dir_open.close()
+        return entries
+
+    def open_file(self, filename):
+        file_open = Open(self.tree, filename)
+        file_open.create(
+            impersonation_level=ImpersonationLevel.Impersonation,
+            desired_access=FilePipePrinterAccessMask.GENERIC_READ,
+            file_attributes=FileAttributes.FILE_ATTRIBUTE_NORMAL,
+            share_access=ShareAccess.FILE_SHARE_READ,
+            create_disposition=CreateDisposition.FILE_OPEN,
+            create_options=CreateOptions.FILE_NON_DIRECTORY_FILE
+        )
+        return file_open
+
+    def disconnect(self):
+        if self.session:
+            self.session.disconnect()
+        if self.conn:
+            self.conn.disconnect()
+
+
+# Local file with the read interface of an smbprotocol Open
+class LocalFile:
+    def __init__(self, path, max_read_size):
+        self.f = open(path, "rb")
+        self.end_of_file = os.fstat(self.f.fileno()).st_size
+        self.max_read_size = max_read_size
+
+    def read(self, offset, length):
+        if length > self.max_read_size:
+            raise ValueError(f"Read of {length} bytes exceeds the max read size of {self.max_read_size}")
+        self.f.seek(offset)
+        return self.f.read(length)
+
+    def close(self):
+        self.f.close()
+
+
+# In-process fake of the Eversys share backed by a local folder
+class LocalShare:
+    def __init__(self, folder, max_read_size=64 * 1024):
+        self.folder = folder
+        self.max_read_size = max_read_size
+
+    def connect(self):
+        if not os.path.isdir(self.folder):
+            raise FileNotFoundError(f"Local share folder not found: {self.folder}")
+
+    def list_files(self):
+        entries = []
+        with os.scandir(self.folder) as it:
+            for item in it:
+                if item.is_file() and item.name.endswith(".dat"):
+                    stat = item.stat()
+                    last_write = datetime.fromtimestamp(stat.st_mtime, timezone.utc)
+                    entries.append(RemoteEntry(item.name, stat.st_size, last_write.isoformat()))
+        return sorted(entries, key=lambda entry: entry.name)
+
+    def open_file(self, filename):
+        return LocalFile(os.path.join(self.folder, filename), self.max_read_size)
+
+    def disconnect(self):
+        pass
+
+
+class SharePool:
+    """Fixed set of connected shares lent to one download thread at a time."""
+
+    def __init__(self, shares):
+        self.shares = shares
+        self.available = queue.Queue()
+        for share in shares:
+            self.available.put(share)
+
+    def __len__(self):
+        return len(self.shares)
+
+    @contextmanager
+    def borrow(self):
+        share = self.available.get()
+        try:
+            yield share
+        finally:
+            self.available.put(share)
+
+    def close(self):
+        for share in self.shares:
+            share.disconnect()
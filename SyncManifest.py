@@ -0,0 +1,73 @@
+import os
+import json
+import hashlib
+import threading
+
+# Persistent record of what DownloadEversysFiles has fetched from the share.
+#
+# For every file the manifest keeps the remote size and last write time seen
+# in the directory listing, the MD5 of the local copy, and whether the
+# download completed. A file is fetched again only when its remote size or
+# last write time changed, and an interrupted download (<name>.part) is
+# resumed from its current size as long as the remote file is unchanged.
+
+CHECKSUM_BLOCK = 1024 * 1024
+
+
+def file_md5(path, hasher=None):
+    hasher = hasher or hashlib.md5()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(CHECKSUM_BLOCK), b""):
+            hasher.update(block)
+    return hasher
+
+
+class SyncManifest:
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        try:
+            with open(path, "r") as f:
+                self.files = json.load(f).get("files", {})
+        except (OSError, ValueError):
+            self.files = {}
+
+    def get(self, name):
+        with self.lock:
+            return self.files.get(name)
+
+    def matches(self, name, entry):
+        """True when the manifest saw entry's file with the same size and last write time."""
+        record = self.get(name)
+        return (
+            record is not None
+            and record["size"] == entry.size
+            and record["last_write_time"] == entry.last_write_time
+        )
+
+    def mark_partial(self, entry):
+        with self.lock:
+            self.files[entry.name] = {
+                "size": entry.size,
+                "last_write_time": entry.last_write_time,
+                "md5": None,
+                "complete": False,
+            }
+
+    def mark_complete(self, entry, md5):
+        with self.lock:
+            self.files[entry.name] = {
+                "size": entry.size,
+                "last_write_time": entry.last_write_time,
+                "md5": md5,
+                "complete": True,
+            }
+
+    def save(self):
+        temp_path = self.path + ".tmp"
+        with self.lock:
+            with open(temp_path, "w") as f:
+                json.dump({"files": self.files}, f, indent=1, sort_keys=True)
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(temp_path, self.path)
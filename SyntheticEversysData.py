@@ -0,0 +1,131 @@
+import os
+import sys
+import argparse
+import importlib
+
+import numpy as np
+import pandas as pd
+
+from SilverRunner import SPEC_MODULES
+
+# Synthetic Eversys exports for benchmarks and local runs.
+#
+# Writes <machine>-<Type>_History.dat files with the header and column set the
+# silver specs declare for each category, with values in the ranges the
+# machines produce: ids, ISO and MM/DD/YYYY timestamps, integers within the
+# column's bounds, floats with a few decimals, quoted "X;Y" pairs for
+# Cleaning. A share of the cells (malformed_rate) is replaced by values the
+# silver step rejects or repairs (text in numbers, impossible dates, out of
+# range values, stray quotes), and a tenth of that share of the rows is cut
+# short. Output is deterministic for a given seed.
+
+FILE_TYPES = {
+    "Cleaning": "Cleaning_History",
+    "Rinse": "Rinse_History",
+    "Info": "Info_Message_History",
+    "Product": "Product_History",
+}
+MACHINES = 50
+US_DATE_SHARE = 0.4
+CHUNK_ROWS = 100_000
+INFO_TEXTS = ["Descaling required", "Milk system rinse", "Grounds container full", "Water tank empty", "Warning", "Error"]
+MALFORMED = {
+    "int": ["", "abc", "3.7", "True", "1e3", "inf", '"5"', "99999999999999999999"],
+    "float": ["", "abc", "nan", "inf", "1_0", "'2.5'", "-0"],
+    "datetime": ["", "bad", "2024-02-30 10:00:00", "2024-1-5 3:4:5", "13/45/2024 00:00:00", "2024-01-05T10:00:00"],
+    "string": ['"quoted"', "it's", "  padded  "],
+    "pair": ["", "5", "1;2;3", "x;y", "1.5;2"],
+}
+
+
+def load_spec(category):
+    return importlib.import_module(SPEC_MODULES[category]).SPEC
+
+
+# One column of rows values as text
+def column_values(rng, column, rows, quoted):
+    if column.name == "machine_id":
+        return rng.integers(1, MACHINES + 1, rows).astype(str)
+    if column.kind == "datetime":
+        stamps = pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, 366 * 86400, rows), unit="s")
+        iso = np.asarray(stamps.strftime("%Y-%m-%d %H:%M:%S"), dtype=object)
+        us = np.asarray(stamps.strftime("%m/%d/%Y %H:%M:%S"), dtype=object)
+        return np.where(rng.random(rows) < US_DATE_SHARE, us, iso)
+    if column.kind == "int":
+        low = column.min_value if column.min_value is not None else 0
+        high = column.max_value if column.max_value is not None else 300
+        return rng.integers(int(low), int(high) + 1, rows).astype(str)
+    if column.kind == "float":
+        return np.char.mod("%.3f", rng.uniform(0, 10, rows)).astype(object)
+    if column.kind == "pair":
+        first = rng.integers(0, 100, rows).astype(str).astype(object)
+        second = rng.integers(0, 2000, rows).astype(str).astype(object)
+        pairs = first + ";" + second
+        return '"' + pairs + '"' if quoted else pairs
+    if column.name == "typography":
+        return np.asarray(INFO_TEXTS, dtype=object)[rng.integers(0, len(INFO_TEXTS), rows)]
+    return rng.integers(1, 1000, rows).astype(str)
+
+
+def generate_chunk(rng, spec, rows, malformed_rate):
+    columns = []
+    for column in spec.columns:
+        values = column_values(rng, column, rows, spec.quoted_fields).astype(object)
+        broken = rng.random(rows) < malformed_rate
+        if broken.any():
+            choices = np.asarray(MALFORMED[column.kind], dtype=object)
+            values[broken] = choices[rng.integers(0, len(choices), int(broken.sum()))]
+        columns.append(values)
+
+    lines = [";".join(fields) for fields in zip(*columns)]
+    short = np.flatnonzero(rng.random(rows) < malformed_rate / 10)
+    for i in short:
+        lines[i] = ";".join(lines[i].split(";")[:len(spec.columns) // 2])
+    return lines
+
+
+def write_category(folder, category, rows, files=1, malformed_rate=0.01, seed=0):
+    """Write rows synthetic lines of a category over files files; returns their paths."""
+    spec = load_spec(category)
+    rng = np.random.default_rng([seed, list(FILE_TYPES).index(category)])
+    header = ";".join(column.name for column in spec.columns)
+    paths = []
+    per_file = -(-rows // files)
+    for number in range(files):
+        path = os.path.join(folder, f"{number + 1:05d}-{FILE_TYPES[category]}.dat")
+        remaining = min(per_file, rows - number * per_file)
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            f.write(header + "\n")
+            while remaining > 0:
+                chunk = min(CHUNK_ROWS, remaining)
+                f.write("\n".join(generate_chunk(rng, spec, chunk, malformed_rate)) + "\n")
+                remaining -= chunk
+        paths.append(path)
+    return paths
+
+
+def write_dataset(folder, rows, files=1, malformed_rate=0.01, seed=0, categories=None):
+    """Write rows lines for each category into folder; returns {category: paths}."""
+    os.makedirs(folder, exist_ok=True)
+    return {
+        category: write_category(folder, category, rows, files, malformed_rate, seed)
+        for category in (categories or FILE_TYPES)
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write synthetic Eversys DAT files.")
+    parser.add_argument("folder", help="Output folder, e.g. ../EversysDatFiles")
+    parser.add_argument("--rows", type=int, default=10_000, help="Rows per category (default: %(default)s)")
+    parser.add_argument("--files", type=int, default=1, help="Files per category (default: %(default)s)")
+    parser.add_argument("--malformed-rate", type=float, default=0.01, help="Share of malformed cells (default: %(default)s)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    written = write_dataset(args.folder, args.rows, args.files, args.malformed_rate, args.seed)
+    for category, paths in written.items():
+        print(f"{category}: {len(paths)} file(s), {sum(os.path.getsize(p) for p in paths)} bytes")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,127 @@
+from datetime import datetime
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+# Shared timestamp parsing for the silver step.
+#
+# The Eversys exports write timestamps as "YYYY-MM-DD HH:MM:SS" or
+# "MM/DD/YYYY HH:MM:SS", mostly one of them per file. to_canonical() checks a
+# sample of a chunk to try its dominant format first. Values in the
+# zero-padded layout of a format are validated on their digits with numpy
+# (month lengths and leap years included) and turned into the canonical
+# "YYYY-MM-DD HH:MM:SS" text by reordering their bytes, without building a
+# datetime for each of them. The few other values (e.g. not zero-padded) go
+# through pd.to_datetime with an explicit format and strftime. Values no
+# format accepts are left to parse_timestamp(), the cached row-by-row
+# fallback.
+
+INPUT_FORMATS = ("%Y-%m-%d %H:%M:%S", "%m/%d/%Y %H:%M:%S")
+OUTPUT_FORMAT = "%Y-%m-%d %H:%M:%S"
+SAMPLE_SIZE = 512
+CACHE_SIZE = 65536
+
+WIDTH = 19  # len("YYYY-MM-DD HH:MM:SS")
+DAYS_IN_MONTH = np.array([31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31])
+
+
+# Zero-padded layout of each input format (ASCII digits, years from 1000,
+# which strftime does not pad), the positions of its year, month and day, and
+# the byte order that turns it into OUTPUT_FORMAT (None when it already is)
+PADDED_LAYOUTS = {
+    "%Y-%m-%d %H:%M:%S": (
+        r"[1-9][0-9]{3}-[0-9]{2}-[0-9]{2} [0-9]{2}:[0-9]{2}:[0-9]{2}",
+        {"year": 0, "month": 5, "day": 8},
+        None,
+    ),
+    "%m/%d/%Y %H:%M:%S": (
+        r"[0-9]{2}/[0-9]{2}/[1-9][0-9]{3} [0-9]{2}:[0-9]{2}:[0-9]{2}",
+        {"year": 6, "month": 0, "day": 3},
+        [6, 7, 8, 9, 2, 0, 1, 5, 3, 4, *range(10, WIDTH)],
+    ),
+}
+
+
+def detect_formats(text):
+    """Return INPUT_FORMATS ordered by how many values of a sample match them."""
+    sample = text.iloc[::max(1, len(text) // SAMPLE_SIZE)].head(SAMPLE_SIZE)
+    hits = {fmt: int(sample.str.fullmatch(PADDED_LAYOUTS[fmt][0]).sum()) for fmt in INPUT_FORMATS}
+    return sorted(INPUT_FORMATS, key=lambda fmt: -hits[fmt])
+
+
+def number(digits, start, width):
+    value = digits[:, start].astype(np.int32)
+    for position in range(start + 1, start + width):
+        value = value * 10 + digits[:, position]
+    return value
+
+
+def valid_dates(digits, positions):
+    """True for the rows of fixed-width digits that are real dates and times."""
+    year = number(digits, positions["year"], 4)
+    month = number(digits, positions["month"], 2)
+    day = number(digits, positions["day"], 2)
+    leap = (year % 4 == 0) & ((year % 100 != 0) | (year % 400 == 0))
+    month_days = DAYS_IN_MONTH[np.clip(month, 1, 12) - 1] + (leap & (month == 2))
+    return (
+        (month >= 1) & (month <= 12) & (day >= 1) & (day <= month_days)
+        & (number(digits, 11, 2) < 24) & (number(digits, 14, 2) < 60) & (number(digits, 17, 2) < 60)
+    )
+
+
+def parse_padded(values, fmt):
+    """Validate zero-padded values of fmt; returns (valid mask, canonical text of the valid ones)."""
+    _, positions, order = PADDED_LAYOUTS[fmt]
+    raw = np.frombuffer("".join(values).encode("ascii"), dtype=np.uint8).reshape(-1, WIDTH)
+    digits = raw - np.uint8(ord("0"))
+    valid = valid_dates(digits, positions)
+    if order is None:
+        return valid, np.asarray(values, dtype=object)[valid]
+    canonical = raw[valid][:, order].copy()
+    canonical[:, [4, 7]] = ord("-")
+    return valid, canonical.view(f"S{WIDTH}").ravel().astype(f"U{WIDTH}").astype(object)
+
+
+def to_canonical(series):
+    """Convert a column of timestamps to OUTPUT_FORMAT text.
+
+    Values no input format accepts as they are (including empty ones) are
+    None in the result.
+    """
+    text = series.astype(pd.StringDtype()).str.strip()
+    result = np.full(len(series), None, dtype=object)
+    pending = (text.notna() & text.ne("")).to_numpy(dtype=bool, na_value=False)
+
+    for fmt in detect_formats(text[pending]):
+        if not pending.any():
+            break
+        positions = np.flatnonzero(pending)
+        candidates = text.iloc[positions]
+        padded = candidates.str.fullmatch(PADDED_LAYOUTS[fmt][0]).to_numpy(dtype=bool, na_value=False)
+
+        if padded.any():
+            rows = positions[padded]
+            valid, canonical = parse_padded(candidates[padded].tolist(), fmt)
+            result[rows[valid]] = canonical
+            pending[rows[valid]] = False
+
+        if (~padded).any():
+            rows = positions[~padded]
+            parsed = pd.to_datetime(candidates[~padded].astype(object), format=fmt, errors="coerce")
+            valid = parsed.notna().to_numpy()
+            if valid.any():
+                result[rows[valid]] = parsed[valid].dt.strftime(OUTPUT_FORMAT).to_numpy(dtype=object)
+                pending[rows[valid]] = False
+    return pd.Series(result, index=series.index, dtype=object)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def parse_timestamp(val):
+    """Row-by-row fallback for a cleaned value, None when no format accepts it."""
+    for fmt in INPUT_FORMATS:
+        try:
+            return datetime.strptime(val, fmt).strftime(OUTPUT_FORMAT)
+        except ValueError:
+            continue
+    return None
@@ -0,0 +1,51 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import SilverEngine
+from SilverEngine import RunOptions, category_paths
+from SyntheticEversysData import generate_chunk, load_spec
+
+# Shared fixtures: a silver tree under a temporary BASE_DIR and synthetic
+# bronze lines, as SyntheticEversysData writes them, appended to
+# BronzeRawData/<Category>/current/<Category>.dat.
+
+MALFORMED_RATE = 0.02  # enough rejected lines to exercise the quarantine
+CHUNK_BYTES = 8 * 1024  # small chunks, so that a run commits several times
+
+
+class Crash(Exception):
+    """Raised in place of a call to stop a run at that point."""
+
+
+def use_base_dir(monkeypatch, path):
+    monkeypatch.setattr(SilverEngine, "BASE_DIR", str(path))
+    monkeypatch.setattr(SilverEngine, "MEMORY_PER_BRONZE_BYTE", 1024 * 1024 // CHUNK_BYTES)
+    return path
+
+
+@pytest.fixture
+def base_dir(tmp_path, monkeypatch):
+    return use_base_dir(monkeypatch, tmp_path)
+
+
+# Append rows synthetic lines to the bronze file of a category, with the
+# header when the file is new
+def append_bronze(category, rows, seed):
+    spec = load_spec(category)
+    path = category_paths(category).input_file
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    lines = generate_chunk(np.random.default_rng(seed), spec, rows, MALFORMED_RATE)
+    with open(path, "a", encoding="utf-8", newline="") as f:
+        if f.tell() == 0:
+            f.write(";".join(column.name for column in spec.columns) + "\n")
+        f.write("\n".join(lines) + "\n")
+    return path
+
+
+def run_options(**overrides):
+    return RunOptions(**{"workers": 1, "memory_limit_mb": 1, **overrides})
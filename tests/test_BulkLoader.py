@@ -0,0 +1,128 @@
+from collections import Counter
+from datetime import datetime, timedelta
+
+import pytest
+
+import BulkLoader
+from BulkLoader import (STATE_TABLE, converter, create_tables, insert_sql, key_ranges, load_category, new_rows,
+                        sqlite_connection, typed_rows)
+from RunMetrics import RunMetrics
+from SilverBulk import BulkExport, bulk_columns, load_manifest
+from SilverInfoScript import SPEC
+
+TABLE = "info_logs"
+NAMES = [name for name, _ in bulk_columns(SPEC)]
+CONVERTERS = [converter(sql_type) for _, sql_type in bulk_columns(SPEC)]
+START = datetime(2024, 1, 1)
+
+
+def line(machine_id, hours, number):
+    timestamp = "" if hours is None else (START + timedelta(hours=hours)).isoformat(" ")
+    return f"{machine_id};{timestamp};{number};Error;0"
+
+
+# Rows of 5 machines over 20 days, every 6 hours, and two without a timestamp
+LINES = [line(machine_id, hours, hours) for machine_id in range(1, 6) for hours in range(0, 480, 6)]
+LINES += [line(1, None, 1), line(2, None, 2)]
+
+
+def exported(root, lines, batch_rows=50):
+    bulk = BulkExport(str(root), SPEC, batch_rows=batch_rows)
+    bulk.append(lines)
+    bulk.commit()
+    bulk.close()
+    return str(root)
+
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = sqlite_connection(":memory:")
+    create_tables(conn, load_manifest(exported(tmp_path / "bulk", LINES)))
+    yield conn
+    conn.close()
+
+
+def table_rows(conn):
+    return Counter(conn.execute(f"SELECT {', '.join(NAMES)} FROM {TABLE}").fetchall())
+
+
+def forget_loads(conn):
+    conn.execute(f"DELETE FROM {STATE_TABLE}")
+    conn.commit()
+
+
+# Wraps a sqlite3 connection with the pyodbc rule that executemany() needs rows
+class StrictConnection:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def cursor(self):
+        return StrictCursor(self.conn.cursor())
+
+    def __getattr__(self, name):
+        return getattr(self.conn, name)
+
+
+class StrictCursor:
+    def __init__(self, cursor):
+        self.cursor = cursor
+
+    def executemany(self, sql, rows):
+        rows = list(rows)
+        if not rows:
+            raise ValueError("executemany() called without rows")
+        return self.cursor.executemany(sql, rows)
+
+    def __getattr__(self, name):
+        return getattr(self.cursor, name)
+
+
+def test_key_ranges_split_a_machine_at_gaps():
+    keys = [(1, START), (1, START + timedelta(hours=20)), (1, START + timedelta(days=3)),
+            (2, START), (None, START), (3, None)]
+    assert key_ranges(keys) == [
+        (1, START, START + timedelta(hours=20)),
+        (1, START + timedelta(days=3), START + timedelta(days=3)),
+        (2, START, START),
+    ]
+
+
+def test_reload_skips_the_rows_already_in_the_table(tmp_path, conn):
+    bulk_dir = str(tmp_path / "bulk")
+    assert load_category(conn, bulk_dir, consumer="test") == len(LINES)
+    loaded = table_rows(conn)
+
+    # Lost state and acknowledgement, and every other row deleted since,
+    # among them the last row without a timestamp
+    conn.execute(f"DELETE FROM {TABLE} WHERE log_id % 2 = 0")
+    forget_loads(conn)
+    metrics = RunMetrics("bulk_load", "Info")
+    inserted = load_category(conn, bulk_dir, consumer="again", metrics=metrics)
+
+    # Keys with a NULL never match, as in SQL: both rows without a
+    # timestamp are inserted again, one of them a second time
+    assert inserted == len(LINES) // 2 + 1
+    assert metrics.counters[("rows_skipped", "Info", None)] == len(LINES) - inserted
+    null_key = next(row for row in loaded if row[0] == 1 and row[1] is None)
+    assert table_rows(conn) == loaded + Counter([null_key])
+
+
+def test_fully_skipped_batches_insert_nothing(tmp_path, conn):
+    bulk_dir = str(tmp_path / "bulk")
+    load_category(conn, bulk_dir, consumer="test")
+    forget_loads(conn)
+
+    assert load_category(StrictConnection(conn), bulk_dir, consumer="again") == 2  # the rows without a timestamp
+    assert sum(table_rows(conn).values()) == len(LINES) + 2
+    batches = len(load_manifest(bulk_dir)["files"][0]["batches"])
+    assert conn.execute(f"SELECT COUNT(*) FROM {STATE_TABLE}").fetchone()[0] == batches
+
+
+def test_new_rows_reads_back_in_several_queries(conn, monkeypatch):
+    monkeypatch.setattr(BulkLoader, "KEY_RANGES_PER_QUERY", 2)
+    keyed = [line(machine_id, hours, hours) for machine_id in range(1, 4) for hours in (0, 100, 200)]
+    cursor = conn.cursor()
+    cursor.executemany(insert_sql(TABLE, NAMES), typed_rows(keyed[::2], CONVERTERS))
+    rows = typed_rows(keyed + [line(9, 50, 50)], CONVERTERS)
+
+    assert new_rows(cursor, TABLE, NAMES, rows) == rows[1:-1:2] + [rows[-1]]
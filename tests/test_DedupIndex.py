@@ -0,0 +1,104 @@
+import hashlib
+
+from DedupIndex import DedupIndex, open_index
+
+
+def digests(start, stop):
+    return [hashlib.md5(str(i).encode()).digest() for i in range(start, stop)]
+
+
+def test_filter_new_skips_indexed_and_repeated_digests(tmp_path):
+    index = open_index(str(tmp_path / "index.db"))
+    index.add_many(digests(0, 10))
+    batch = digests(5, 15) + digests(12, 13)
+    assert index.filter_new(batch) == [False] * 5 + [True] * 5 + [False]
+    index.close()
+
+
+def test_journal_is_committed_with_the_digests(tmp_path):
+    path = str(tmp_path / "index.db")
+    index = open_index(path)
+    journal = {"current": 120, "partitions": {"seq": 3, "partitions": {}}, "parquet": ["month=2024-01/part-a.parquet"]}
+    index.add_many(digests(0, 10), journal=journal)
+    index.conn.close()  # stopped without close()
+
+    index = open_index(path)
+    assert index.journal() == journal
+    assert index.contains_many(digests(0, 10)) == [True] * 10
+
+    index.add_many(digests(10, 20))
+    assert index.journal() is None
+    index.close()
+
+
+def test_uncommitted_digests_are_rolled_back(tmp_path):
+    path = str(tmp_path / "index.db")
+    index = open_index(path)
+    index.add_many(digests(0, 10), journal={"current": 10})
+    index.add_many(digests(10, 20), commit=False)
+    index.conn.close()
+
+    index = open_index(path)
+    assert index.count == 10
+    assert index.journal() == {"current": 10}
+    assert index.contains_many(digests(0, 20)) == [True] * 10 + [False] * 10
+    index.close()
+
+
+def test_bloom_filter_is_rebuilt_after_an_unclean_stop(tmp_path):
+    path = str(tmp_path / "index.db")
+    index = open_index(path)
+    index.add_many(digests(0, 100))
+    index.close()
+
+    index = open_index(path)
+    index.add_many(digests(100, 200))
+    index.conn.close()  # the saved bits only know the first 100 digests
+
+    index = DedupIndex(path)
+    assert index.count == 200
+    assert all(index.bloom.might_contain(digests(0, 200)))
+    assert index.contains_many(digests(0, 200)) == [True] * 200
+    index.close()
+
+
+def test_saved_bloom_filter_is_reused(tmp_path):
+    path = str(tmp_path / "index.db")
+    index = open_index(path)
+    index.add_many(digests(0, 100))
+    index.close()
+
+    index = DedupIndex(path)
+    assert index.count == 100
+    assert index.contains_many(digests(0, 110)) == [True] * 100 + [False] * 10
+    index.close()
+
+
+def test_remove_many_forgets_digests(tmp_path):
+    index = open_index(str(tmp_path / "index.db"))
+    index.add_many(digests(0, 10))
+    index.remove_many(digests(0, 5))
+    assert index.count == 5
+    assert index.filter_new(digests(0, 10)) == [True] * 5 + [False] * 5
+    index.close()
+
+
+def test_text_tracker_is_migrated_once(tmp_path):
+    tracker = tmp_path / "cleaned_lines.txt"
+    tracker.write_text("\n".join(d.hex() for d in digests(0, 10)) + "\nnot a digest\n")
+    index = open_index(str(tmp_path / "index.db"), legacy_tracker=str(tracker))
+    assert index.count == 10
+    assert not tracker.exists()
+    assert (tmp_path / "cleaned_lines.txt.migrated").exists()
+    index.close()
+
+
+def test_close_keeps_the_journal_for_the_next_run(tmp_path):
+    path = str(tmp_path / "index.db")
+    index = open_index(path)
+    index.add_many(digests(0, 10), journal={"current": 10})
+    index.close()
+
+    index = open_index(path)
+    assert index.journal() == {"current": 10}
+    index.close()
@@ -0,0 +1,171 @@
+import json
+import os
+
+from SilverBulk import (BulkExport, acknowledge, compact, data_name, load_manifest, pending_files, read_batch,
+                        verify_file)
+from SilverInfoScript import SPEC
+
+BATCH_ROWS = 4
+
+
+# The state as the dedup index stores it in its journal
+def journalled(state):
+    return json.loads(json.dumps(state))
+
+
+def rows_of(start, count):
+    return [f"{i};2024-01-01 10:00:{i % 60:02d};{i};Error;0" for i in range(start, start + count)]
+
+
+def export(root):
+    return BulkExport(str(root), SPEC, batch_rows=BATCH_ROWS)
+
+
+def committed_run(root, *chunks):
+    bulk = export(root)
+    bulk.recover()
+    for chunk in chunks:
+        assert bulk.append(chunk)
+        bulk.commit()
+    bulk.close()
+    return bulk
+
+
+def file_rows(root, entry):
+    return [row for batch in entry["batches"] for row in read_batch(str(root), entry, batch)]
+
+
+def test_runs_write_sealed_files_in_batches(tmp_path):
+    committed_run(tmp_path, rows_of(0, 3), rows_of(3, 3))
+    committed_run(tmp_path, rows_of(6, 2))
+
+    entries = pending_files(str(tmp_path), "test")
+    assert [entry["file"] for entry in entries] == [data_name("Info", 1), data_name("Info", 2)]
+    assert all(verify_file(str(tmp_path), entry) for entry in entries)
+    assert [(batch["first_row"], batch["last_row"]) for batch in entries[0]["batches"]] == [(1, 4), (5, 6)]
+    assert file_rows(tmp_path, entries[0]) + file_rows(tmp_path, entries[1]) == rows_of(0, 8)
+
+
+def test_recover_cuts_uncommitted_rows_and_seals_the_file(tmp_path):
+    bulk = export(tmp_path)
+    bulk.append(rows_of(0, 3))
+    bulk.commit()
+    bulk.append(rows_of(3, 3))  # stopped before commit() and close()
+
+    bulk = export(tmp_path)
+    bulk.recover()
+    entry = load_manifest(str(tmp_path))["files"][0]
+    assert os.path.getsize(bulk.path_of(entry["file"])) == entry["bytes"]
+    assert verify_file(str(tmp_path), entry)
+    assert file_rows(tmp_path, entry) == rows_of(0, 3)
+
+
+def test_recover_removes_a_file_missing_from_the_manifest(tmp_path):
+    committed_run(tmp_path, rows_of(0, 3))
+    bulk = export(tmp_path)
+    bulk.append(rows_of(3, 3))  # a new file, never committed
+
+    bulk = export(tmp_path)
+    bulk.recover()
+    assert not os.path.exists(bulk.path_of(data_name("Info", 2)))
+    assert [entry["seq"] for entry in load_manifest(str(tmp_path))["files"]] == [1]
+
+    committed_run(tmp_path, rows_of(3, 3))
+    assert [entry["file"] for entry in pending_files(str(tmp_path), "test")] == [
+        data_name("Info", 1), data_name("Info", 2)]
+
+
+def test_roll_forward_adds_the_entry_of_a_new_file(tmp_path):
+    committed_run(tmp_path, rows_of(0, 3))
+    bulk = export(tmp_path)
+    bulk.append(rows_of(3, 3))
+    state = journalled(bulk.commit_state())  # journalled by the dedup index, manifest not saved
+    bulk.append(rows_of(6, 3))
+
+    bulk = export(tmp_path)
+    bulk.roll_forward(state)
+    bulk.recover()
+    entries = pending_files(str(tmp_path), "test")
+    assert [entry["seq"] for entry in entries] == [1, 2]
+    assert file_rows(tmp_path, entries[1]) == rows_of(3, 3)
+    assert verify_file(str(tmp_path), entries[1])
+
+
+def test_roll_forward_extends_an_entry_with_fewer_rows(tmp_path):
+    bulk = export(tmp_path)
+    bulk.append(rows_of(0, 3))
+    bulk.commit()
+    bulk.append(rows_of(3, 3))
+    state = journalled(bulk.commit_state())
+
+    bulk = export(tmp_path)
+    bulk.roll_forward(state)
+    bulk.roll_forward(state)  # a second pass changes nothing
+    bulk.recover()
+    entry = load_manifest(str(tmp_path))["files"][0]
+    assert entry["rows"] == 6
+    assert file_rows(tmp_path, entry) == rows_of(0, 6)
+
+
+def test_abort_seals_the_file_at_the_committed_rows(tmp_path):
+    bulk = export(tmp_path)
+    bulk.append(rows_of(0, 3))
+    bulk.commit()
+    bulk.append(rows_of(3, 3))
+    bulk.abort()
+
+    entry = load_manifest(str(tmp_path))["files"][0]
+    assert entry["rows"] == 3
+    assert verify_file(str(tmp_path), entry)
+    assert [e["seq"] for e in pending_files(str(tmp_path), "test")] == [1]
+
+
+def test_abort_keeps_the_rows_committed_in_the_journal(tmp_path):
+    bulk = export(tmp_path)
+    bulk.append(rows_of(0, 3))
+    bulk.commit()
+    bulk.append(rows_of(3, 3))
+    state = journalled(bulk.commit_state())  # failed after the index commit, before commit()
+    bulk.append(rows_of(6, 3))
+    bulk.abort(state)
+
+    entry = load_manifest(str(tmp_path))["files"][0]
+    assert file_rows(tmp_path, entry) == rows_of(0, 6)
+    assert verify_file(str(tmp_path), entry)
+
+
+def test_abort_without_a_commit_drops_the_file(tmp_path):
+    committed_run(tmp_path, rows_of(0, 3))
+    bulk = export(tmp_path)
+    bulk.append(rows_of(3, 3))
+    bulk.abort()
+
+    assert not os.path.exists(bulk.path_of(data_name("Info", 2)))
+    manifest = load_manifest(str(tmp_path))
+    assert manifest["seq"] == 1
+    assert [entry["seq"] for entry in manifest["files"]] == [1]
+
+
+def test_abort_of_a_first_run_leaves_no_file(tmp_path):
+    bulk = export(tmp_path)
+    bulk.append(rows_of(0, 3))
+    bulk.abort()
+
+    assert load_manifest(str(tmp_path)) is None
+    assert not os.path.exists(bulk.path_of(data_name("Info", 1)))
+    committed_run(tmp_path, rows_of(0, 3))
+    assert [entry["seq"] for entry in pending_files(str(tmp_path), "test")] == [1]
+
+
+def test_compact_folds_the_acknowledged_files(tmp_path):
+    committed_run(tmp_path, rows_of(0, 3))
+    committed_run(tmp_path, rows_of(3, 3))
+    committed_run(tmp_path, rows_of(6, 3))
+    acknowledge(str(tmp_path), "test", 2)
+
+    assert compact(str(tmp_path)) == 2
+    entries = load_manifest(str(tmp_path))["files"]
+    assert [(entry["seq"], entry["rows"]) for entry in entries] == [(2, 6), (3, 3)]
+    assert file_rows(tmp_path, entries[0]) == rows_of(0, 6)
+    assert verify_file(str(tmp_path), entries[0])
+    assert [entry["seq"] for entry in pending_files(str(tmp_path), "test")] == [3]
@@ -0,0 +1,150 @@
+import os
+
+import pytest
+
+import SilverEngine
+import SilverParquet
+from DedupIndex import DedupIndex
+from SilverBulk import BulkExport, load_manifest as load_bulk_manifest, read_batch, verify_file
+from SilverEngine import category_paths, run_category
+from SilverInfoScript import SPEC
+from SilverOutput import load_checkpoint
+from SilverPartitions import PartitionStore, load_manifest as load_partition_manifest
+
+from conftest import Crash, append_bronze, run_options, use_base_dir
+
+# Runs of the Info category stopped at each step of a chunk's commit, then
+# run again: the outputs must be those of runs that were never interrupted.
+
+FIRST_ROWS = 300
+SECOND_ROWS = 900
+
+
+def read_bytes(path):
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as f:
+        return f.read()
+
+
+# Everything a run leaves for consumers, without the names that depend on
+# how the chunks were cut
+def outputs(paths):
+    partitions = load_partition_manifest(paths.partition_dir)
+    store = PartitionStore(paths.partition_dir, os.path.basename(paths.output_file), SPEC.output_columns)
+    bulk = load_bulk_manifest(paths.bulk_dir)
+    bulk_rows = []
+    for entry in bulk["files"]:
+        assert verify_file(paths.bulk_dir, entry)
+        bulk_rows += [row for batch in entry["batches"] for row in read_batch(paths.bulk_dir, entry, batch)]
+    snapshot = {
+        "current": read_bytes(paths.output_file),
+        "checkpoint": load_checkpoint(paths.output_file),
+        "quarantine": read_bytes(paths.quarantine_file),
+        "partitions": {key: (stats["rows"], stats["bytes"], read_bytes(store.path_of(key)))
+                       for key, stats in partitions["partitions"].items()},
+        "pending": partitions["pending"],
+        "bulk": bulk_rows,
+    }
+    if SilverParquet.available():
+        table = SilverParquet.read_table(SPEC, root=paths.parquet_dir)
+        snapshot["parquet"] = table.sort_values(list(table.columns)).to_csv(index=False)
+    return snapshot
+
+
+def run(**overrides):
+    assert run_category(SPEC, run_options(parquet=SilverParquet.available(), **overrides)) == 0
+
+
+# Outputs of a run over the first rows and one over the rows appended
+# since, in tmp_path/reference; the test then runs in tmp_path/run
+@pytest.fixture
+def reference(tmp_path, monkeypatch):
+    use_base_dir(monkeypatch, tmp_path / "reference")
+    append_bronze("Info", FIRST_ROWS, seed=1)
+    run()
+    append_bronze("Info", SECOND_ROWS, seed=2)
+    run()
+    expected = outputs(category_paths("Info"))
+    assert expected["current"] and expected["quarantine"] and expected["bulk"]
+    use_base_dir(monkeypatch, tmp_path / "run")
+    return expected
+
+
+def test_one_run_in_one_chunk_gives_the_same_outputs(reference, monkeypatch):
+    append_bronze("Info", FIRST_ROWS, seed=1)
+    append_bronze("Info", SECOND_ROWS, seed=2)
+    monkeypatch.setattr(SilverEngine, "MEMORY_PER_BRONZE_BYTE", 1)
+    run()
+    assert outputs(category_paths("Info")) == reference
+
+
+# Stop a run at the nth call of owner.name as a killed process would:
+# nothing after it runs, neither the index's close() nor the bulk abort()
+def crash_at(monkeypatch, owner, name, nth):
+    original = getattr(owner, name)
+    calls = []
+
+    def stop(*args, **kwargs):
+        calls.append(1)
+        if len(calls) == nth:
+            raise Crash(f"{name} #{nth}")
+        return original(*args, **kwargs)
+
+    monkeypatch.setattr(owner, name, stop)
+    monkeypatch.setattr(DedupIndex, "close", lambda self: self.conn.close())
+    monkeypatch.setattr(BulkExport, "abort", lambda self, state=None: None)
+
+
+CRASH_POINTS = [
+    (DedupIndex, "add_many"),  # before the commit point: the chunk is written again
+    (SilverEngine, "save_checkpoint"),  # after it: the chunk's outputs are rolled forward
+    (PartitionStore, "commit"),
+    (SilverParquet, "commit"),
+    (BulkExport, "commit"),
+]
+
+
+@pytest.mark.parametrize("owner, name", CRASH_POINTS, ids=[name for _, name in CRASH_POINTS])
+@pytest.mark.parametrize("nth", [1, 3])
+def test_interrupted_run_is_recovered(reference, monkeypatch, owner, name, nth):
+    if owner is SilverParquet and not SilverParquet.available():
+        pytest.skip("pyarrow is not installed")
+    paths = category_paths("Info")
+    append_bronze("Info", FIRST_ROWS, seed=1)
+    run()
+    append_bronze("Info", SECOND_ROWS, seed=2)
+    with monkeypatch.context() as patched:
+        crash_at(patched, owner, name, nth)
+        with pytest.raises(Crash):
+            run()
+    run()
+    assert outputs(paths) == reference
+
+    run()  # nothing new, nothing changes
+    assert outputs(paths) == reference
+
+
+def test_failed_run_seals_the_bulk_file(reference, monkeypatch):
+    paths = category_paths("Info")
+    append_bronze("Info", FIRST_ROWS, seed=1)
+    run()
+    append_bronze("Info", SECOND_ROWS, seed=2)
+    with monkeypatch.context() as patched:
+        original = SilverEngine.save_checkpoint
+        calls = []
+
+        def fail(*args):
+            calls.append(1)
+            if len(calls) == 3:
+                raise Crash("save_checkpoint #3")
+            return original(*args)
+
+        patched.setattr(SilverEngine, "save_checkpoint", fail)
+        with pytest.raises(Crash):
+            run()
+
+    manifest = load_bulk_manifest(paths.bulk_dir)
+    assert all("md5" in entry and verify_file(paths.bulk_dir, entry) for entry in manifest["files"])
+    run()
+    assert outputs(paths) == reference
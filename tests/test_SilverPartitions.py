@@ -0,0 +1,98 @@
+import json
+import os
+
+from SilverPartitions import PartitionStore, changed_partitions, load_manifest
+
+COLUMNS = ["machine_id", "timestamp", "value"]
+FILENAME = "Silver_Test.dat"
+
+
+# The state as the dedup index stores it in its journal
+def journalled(state):
+    return json.loads(json.dumps(state))
+
+
+def rows_of(day, count, start=0):
+    return [f"{i};2024-01-{day:02d} 10:00:{i % 60:02d};{i}" for i in range(start, start + count)]
+
+
+def appended(store, *days):
+    rows = [row for day in days for row in rows_of(day, 3)]
+    keys = [f"2024/01/{day:02d}" for day in days for _ in range(3)]
+    assert store.append(rows, keys)
+
+
+def sizes(store):
+    return {key: os.path.getsize(store.path_of(key)) for key in store.manifest["partitions"]}
+
+
+def test_commit_advances_the_seq_of_the_changed_partitions(tmp_path):
+    store = PartitionStore(str(tmp_path), FILENAME, COLUMNS)
+    appended(store, 1, 2)
+    store.commit()
+    appended(store, 2, 3)
+    store.commit()
+
+    manifest = load_manifest(str(tmp_path))
+    assert manifest["seq"] == 2
+    assert manifest["pending"] is None
+    assert {key: stats["seq"] for key, stats in manifest["partitions"].items()} == {
+        "2024/01/01": 1, "2024/01/02": 2, "2024/01/03": 2}
+    assert manifest["partitions"]["2024/01/02"]["rows"] == 6
+    changed, seq = changed_partitions(str(tmp_path), FILENAME, watermark=1)
+    assert seq == 2
+    assert sorted(partition["partition"] for partition in changed) == ["2024/01/02", "2024/01/03"]
+
+
+def test_recover_truncates_uncommitted_appends(tmp_path):
+    store = PartitionStore(str(tmp_path), FILENAME, COLUMNS)
+    appended(store, 1)
+    store.commit()
+    committed = sizes(store)
+
+    appended(store, 1, 2)  # stopped before commit()
+    store = PartitionStore(str(tmp_path), FILENAME, COLUMNS)
+    store.recover()
+
+    assert store.manifest["pending"] is None
+    assert store.manifest["seq"] == 1
+    assert os.path.getsize(store.path_of("2024/01/01")) == committed["2024/01/01"]
+    assert os.path.getsize(store.path_of("2024/01/02")) == 0
+    assert load_manifest(str(tmp_path))["pending"] is None
+
+
+def test_roll_forward_keeps_rows_committed_in_the_journal(tmp_path):
+    store = PartitionStore(str(tmp_path), FILENAME, COLUMNS)
+    appended(store, 1)
+    store.commit()
+    appended(store, 1, 2)
+    state = journalled(store.commit_state())  # journalled by the dedup index, manifest not saved
+    expected = {key: stats["bytes"] for key, stats in state["partitions"].items()}
+    with open(store.path_of("2024/01/02"), "a") as f:
+        f.write("9;2024-01-02 11:00:00;9\n")  # written after the commit point
+
+    store = PartitionStore(str(tmp_path), FILENAME, COLUMNS)
+    store.roll_forward(state)
+    store.recover()
+
+    manifest = load_manifest(str(tmp_path))
+    assert manifest["seq"] == 2
+    assert manifest["partitions"]["2024/01/01"]["rows"] == 6
+    assert manifest["partitions"]["2024/01/02"] == {"rows": 3, "bytes": expected["2024/01/02"], "seq": 2}
+    assert sizes(store) == expected
+
+
+def test_roll_forward_ignores_a_state_already_committed(tmp_path):
+    store = PartitionStore(str(tmp_path), FILENAME, COLUMNS)
+    appended(store, 1)
+    state = journalled(store.commit_state())
+    store.commit()
+    appended(store, 1)
+    store.commit()
+    before = load_manifest(str(tmp_path))
+
+    store = PartitionStore(str(tmp_path), FILENAME, COLUMNS)
+    store.roll_forward(state)
+    store.recover()
+    assert load_manifest(str(tmp_path)) == before
+    assert os.path.getsize(store.path_of("2024/01/01")) == before["partitions"]["2024/01/01"]["bytes"]
@@ -0,0 +1,99 @@
+import os
+
+import pandas as pd
+import pytest
+
+import SilverRollups
+from SilverBulk import load_json
+from SilverEngine import category_paths, run_category
+from SilverPartitions import load_manifest as load_partition_manifest
+from SilverRinseScript import SPEC
+from SilverRollups import GRAINS, MANIFEST_NAME, read_rollups, stale_reason, update_rollups
+
+from conftest import Crash, append_bronze, run_options
+
+
+def rollups(paths):
+    return {grain: read_rollups(paths.rollup_dir, grain) for grain in GRAINS}
+
+
+def rollup_manifest(paths):
+    return load_json(os.path.join(paths.rollup_dir, MANIFEST_NAME), None)
+
+
+def assert_same_rollups(left, right):
+    for grain in GRAINS:
+        pd.testing.assert_frame_equal(left[grain], right[grain])
+
+
+# Two silver runs of the Rinse category with rollups
+@pytest.fixture
+def paths(base_dir):
+    append_bronze("Rinse", 400, seed=1)
+    assert run_category(SPEC, run_options(rollups=True)) == 0
+    append_bronze("Rinse", 600, seed=2)
+    assert run_category(SPEC, run_options(rollups=True)) == 0
+    return category_paths("Rinse")
+
+
+def test_incremental_rollups_match_a_rebuild(paths):
+    incremental = rollups(paths)
+    before = rollup_manifest(paths)
+    assert update_rollups(SPEC, paths, rebuild=True) > 0
+
+    assert_same_rollups(rollups(paths), incremental)
+    after = rollup_manifest(paths)
+    assert after["seq"] == before["seq"] + 1
+    assert after["watermark"] == before["watermark"]
+    assert not set(after["files"].values()) & set(before["files"].values())
+    assert sorted(os.listdir(paths.rollup_dir)) == sorted([MANIFEST_NAME, *after["files"].values()])
+
+
+def test_rollups_count_every_dated_partition_row(paths):
+    partitions = load_partition_manifest(paths.partition_dir)["partitions"]
+    dated = sum(stats["rows"] for key, stats in partitions.items() if key != "unknown")
+    for buckets in rollups(paths).values():
+        assert buckets["rows"].sum() == dated
+
+
+def test_nothing_new_leaves_the_rollups_as_they_are(paths):
+    before = rollup_manifest(paths)
+    assert update_rollups(SPEC, paths) == 0
+    assert rollup_manifest(paths) == before
+
+
+def test_rebuild_stopped_before_its_manifest_keeps_the_listed_files(paths, monkeypatch):
+    before, expected = rollup_manifest(paths), rollups(paths)
+
+    def stop(root, manifest):
+        raise Crash("save_manifest")
+
+    with monkeypatch.context() as patched:
+        patched.setattr(SilverRollups, "save_manifest", stop)
+        with pytest.raises(Crash):
+            update_rollups(SPEC, paths, rebuild=True)
+
+    assert rollup_manifest(paths) == before
+    assert_same_rollups(rollups(paths), expected)
+    assert update_rollups(SPEC, paths) == 0  # removes the files of the stopped rebuild
+    assert sorted(os.listdir(paths.rollup_dir)) == sorted([MANIFEST_NAME, *before["files"].values()])
+
+
+def test_partition_cut_below_its_folded_size_triggers_a_rebuild(paths, capsys):
+    expected, manifest = rollups(paths), rollup_manifest(paths)
+    key = sorted(manifest["folded"])[0]
+    manifest["folded"][key] += 100  # as if the partition had been cut since
+    SilverRollups.save_manifest(paths.rollup_dir, manifest)
+
+    update_rollups(SPEC, paths)
+    assert f"partition {key} is smaller than its folded size" in capsys.readouterr().out
+    assert rollup_manifest(paths)["folded"][key] == manifest["folded"][key] - 100
+    assert_same_rollups(rollups(paths), expected)
+
+
+def test_stale_reason():
+    manifest = {"watermark": 5, "folded": {"2024/01/01": 100}}
+    assert stale_reason(manifest, [{"partition": "2024/01/01", "bytes": 150}], 6) is None
+    assert "behind the folded seq 5" in stale_reason(manifest, [{"partition": "2024/01/01", "bytes": 150}], 4)
+    assert "2024/01/01 is smaller" in stale_reason(manifest, [{"partition": "2024/01/01", "bytes": 50}], 6)
+    assert "2024/01/01 is smaller" in stale_reason(manifest, [], 6)
@@ -0,0 +1,61 @@
+import pandas as pd
+import pytest
+
+from BenchmarkTimestamps import format_date_row_by_row, format_dates_per_format, synthetic_column
+from SilverEngine import Column, to_datetime_text
+from TimestampParser import detect_formats, parse_timestamp, to_canonical
+
+# The vectorised parsing must give the text of the row-by-row format_date()
+# the silver scripts used to call, for every value. BenchmarkTimestamps
+# prints the same comparison on its synthetic column.
+
+EDGE_VALUES = [
+    "2024-01-05 10:00:00", "01/05/2024 10:00:00", " 2024-01-05 10:00:00 ", "2024-01-05 10:00:00\r",
+    '"2024-01-05 10:00:00"', "'01/05/2024 10:00:00'", "2024-1-5 3:4:5", "1/5/2024 3:04:05",
+    "2024-02-29 23:59:59", "02/29/2024 23:59:59", "2023-02-29 00:00:00", "02/29/2023 00:00:00",
+    "2024-02-30 10:00:00", "2024-04-31 10:00:00", "13/45/2024 00:00:00", "2024-13-01 00:00:00",
+    "2024-12-31 24:00:00", "2024-12-31 23:60:00", "2024-01-05T10:00:00", "2024-01-05 10:00",
+    "2024-01-05", "0001-01-01 00:00:00", "9999-12-31 23:59:59", "1900-02-29 00:00:00",
+    "2000-02-29 00:00:00", "", "   ", "bad", "None", None, 20240105,
+]
+
+
+def row_by_row(series):
+    return series.map(format_date_row_by_row)
+
+
+@pytest.mark.parametrize("us_share, invalid_rate", [(0.0, 0.0), (0.4, 0.001), (1.0, 0.05), (0.5, 0.5)])
+def test_engine_matches_row_by_row_on_synthetic_columns(us_share, invalid_rate):
+    series = synthetic_column(5000, us_share, invalid_rate, seed=1)
+    expected = row_by_row(series)
+    assert (to_datetime_text(series, Column("timestamp", "datetime"), None) == expected).all()
+    assert (format_dates_per_format(series) == expected).all()
+
+
+def test_engine_matches_row_by_row_on_edge_values():
+    series = pd.Series(EDGE_VALUES, dtype=object)
+    result = to_datetime_text(series, Column("timestamp", "datetime"), None)
+    assert result.tolist() == row_by_row(series).tolist()
+
+
+def test_edge_values_mixed_into_a_column_of_one_format():
+    # The detected format comes from a sample: the other format and the odd
+    # values must still be parsed like the row-by-row version does
+    series = pd.concat([synthetic_column(2000, 0.0, 0.0, seed=2), pd.Series(EDGE_VALUES, dtype=object)],
+                       ignore_index=True)
+    result = to_datetime_text(series, Column("timestamp", "datetime"), None)
+    assert result.tolist() == row_by_row(series).tolist()
+
+
+def test_to_canonical_agrees_with_parse_timestamp():
+    series = pd.concat([synthetic_column(2000, 0.4, 0.01, seed=3), pd.Series(EDGE_VALUES, dtype=object)],
+                       ignore_index=True)
+    canonical = to_canonical(series)
+    for value, text in zip(series, canonical):
+        if text is not None:
+            assert parse_timestamp(str(value).strip()) == text
+
+
+def test_detect_formats_orders_the_sampled_formats_first():
+    assert detect_formats(pd.Series(["01/05/2024 10:00:00"] * 10))[0] == "%m/%d/%Y %H:%M:%S"
+    assert detect_formats(pd.Series(["2024-01-05 10:00:00"] * 10))[0] == "%Y-%m-%d %H:%M:%S"